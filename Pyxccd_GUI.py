@@ -1,13 +1,103 @@
-import matplotlib
-matplotlib.use('TkAgg')  
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
-import pandas as pd
+from __future__ import annotations
 import os
+import sys
+import time
+# 进程启动时间，用于报告窗口显示前的耗时
+START_TIME = time.perf_counter()
+# 命令行子命令（python Pyxccd_GUI.py run ...）在没有显示器的服务器上运行：
+# 使用Agg后端且不导入tkinter。spawn启动的工作进程继承sys.argv，判断结果一致。
+# 设置了MPLBACKEND=Agg（例如作为模块被基准测试导入）时同样按无界面处理
+CLI_COMMANDS = ('run', 'batch', 'update')
+HEADLESS = (len(sys.argv) > 1 and sys.argv[1] in CLI_COMMANDS) or os.environ.get('MPLBACKEND', '').lower() == 'agg'
+if not HEADLESS:
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
+import argparse
 import ctypes
+import hashlib
+import inspect
+import itertools
+import json
+import math
+import multiprocessing
+import queue
+import re
+import sqlite3
+import threading
+import traceback
+import tracemalloc
+import zipfile
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from multiprocessing import shared_memory
+from functools import lru_cache, partial
 from textwrap import dedent
+from typing import List, Tuple, Dict, Union, Optional
 os.environ['GDAL_DATA'] = r'D:\py3.11.9\Lib\site-packages\rasterio\gdal-data'
 
+# numpy/pandas/matplotlib/seaborn/pyxccd导入较慢，由import_scientific_modules绑定为模块全局名称：
+# 命令行、工作进程以及作为模块导入时立即导入；GUI先显示窗口，再在后台线程中预热
+np = pd = matplotlib = plt = sns = mdates = None
+Axes = LineCollection = Line2D = Figure = FigureCanvasTkAgg = NavigationToolbar2Tk = None
+cold_detect_flex = sccd_detect_flex = sccd_update_flex = cold_rec_cg = SccdOutput = anomaly = defaults = predict_ref = None
+# 模块名 -> 导入耗时（秒），按导入顺序
+IMPORT_TIMINGS = {}
+_IMPORT_LOCK = threading.Lock()
+
+
+def import_scientific_modules():
+    """导入科学计算和绘图模块并记录各自耗时；可重复调用，其他线程正在导入时等待其完成"""
+    global np, pd, matplotlib, plt, sns, mdates, Axes, LineCollection, Line2D, Figure
+    global FigureCanvasTkAgg, NavigationToolbar2Tk
+    global cold_detect_flex, sccd_detect_flex, sccd_update_flex, cold_rec_cg, SccdOutput, anomaly, defaults, predict_ref
+    with _IMPORT_LOCK:
+        if IMPORT_TIMINGS:
+            return IMPORT_TIMINGS
+        timings = {}
+        last = [time.perf_counter()]
+        
+        def lap(name):
+            now = time.perf_counter()
+            timings[name] = now - last[0]
+            last[0] = now
+        
+        import numpy as np
+        lap('numpy')
+        import pandas as pd
+        lap('pandas')
+        import matplotlib
+        matplotlib.use('Agg' if HEADLESS else 'TkAgg')
+        import matplotlib.pyplot as plt
+        from matplotlib.axes import Axes
+        from matplotlib.collections import LineCollection
+        from matplotlib.lines import Line2D
+        from matplotlib.figure import Figure
+        import matplotlib.dates as mdates
+        if not HEADLESS:
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+        lap('matplotlib')
+        import seaborn as sns
+        lap('seaborn')
+        from pyxccd import cold_detect_flex, sccd_detect_flex, sccd_update_flex
+        from pyxccd.common import cold_rec_cg, SccdOutput, anomaly
+        from pyxccd.utils import defaults, predict_ref
+        lap('pyxccd')
+        IMPORT_TIMINGS.update(timings)
+    return IMPORT_TIMINGS
+
+
+def format_import_timings(timings):
+    """将导入耗时整理为一行摘要"""
+    parts = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in timings.items())
+    return f"Modules loaded in {sum(timings.values()):.2f} s ({parts})"
+
+
+if HEADLESS or __name__ != '__main__':
+    import_scientific_modules()
+
 class ChangeDetectionApp:
     def __init__(self, root):
         self.root = root
@@ -17,7 +107,7 @@ class ChangeDetectionApp:
         self.set_dpi_awareness()
         self.last_params = {}
         self.root.title("Pyxccd GUI1.0")
-        self.root.geometry("900x930")  
+        self.root.geometry("1700x960")  
         
         # 存储数据
         self.df = None
@@ -30,11 +120,45 @@ class ChangeDetectionApp:
             'break_indicator': None
         }
         
+        # 后台任务执行器（job_id -> (提交时的参数, 性能记录器)）
+        self.executor = JobExecutor()
+        self.jobs = {}
+        self.poll_after_id = None
+        # 等待后台结果写入完成的root.after回调
+        self.store_check_id = None
+        self.last_timing = None
+        # 进程启动到窗口显示的耗时，模块导入完成后与导入耗时一起显示在状态栏
+        self.window_shown_seconds = None
+        self.batch_job = None
+        self.sweep_job = None
+        self.sweep_window = None
+        self.matches_window = None
+        # 正在进行的对比：(参数, 输入, [(步骤, Future)], 性能记录器)
+        self.comparison = None
+        # 最近一次整理的检测输入：((文件键, 日期列, QA列, 波段), prepare_inputs的结果)
+        self.prepared_inputs = None
+        # 当前显示的近实时视图：((状态文件, 显示波段, 断点指示波段, 绘图模式), 最后处理日期)
+        self.nrt_view = None
+        # 栅格堆栈模式：打开的RasterStack、选中的像元(行, 列)及其时间序列表格
+        self.raster_stack = None
+        self.raster_pixel = None
+        self.pixel_data = None
+        # 后台像元提取：单线程执行器，以及进行中的提取(堆栈, 像元, Future, 完成后的回调, 开始时间)
+        self.pixel_reader = None
+        self.pixel_read = None
+        self.quicklook_window = None
+        # 最近一次运行的各阶段性能记录及其参数（用于导出JSON）
+        self.profile_records = []
+        self.profile_params = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # 设置样式
         self.style = ttk.Style()
         self.configure_styles()
         
         self.create_widgets()
+        # 先显示窗口，再在后台预热较慢的科学计算模块
+        self.root.after(100, self.start_module_warmup)
     
     def init_fonts(self):
         """初始化字体设置"""
@@ -98,15 +222,23 @@ class ChangeDetectionApp:
         self.style.configure('Display.TFrame', background=self.section_colors['display'])
     
     def create_widgets(self):
+        # 左侧为参数区，右侧为嵌入的结果图
+        paned = ttk.PanedWindow(self.root, orient=tk.HORIZONTAL)
+        paned.pack(fill=tk.BOTH, expand=True)
+        
         # 主框架
-        main_frame = ttk.Frame(self.root, padding="10")
-        main_frame.pack(fill=tk.BOTH, expand=True)
+        main_frame = ttk.Frame(paned, padding="10")
+        paned.add(main_frame, weight=0)
+        
+        result_frame = ttk.Frame(paned, padding="10")
+        paned.add(result_frame, weight=1)
+        self.create_result_panel(result_frame)
         
         # ==================== Input区域 ====================
         input_frame = ttk.Frame(main_frame, style='Input.TFrame', padding=10, relief=tk.RIDGE, borderwidth=2)
         input_frame.pack(fill=tk.X, pady=(0, 10))
         
-        input_label = ttk.Label(input_frame, text="Input (CSV or Excel)", style='Title.TLabel')
+        input_label = ttk.Label(input_frame, text="Input (table or GeoTIFF stack)", style='Title.TLabel')
         input_label.pack(anchor=tk.W, pady=(0, 5))
         
         input_subframe = ttk.Frame(input_frame)
@@ -116,6 +248,14 @@ class ChangeDetectionApp:
         entry = ttk.Entry(input_subframe, textvariable=self.input_var, width=60)
         entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
         
+        # 将CSV/Excel转换为旁边的Parquet缓存，之后打开和读取时自动使用
+        parquet_btn = ttk.Button(input_subframe, text="To Parquet", command=self.convert_input_to_parquet)
+        parquet_btn.pack(side=tk.RIGHT, padx=(10, 0))
+        
+        # 打开GeoTIFF场景目录（每个日期一个文件），在快视图中点击像元提取其时间序列
+        stack_btn = ttk.Button(input_subframe, text="Open Stack", command=self.open_raster_stack)
+        stack_btn.pack(side=tk.RIGHT, padx=(10, 0))
+        
         open_btn = ttk.Button(input_subframe, text="Open", command=self.open_file)
         open_btn.pack(side=tk.RIGHT)
         
@@ -329,6 +469,21 @@ class ChangeDetectionApp:
         self.display_band_combo.pack(side=tk.LEFT, fill=tk.X, expand=True)
         self.display_band_combo.bind('<<ComboboxSelected>>', self.on_display_band_selected)
 
+        # 绘制方式：fast为LineCollection快速绘制，seaborn为原有的逐段绘制效果
+        render_frame = ttk.Frame(left_display_frame)
+        render_frame.pack(fill=tk.X, pady=2)
+
+        ttk.Label(render_frame, text="Render:", width=15).pack(side=tk.LEFT)
+        self.render_mode_var = tk.StringVar(value="fast")
+        self.render_mode_combo = ttk.Combobox(
+            render_frame, 
+            textvariable=self.render_mode_var, 
+            values=["fast", "seaborn"], 
+            width=15, 
+            state="readonly"
+        )
+        self.render_mode_combo.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
         # 右侧：Output选项和View Script按钮
         right_display_frame = ttk.Frame(display_subframe)
         right_display_frame.pack(side=tk.RIGHT, fill=tk.X, expand=True)
@@ -375,6 +530,49 @@ class ChangeDetectionApp:
             command=self.run_analysis
         )
         run_button.pack(side=tk.LEFT)
+        
+        # Batch按钮：按ID列对长表中的所有像元批量检测
+        batch_button = ttk.Button(
+            run_frame, 
+            text="Batch...", 
+            command=self.run_batch_analysis
+        )
+        batch_button.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Sweep按钮：按P_CG/CONSE/Lam的取值网格并行检测并比较结果
+        sweep_button = ttk.Button(
+            run_frame, 
+            text="Sweep...", 
+            command=self.open_sweep_dialog
+        )
+        sweep_button.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Compare按钮：用当前参数同时运行COLD和S-CCD，断点在±天数内视为一致
+        compare_button = ttk.Button(
+            run_frame, 
+            text="Compare", 
+            command=lambda: self.run_analysis(compare=True)
+        )
+        compare_button.pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Label(run_frame, text="±").pack(side=tk.LEFT, padx=(5, 0))
+        self.match_tolerance_var = tk.StringVar(value="90")
+        ttk.Spinbox(
+            run_frame, 
+            from_=0, 
+            to=730, 
+            increment=10, 
+            width=5, 
+            textvariable=self.match_tolerance_var
+        ).pack(side=tk.LEFT)
+        ttk.Label(run_frame, text="days").pack(side=tk.LEFT, padx=(2, 0))
+        
+        # Update NRT按钮：只用输入文件中新追加的观测增量更新保存的S-CCD状态
+        nrt_button = ttk.Button(
+            run_frame, 
+            text="Update NRT", 
+            command=self.run_nrt_update
+        )
+        nrt_button.pack(side=tk.LEFT, padx=(10, 0))
 
         # 中间填充框架（在Run和Help之间）
         middle_filler = ttk.Frame(run_frame)
@@ -387,6 +585,168 @@ class ChangeDetectionApp:
             command=self.show_help
         )
         help_button.pack(side=tk.RIGHT)
+        
+        # ==================== 任务状态栏 ====================
+        status_frame = ttk.Frame(main_frame)
+        status_frame.pack(fill=tk.X)
+        
+        self.progress_var = tk.DoubleVar(value=0)
+        self.progress_bar = ttk.Progressbar(
+            status_frame, 
+            variable=self.progress_var, 
+            maximum=100, 
+            length=200
+        )
+        self.progress_bar.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.status_var = tk.StringVar(value="Ready")
+        ttk.Label(status_frame, textvariable=self.status_var).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        self.queue_var = tk.StringVar(value="Queued: 0")
+        ttk.Label(status_frame, textvariable=self.queue_var, width=12).pack(side=tk.LEFT)
+        
+        # Cancel按钮：取消正在运行的任务
+        self.cancel_button = ttk.Button(
+            status_frame, 
+            text="Cancel", 
+            command=self.cancel_job, 
+            state="disabled"
+        )
+        self.cancel_button.pack(side=tk.RIGHT)
+        
+        # Cancel All按钮：终止工作进程并清空任务队列
+        self.cancel_all_button = ttk.Button(
+            status_frame, 
+            text="Cancel All", 
+            command=self.cancel_all_jobs, 
+            state="disabled"
+        )
+        self.cancel_all_button.pack(side=tk.RIGHT, padx=(0, 5))
+        
+        # ==================== 性能记录面板（可折叠） ====================
+        profile_header = ttk.Frame(main_frame)
+        profile_header.pack(fill=tk.X, pady=(5, 0))
+        
+        self.profile_toggle = ttk.Button(
+            profile_header, 
+            text="▸ Profile", 
+            width=10, 
+            command=self.toggle_profile_panel
+        )
+        self.profile_toggle.pack(side=tk.LEFT)
+        
+        # tracemalloc会拖慢分配密集的阶段，默认只记录时间
+        self.trace_memory_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            profile_header, 
+            text="Track memory", 
+            variable=self.trace_memory_var
+        ).pack(side=tk.LEFT, padx=(10, 0))
+        
+        ttk.Button(
+            profile_header, 
+            text="Export JSON...", 
+            command=self.export_profile
+        ).pack(side=tk.RIGHT)
+        
+        # 面板内容在展开时才显示
+        self.profile_frame = ttk.Frame(main_frame)
+        self.profile_tree = ttk.Treeview(self.profile_frame, columns=('wall', 'cpu', 'peak'), height=8)
+        self.profile_tree.heading('#0', text="Stage")
+        self.profile_tree.column('#0', width=260)
+        for column, title in (('wall', "Wall ms"), ('cpu', "CPU ms"), ('peak', "Peak MB")):
+            self.profile_tree.heading(column, text=title)
+            self.profile_tree.column(column, width=80, anchor='e')
+        self.profile_tree.pack(fill=tk.BOTH, expand=True)
+    
+    def toggle_profile_panel(self):
+        """展开/折叠性能记录面板"""
+        if self.profile_frame.winfo_ismapped():
+            self.profile_frame.pack_forget()
+            self.profile_toggle.config(text="▸ Profile")
+        else:
+            self.profile_frame.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
+            self.profile_toggle.config(text="▾ Profile")
+    
+    def show_profile(self, records, params):
+        """在性能记录面板中显示各阶段记录，嵌套阶段显示为子项"""
+        self.profile_records = records
+        self.profile_params = params
+        self.profile_tree.delete(*self.profile_tree.get_children())
+        parents = ['']
+        for record in records:
+            del parents[record['depth'] + 1:]
+            peak = "" if record['peak_bytes'] is None else f"{record['peak_bytes'] / 1024 ** 2:.2f}"
+            item = self.profile_tree.insert(
+                parents[-1], 'end', text=record['stage'], open=True,
+                values=(f"{record['wall'] * 1000:.1f}", f"{record['cpu'] * 1000:.1f}", peak)
+            )
+            parents.append(item)
+    
+    def export_profile(self):
+        """将最近一次运行的性能记录导出为JSON"""
+        if not self.profile_records:
+            messagebox.showerror("Error", "Run an analysis first to record a profile")
+            return
+        path = filedialog.asksaveasfilename(
+            title="Export profile",
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'params': self.profile_params, 'stages': self.profile_records}, f, indent=2, default=str)
+        self.status_var.set(f"Profile exported to {path}")
+    
+    def create_result_panel(self, parent):
+        """创建嵌入式结果区域；画布在绘图模块加载完成后由build_result_canvas创建"""
+        self.result_frame = parent
+        self.figure = None
+        self.result_placeholder = ttk.Label(parent, text="Loading plotting modules...", anchor='center')
+        self.result_placeholder.pack(fill=tk.BOTH, expand=True)
+    
+    def build_result_canvas(self):
+        """创建常驻的Figure画布和导航工具栏，每次运行复用"""
+        self.result_placeholder.destroy()
+        # 直接使用Figure而非pyplot，避免每次运行新建窗口并在pyplot中累积Figure
+        self.figure = Figure(figsize=(10, 8))
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self.result_frame)
+        
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self.result_frame, pack_toolbar=False)
+        self.toolbar.update()
+        self.toolbar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        
+        self.figure.text(0.5, 0.5, "Select a file and click Run to show the results", ha='center', va='center', color='gray')
+        self.canvas.draw_idle()
+    
+    def start_module_warmup(self):
+        """窗口显示后在后台线程中导入numpy/pandas/matplotlib/seaborn/pyxccd"""
+        self.window_shown_seconds = time.perf_counter() - START_TIME
+        self.warmup_thread = threading.Thread(target=import_scientific_modules, daemon=True)
+        self.warmup_thread.start()
+        self.poll_module_warmup()
+    
+    def poll_module_warmup(self):
+        """等待后台导入完成后创建结果画布"""
+        if self.warmup_thread.is_alive():
+            self.root.after(50, self.poll_module_warmup)
+        else:
+            self.ensure_modules()
+    
+    def ensure_modules(self):
+        """需要科学计算模块的操作前调用：尚未导入完成时在主线程中等待（或重新导入）"""
+        if not IMPORT_TIMINGS:
+            self.status_var.set("Loading modules...")
+            self.root.update_idletasks()
+            import_scientific_modules()
+        if self.figure is None:
+            self.build_result_canvas()
+            summary = format_import_timings(IMPORT_TIMINGS)
+            if self.window_shown_seconds is not None:
+                summary = f"Window shown in {self.window_shown_seconds:.2f} s | {summary}"
+            self.status_var.set(f"Ready | {summary}")
     
     
     
@@ -505,21 +865,19 @@ class ChangeDetectionApp:
                 break
     
     def open_file(self):
-        filetypes = [
-            ('数据文件', '*.csv *.xlsx *.xls'),
-            ('CSV文件', '*.csv'),
-            ('Excel文件', '*.xlsx *.xls')
-        ]
+        filetypes = [('数据文件', " ".join(f"*{ext}" for ext in TABLE_FORMATS))]
+        for name in dict.fromkeys(TABLE_FORMATS.values()):
+            filetypes.append((name, " ".join(f"*{ext}" for ext, format_name in TABLE_FORMATS.items() if format_name == name)))
         
         filename = filedialog.askopenfilename(title='打开数据文件', filetypes=filetypes)
         
         if filename:
             self.input_var.set(filename)
+            self.ensure_modules()
+            self.close_raster_stack()
             try:
-                if filename.endswith('.csv'):
-                    self.df = pd.read_csv(filename)
-                else:
-                    self.df = pd.read_excel(filename)
+                # 只读取表头和少量样本行，完整数据在Run时按所选列读取
+                self.df = scan_table(filename)
                 
                 self.available_columns = self.df.columns.tolist()
                 # 清空所有选择
@@ -529,6 +887,154 @@ class ChangeDetectionApp:
             except Exception as e:
                 messagebox.showerror("错误", f"读取文件失败: {str(e)}")
     
+    def open_raster_stack(self):
+        """打开GeoTIFF场景目录：建立场景索引，列列表为'date'和各波段，并显示快视图"""
+        directory = filedialog.askdirectory(title='打开GeoTIFF场景目录')
+        if not directory:
+            return
+        self.ensure_modules()
+        try:
+            stack = RasterStack(directory)
+        except ImportError:
+            messagebox.showerror("Error", "The raster stack mode requires rasterio")
+            return
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Error", f"Failed to open the raster stack: {str(e)}")
+            return
+        self.close_raster_stack()
+        self.raster_stack = stack
+        self.input_var.set(directory)
+        self.df = stack.header()
+        self.available_columns = self.df.columns.tolist()
+        self.clear_all_selections()
+        self.update_column_lists()
+        message = f"Raster stack: {len(stack.scenes)} scenes, {stack.width} x {stack.height} pixels, bands {stack.band_names}"
+        if stack.skipped:
+            message += f" ({len(stack.skipped)} file(s) without a date skipped)"
+        self.status_var.set(message)
+        self.show_quicklook()
+        stack.prefetch()
+    
+    def close_raster_stack(self):
+        """退出栅格堆栈模式，关闭打开的场景文件和快视图窗口"""
+        if self.raster_stack is not None:
+            self.raster_stack.close()
+        self.raster_stack = self.raster_pixel = self.pixel_data = None
+        if self.pixel_reader is not None:
+            self.pixel_reader.shutdown(wait=False, cancel_futures=True)
+        self.pixel_reader = self.pixel_read = None
+        if self.quicklook_window is not None and self.quicklook_window.winfo_exists():
+            self.quicklook_window.destroy()
+        self.quicklook_window = None
+    
+    def is_raster_input(self, params):
+        """当前输入是否为已打开的栅格堆栈"""
+        return self.raster_stack is not None and params['input_file'] == self.raster_stack.directory
+    
+    def show_quicklook(self):
+        """显示最新场景第一个波段的缩略图，点击其中的像元提取该像元的时间序列并运行检测"""
+        stack = self.raster_stack
+        if self.quicklook_window is None or not self.quicklook_window.winfo_exists():
+            window = tk.Toplevel(self.root)
+            window.title("Quicklook")
+            window.geometry("700x720")
+            figure = Figure(figsize=(6, 6))
+            canvas = FigureCanvasTkAgg(figure, master=window)
+            toolbar = NavigationToolbar2Tk(canvas, window, pack_toolbar=False)
+            toolbar.update()
+            toolbar.pack(side=tk.BOTTOM, fill=tk.X)
+            canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+            canvas.mpl_connect('button_press_event', self.on_quicklook_click)
+            self.quicklook_window = window
+            self.quicklook_canvas, self.quicklook_toolbar = canvas, toolbar
+        
+        figure = self.quicklook_canvas.figure
+        figure.clear()
+        ax = figure.add_subplot()
+        image = stack.quicklook()
+        low, high = np.nanpercentile(image, [2, 98]) if np.isfinite(image).any() else (0, 1)
+        # extent使坐标轴单位为原始栅格的像元，点击位置直接对应(行, 列)
+        ax.imshow(image, cmap='gray', vmin=low, vmax=high, extent=(0, stack.width, stack.height, 0), interpolation='nearest')
+        self.quicklook_marker, = ax.plot([], [], 'r+', markersize=12, markeredgewidth=2)
+        day = pd.Timestamp.fromordinal(stack.scenes[-1][0]).strftime('%Y-%m-%d')
+        ax.set_title(f"{stack.band_names[0]} {day} - click a pixel", fontsize=10)
+        figure.tight_layout()
+        self.quicklook_canvas.draw_idle()
+        self.quicklook_window.lift()
+    
+    def on_quicklook_click(self, event):
+        """快视图中的单击（缩放/平移模式下除外）：选择该像元"""
+        if event.inaxes is None or event.button != 1 or self.quicklook_toolbar.mode:
+            return
+        self.select_pixel(int(event.ydata), int(event.xdata))
+    
+    def select_pixel(self, row, col):
+        """在后台提取像元的时间序列；已选择日期列和波段时，提取完成后运行检测并绘图"""
+        def analyze():
+            if self.selected_columns['date'] and self.selected_columns['bands']:
+                self.run_analysis()
+        self.read_pixel(row, col, analyze)
+    
+    def read_pixel(self, row, col, then=None):
+        """
+        在后台线程中提取像元的时间序列，界面不等待读取（也不等待正在进行的预先打开）。
+        完成后由poll_pixel_read设置pixel_data、移动快视图中的标记并调用then；
+        提取进行中再次请求时只使用最后一次请求的结果
+        """
+        if self.pixel_reader is None:
+            self.pixel_reader = ThreadPoolExecutor(max_workers=1)
+        future = self.pixel_reader.submit(self.raster_stack.extract, row, col)
+        polling = self.pixel_read is not None
+        self.pixel_read = (self.raster_stack, (row, col), future, then, time.perf_counter())
+        self.status_var.set(f"Reading pixel ({row}, {col}) from {len(self.raster_stack.scenes)} scenes...")
+        if not polling:
+            self.poll_pixel_read()
+    
+    def poll_pixel_read(self):
+        """通过root.after等待后台像元提取完成"""
+        # 提取期间堆栈已关闭或更换时丢弃结果
+        if self.pixel_read is None or self.pixel_read[0] is not self.raster_stack:
+            self.pixel_read = None
+            return
+        stack, (row, col), future, then, start = self.pixel_read
+        if not future.done():
+            self.root.after(50, self.poll_pixel_read)
+            return
+        self.pixel_read = None
+        try:
+            data = future.result()
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Error", f"Failed to read pixel ({row}, {col}): {str(e)}")
+            self.update_job_status()
+            return
+        self.pixel_data, self.raster_pixel = data, (row, col)
+        if self.quicklook_window is not None and self.quicklook_window.winfo_exists():
+            self.quicklook_marker.set_data([col + 0.5], [row + 0.5])
+            self.quicklook_canvas.draw_idle()
+        self.status_var.set(
+            f"Pixel ({row}, {col}): {len(data)} scenes read in {time.perf_counter() - start:.2f} s"
+        )
+        if then is not None:
+            then()
+    
+    def convert_input_to_parquet(self):
+        """把当前的CSV/Excel输入文件转换为Parquet缓存"""
+        filename = self.input_var.get()
+        if not filename:
+            messagebox.showerror("Error", "Please select a data file first")
+            return
+        self.ensure_modules()
+        self.status_var.set("Converting to Parquet...")
+        self.root.update_idletasks()
+        try:
+            start = time.perf_counter()
+            cache_path = convert_to_parquet(filename)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to convert the data file: {type(e).__name__}: {e}")
+            self.update_job_status()
+            return
+        self.status_var.set(f"Parquet cache written in {time.perf_counter() - start:.2f} s: {cache_path}")
+    
     def clear_all_selections(self):
         """清空所有选择（包括日期、QA和波段）"""
         # 清空波段相关选项
@@ -776,70 +1282,16 @@ class ChangeDetectionApp:
     
     def show_script(self, params=None):
         """显示固定的脚本内容，可选包含参数"""
-        """运行分析"""
-        # 验证输入
-        if self.df is None:
-            messagebox.showerror("Error", "Please select a data file first")
-            return
-        
-        if not self.selected_columns['date']:
-            messagebox.showerror("Error", "Please select the date column")
+        # 与run_analysis共用输入检查和参数收集（栅格堆栈模式下包含所选像元）
+        params = self.collect_params()
+        if params is None:
             return
-        
-        if not self.selected_columns['display_band']:
-            messagebox.showerror("Error", "Please select the display band column")
-            return
-        
-        if not self.selected_columns['bands']:
-            messagebox.showerror("Error", "Please select at least one band")
-            return
-        
-        if not self.selected_columns['qa'] and self.qa_enable_var.get():
-            messagebox.showerror("Error", "Please select the QA column")
-            return
-        
-        try:
-            p_cg = float(self.p_cg_var.get())
-            if not (0.0 < p_cg < 1.0):  # P_CG 应该是 (0.0, 1.0] 范围内的浮点数
-                messagebox.showerror("Error", "P_CG must be a float in the range (0.0, 1.0]")
-                return
-        except ValueError:
-            messagebox.showerror("Error", "P_CG must be a valid float number")
-            return
-
-        # 验证 CONSE 参数
-        try:
-            conse = int(self.conse_var.get())
-            if not (0 < conse <= 8):  # CONSE 应该是 (0, 8] 范围内的整数
-                messagebox.showerror("Error", "CONSE must be an integer in the range (0, 8]")
-                return
-        except ValueError:
-            messagebox.showerror("Error", "CONSE must be a valid integer")
-            return
-        
-        # 获取output选项
-        output_option = self.output_var.get()
-        
-        # 收集参数
-        params = {
-            'input_file': self.input_var.get(),
-            'method': self.method_var.get(),
-            'date_column': self.selected_columns['date'],
-            'qa_column': self.selected_columns['qa'],
-            'selected_bands': self.selected_columns['bands'],
-            'break_indicator': self.selected_columns['break_indicator'],
-            'display_band': self.selected_columns['display_band'],
-            'P_CG': self.p_cg_var.get(),
-            'CONSE': self.conse_var.get(),
-            'output': output_option,  # 使用新的output参数
-            'Lam': self.lam_var.get(),
-            'trimodal': self.trimodal_var.get(),
-            'fitting_curve': self.fitting_curve_var.get(),
-        }
         # 保存参数以便在show_script中使用
         self.last_params = params
         
-        
+        # 与run_analysis共用数据缓存，确认脚本引用的列在当前文件中存在
+        if self.load_current_data(params, retry=self.show_script) is None:
+            return
         
         script_window = tk.Toplevel(self.root)
         script_window.title("Script Content")
@@ -869,246 +1321,1400 @@ from pyxccd.common import cold_rec_cg
 from pyxccd.utils import read_data, getcategory_cold
 from datetime import date
 from typing import List, Tuple, Dict, Union, Optional
+from functools import lru_cache
 import seaborn as sns
 import matplotlib.pyplot as plt
 from matplotlib.axes import Axes
+from matplotlib.collections import LineCollection
+import matplotlib.dates as mdates
 from pyxccd.common import SccdOutput, anomaly
 from pyxccd.utils import getcategory_sccd, defaults, getcategory_cold, predict_ref
 from matplotlib.lines import Line2D   
 from tkinter import messagebox
-def check_and_convert_dates(dates):
-    
-    try:
-        dates = np.array(dates) if not isinstance(dates, np.ndarray) else dates
-
-        if len(dates) == 0:
-            messagebox.showerror("Error", "Date data is empty")
-            return None
-        
-        # Check the type and range of each element
-        for i, date in enumerate(dates):
-            if isinstance(date, (int, float, np.integer, np.floating)):
-                if not (700000 <= date <= 800000):  
-                    messagebox.showerror("Error", f"Date value is out of reasonable range(700000-800000): {date}")
-                    return None
-            
-            # Processing string-type dates
-            elif isinstance(date, str):
-                try:
-                    pd.to_datetime(date, format='%m/%d/%Y')
-                except ValueError:
-                    try:
-                        pd.to_datetime(date)
-                    except ValueError:
-                        messagebox.showerror("Error", f"Date format error: {date}")
-                        return None
+""" + script_source(
+                describe_invalid_dates, check_and_convert_dates,
+                ordinal_to_datenum, ordinal_to_datetime64, smallest_int_dtype, PreparedSeries,
+                harmonic_basis, evaluate_harmonic_segments, nrt_projection_range, sccd_fit_segments, plot_model_fit,
+                plot_nrt_projection, decimate_minmax, DecimatedLine, plot_states_line, anomaly_reference, plot_anomalies, plot_breaks,
+                display_sccd_result_sif, display_cold_result, display_sccd_result, display_sccd_states_flex,
+                DATE_ORDINAL_MIN=DATE_ORDINAL_MIN, DATE_ORDINAL_MAX=DATE_ORDINAL_MAX, UNIX_EPOCH_ORDINAL=UNIX_EPOCH_ORDINAL,
+                HARMONIC_OMEGA=HARMONIC_OMEGA, SLOPE_SCALE=SLOPE_SCALE, NRT_GID=NRT_GID
+            )
+            if params.get('pixel') is not None:
+                # 栅格堆栈：脚本中用同一个RasterStack提取所选像元的时间序列
+                header_content += """import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+""" + script_source(
+                    parse_scene_date, raster_handle_limit, RasterStack,
+                    RASTER_EXTENSIONS=RASTER_EXTENSIONS, RASTER_DATE_PATTERNS=RASTER_DATE_PATTERNS,
+                    RASTER_RESERVED_FILES=RASTER_RESERVED_FILES, QUICKLOOK_SIZE=QUICKLOOK_SIZE
+                )
+                read_content = f"""
+in_path = '{params['input_file']}'
+# extract the pixel time series from the GeoTIFF stack (one scene per date, date in the file name)
+data = RasterStack(in_path).extract({params['pixel'][0]}, {params['pixel'][1]})"""
             else:
-                messagebox.showerror("Error", f"Unsupported date format: {date}")
-                return None
-            
-        # If all dates are in string format, perform the conversion
-        if isinstance(dates[0], str):
-            try:
-                dates = pd.to_datetime(dates, format='%m/%d/%Y')
-                dates = dates.to_series().apply(lambda x: x.toordinal()).values
-
-                if not np.all((700000 <= dates) & (dates <= 800000)):
-                    invalid_dates = dates[(dates < 700000) | (dates > 800000)]
-                    messagebox.showerror("Error", 
-                        f"The converted date is out of range(700000-800000): {invalid_dates[:5]}...")
-                    return None
-            except Exception as e:
-                messagebox.showerror("Error", f"Date conversion failed:{str(e)}")
-                return None
+                read_content = f"""
+in_path = '{params['input_file']}'
+# read example csv for HLS time series
+if in_path.endswith('.csv'):
+    data = pd.read_csv(in_path)
+elif in_path.endswith('.xlsx') or in_path.endswith('.xls'):
+    data = pd.read_excel(in_path)
+elif in_path.endswith('.parquet'):
+    data = pd.read_parquet(in_path)
+elif in_path.endswith('.feather') or in_path.endswith('.arrow'):
+    data = pd.read_feather(in_path)
+elif in_path.endswith('.npz'):
+    with np.load(in_path) as archive:
+        data = pd.DataFrame({{name: archive[name] for name in archive.files}})
+else:
+    raise ValueError("Unsupported file format")"""
+            mid_content = f"""{read_content}
+# split the array by the column
+date_column = '{params['date_column']}'  
+data.columns = ['dates' if col == date_column else col for col in data.columns]
+dates = data['dates'].values
+dates = check_and_convert_dates(dates)
 
-        return np.array(dates, dtype=np.int64) if not isinstance(dates, np.ndarray) else dates.astype(np.int64)
-    
-    except Exception as e:
-        messagebox.showerror("Error", f"Error occurred while processing date: {str(e)}")
-        return None
-    
-def display_sccd_result_sif(
-    data: np.ndarray,
-    band_names: List[str],
-    band_index: int,
-    indicator_band_index: int,
-    sccd_result: SccdOutput,
-    axe: Axes,
-    title: str = 'S-CCD',
-    states: Optional[pd.DataFrame] = None,
-    anomaly: Optional[anomaly] = None,
-    trimodal: Optional[bool] = False, 
-    plot_kwargs: Optional[Dict] = None
-) -> Tuple[plt.Figure, List[plt.Axes]]:
-    
-    w = np.pi * 2 / 365.25
+if not all(np.issubdtype(data[col].dtype, np.integer) for col in data.select_dtypes(include=[np.number]).columns):
+    messagebox.showerror("Error", f"The data contains non-integer type numeric columns")
 
-    # Set default plot parameters
-    default_plot_kwargs: Dict[str, Union[int, float, str]] = {
-        'marker_size': 5,
-        'marker_alpha': 0.7,
-        'line_color': 'orange',
-        'font_size': 14
-    }
-    if plot_kwargs is not None:
-        default_plot_kwargs.update(plot_kwargs)
+merge = np.stack([data[b].values for b in {params['selected_bands']}], axis=1)
 
-    # Extract values with proper type casting
-    font_size = default_plot_kwargs.get('font_size', 14)
-    try:
-        title_font_size = int(font_size) + 2
-    except (TypeError, ValueError):
-        title_font_size = 16 
+qa_column = '{params['qa_column']}'  
+if qa_column in data.columns:
+    data.columns = ['qa' if col == qa_column else col for col in data.columns]
+    qa = data['qa'].values
+else:
+    
+    qa = np.zeros_like(dates, dtype=int)
+    data['qa'] = qa
+# 显示函数直接使用的观测数组（int16/int32）和有效观测掩膜
+series = PreparedSeries(dates, merge, qa, {params['selected_bands']})
+fitting_coefficients = True if '{params['fitting_curve']}' == 'Lasso' else False
+plot_kwargs = {{'render_mode': '{params.get('render_mode', 'fast')}'}}
+"""
+            
+            if params['method'] == 'COLD':
+                script_content = f"""
+cold_result = cold_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}))        
 
-    # Clean and prepare data
-    data = data[np.all(np.isfinite(data), axis=1)]
-    data_df = pd.DataFrame(data, columns=['dates'] + band_names + ['qa'])
+sns.set_theme(style="darkgrid")
+sns.set_context("notebook")
 
-    # Plot COLD results
-    w = np.pi * 2 / 365.25
-    slope_scale = 10000
+fig, ax = plt.subplots(figsize=(12, 5))
 
-    # Prepare clean data for COLD plot
-    data_clean = data_df[(data_df['qa'] == 0) | (data_df['qa'] == 1)].copy()
-    data_clean = data_clean[(data_clean >= 0).all(axis=1) & (data_clean.drop(columns="dates") <= 10000).all(axis=1)]
-    calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in data_clean["dates"]]
-    data_clean.loc[:, 'dates_formal'] = calendar_dates
-    
-    # Calculate y-axis limits
-    band_name = band_names[band_index]
-    band_values = data_clean[data_clean['qa'] == 0 | (data_clean['qa'] == 1)][band_name]
-    q01, q99 = np.quantile(band_values, [0.01, 0.99])
-    extra = (q99 - q01) * 0.4
-    ylim_low = q01 - extra
-    ylim_high = q99 + extra
+display_cold_result(data=series, 
+                band_names={params['selected_bands']}, 
+                band_index={params['selected_bands']}.index('{params['display_band']}'), 
+                indicator_band_index={params['selected_bands']}.index('{params['break_indicator']}'), 
+                cold_result=cold_result, 
+                axe=ax, 
+                title="COLD",
+                plot_kwargs=plot_kwargs)
+plt.show()
+"""
 
-    # Plot SCCD observations
-    axe.plot(
-        'dates_formal', band_name, 'go',
-        markersize=default_plot_kwargs['marker_size'],
-        alpha=default_plot_kwargs['marker_alpha'],
-        data=data_clean
-    )
+            elif params['method'] == 'S-CCD':
+                if params['output'] == 'anomaly':
+                    if params['fitting_curve'] == 'States':
+                        script_content = f"""
+# pyxccd不能在一次调用中同时输出anomaly和states，两次调用得到的rec_cg相同
+sccd_result, anomaly = sccd_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}),output_anomaly=True, fitting_coefs=fitting_coefficients, trimodal={params['trimodal']})
+sccd_result, states = sccd_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}), state_intervaldays=1, fitting_coefs=fitting_coefficients, trimodal={params['trimodal']})
+                        
+sns.set_theme(style="darkgrid")
+sns.set_context("notebook")
+fig, axes = plt.subplots(figsize=(12, 5))
+plt.subplots_adjust(hspace=0.4)
+                        
+
+display_sccd_result_sif(data=series,  
+                    band_names={params['selected_bands']}, 
+                    band_index={params['selected_bands']}.index('{params['display_band']}'), 
+                    indicator_band_index={params['selected_bands']}.index('{params['break_indicator']}'), 
+                    sccd_result=sccd_result,  
+                    axe=axes, 
+                    title="S-CCD anomaly",
+                    states=states,
+                    anomaly=anomaly,
+                    trimodal={params['trimodal']},
+                    plot_kwargs=plot_kwargs)
+                        
+plt.show()    
+"""
+                    else:
+                        script_content = f"""
+sccd_result, anomaly = sccd_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}),output_anomaly=True, fitting_coefs=fitting_coefficients, trimodal={params['trimodal']})
+sns.set_theme(style="darkgrid")
+sns.set_context("notebook")
+fig, axes = plt.subplots(figsize=(12, 5))
+plt.subplots_adjust(hspace=0.4)
+
+
+display_sccd_result_sif(data=series,  
+                    band_names={params['selected_bands']}, 
+                    band_index={params['selected_bands']}.index('{params['display_band']}'), 
+                    indicator_band_index={params['selected_bands']}.index('{params['break_indicator']}'), 
+                    sccd_result=sccd_result, 
+                    anomaly=anomaly, 
+                    axe=axes, 
+                    title="S-CCD anomaly",
+                    trimodal={params['trimodal']},
+                    plot_kwargs=plot_kwargs)
+                        
+plt.show()     
+"""
+                
+                elif params['output'] == 'state_components':
+                    script_content = f"""
+sccd_result, states = sccd_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}),output_anomaly=False, state_intervaldays=1, fitting_coefs=fitting_coefficients, trimodal={params['trimodal']})
+                
+sns.set_theme(style="darkgrid")
+sns.set_context("notebook")
+                    
+n_subplots = 5 if {params['trimodal']} else 4
+fig, axes = plt.subplots(n_subplots, 1, figsize=[11, 9], sharex=True)
+plt.subplots_adjust(left=0.08, right=0.98, top=0.92, bottom=0.1)
+                    
+display_sccd_states_flex(data_df=series, 
+                    axes=axes, 
+                    states=states, 
+                    band_name='{params['display_band']}',
+                    band_index={params['selected_bands']}.index('{params['display_band']}'), 
+                    variable_name='{params['display_band']}', 
+                    title="S-CCD",
+                    plot_kwargs=plot_kwargs)
+                    
+plt.show()
+"""
+                
+                elif params['output'] == 'breaks':
+                    if params['fitting_curve'] == 'States': 
+                        script_content = f"""
+sccd_result, states = sccd_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}),output_anomaly=False, state_intervaldays=1, fitting_coefs=fitting_coefficients, trimodal={params['trimodal']})
+                
+sns.set_theme(style="darkgrid")
+sns.set_context("notebook")
+
+fig, ax = plt.subplots(figsize=(12, 5))
+display_sccd_result_sif(data=series, 
+                    band_names={params['selected_bands']}, 
+                    band_index={params['selected_bands']}.index('{params['display_band']}'), 
+                    indicator_band_index={params['selected_bands']}.index('{params['break_indicator']}'), 
+                    sccd_result=sccd_result, 
+                    axe=ax, 
+                    title="S-CCD",
+                    states=states,
+                    plot_kwargs=plot_kwargs)
+plt.show()
+"""            
+                    else:
+                        script_content = f"""
+sccd_result = sccd_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}),output_anomaly=False, fitting_coefs=fitting_coefficients, trimodal={params['trimodal']})
+
+                
+sns.set_theme(style="darkgrid")
+sns.set_context("notebook")
+
+fig, ax = plt.subplots(figsize=(12, 5))
+display_sccd_result(data=series, 
+                band_names={params['selected_bands']}, 
+                band_index={params['selected_bands']}.index('{params['display_band']}'), 
+                indicator_band_index={params['selected_bands']}.index('{params['break_indicator']}'), 
+                sccd_result=sccd_result, 
+                axe=ax, 
+                title="SCCD",
+                plot_kwargs=plot_kwargs)
+plt.show()
+            """
 
-    # Plot SCCD segments - NEW: use states if provided
-    if states is not None:
-        # Build column names based on band_index
-        col_prefix = f"b{band_index}"
-        trend_col = f"{col_prefix}_trend"
-        annual_col = f"{col_prefix}_annual"
-        semiannual_col = f"{col_prefix}_semiannual"
-        trimodal_col = f"{col_prefix}_trimodal"
-        
-        # Check required columns exist
-        required_cols = [trend_col, annual_col, semiannual_col]
-        missing_cols = [col for col in required_cols if col not in states.columns]
-        if missing_cols:
-            raise ValueError(f"Missing required columns in states: {missing_cols}")
         
-        # Convert dates
-        states["dates_formal"] = [pd.Timestamp.fromordinal(int(row)) for row in states["dates"]]
+            full_script = header_content + mid_content + script_content
+            text_area.insert(tk.INSERT, full_script)
+            
+        except Exception as e:
+            text_area.insert(tk.INSERT, f"Error getting source code: {str(e)}")
+            
+        text_area.config(state=tk.DISABLED)
         
-        # Calculate combined prediction (General)
-        has_trimodal = trimodal_col in states.columns
-        if has_trimodal:
-            states["General"] = states[trend_col] + states[annual_col] + states[semiannual_col] + states[trimodal_col]
+        close_button = ttk.Button(
+            script_window, 
+            text="Close", 
+            command=script_window.destroy
+        )
+        close_button.pack(pady=5)
+    
+    
+    
+    def collect_params(self):
+        """检查界面上的输入并收集分析参数；输入不完整时提示错误并返回None"""
+        # 验证输入
+        if self.df is None:
+            messagebox.showerror("Error", "Please select a data file first")
+            return None
+        
+        if not self.selected_columns['date']:
+            messagebox.showerror("Error", "Please select the date column")
+            return None
+        
+        if not self.selected_columns['display_band']:
+            messagebox.showerror("Error", "Please select the display band column")
+            return None
+        
+        if not self.selected_columns['bands']:
+            messagebox.showerror("Error", "Please select at least one band")
+            return None
+        
+        if not self.selected_columns['qa'] and self.qa_enable_var.get():
+            messagebox.showerror("Error", "Please select the QA column")
+            return None
+        
+        
+        # 验证 P_CG 和 CONSE 参数（与命令行共用）
+        try:
+            check_detection_params({'P_CG': self.p_cg_var.get(), 'CONSE': self.conse_var.get()})
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return None
+        
+        # 获取output选项
+        output_option = self.output_var.get()
+        
+        # 收集参数
+        params = {
+            'input_file': self.input_var.get(),
+            'method': self.method_var.get(),
+            'date_column': self.selected_columns['date'],
+            'qa_column': self.selected_columns['qa'],
+            'selected_bands': list(self.selected_columns['bands']),
+            'break_indicator': self.selected_columns['break_indicator'],
+            'display_band': self.selected_columns['display_band'],
+            'P_CG': self.p_cg_var.get(),
+            'CONSE': self.conse_var.get(),
+            'output': output_option,  # 使用新的output参数
+            'Lam': self.lam_var.get(),
+            'trimodal': self.trimodal_var.get(),
+            'fitting_curve': self.fitting_curve_var.get(),
+            'render_mode': self.render_mode_var.get(),
+        }
+        if self.is_raster_input(params):
+            params['pixel'] = self.raster_pixel
+        return params
+    
+    def run_analysis(self, compare=False):
+        """运行分析；compare为True时同时运行COLD和S-CCD并对比断点"""
+        params = self.collect_params()
+        if params is None:
+            return
+        if compare:
+            try:
+                tolerance = int(self.match_tolerance_var.get())
+                if tolerance < 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("Error", "The match tolerance must be a non-negative integer number of days")
+                return
+            params.update(compare=True, match_tolerance=tolerance)
+        # 保存参数以便在show_script中使用
+        self.last_params = params
+        # messagebox.showinfo("开始分析", f"开始执行变化检测分析\n方法: {params['method']}")
+        print("分析参数:", params)
+        # 记录各阶段性能：读取和输入准备在此记录，检测阶段由detect_change记录后随结果返回
+        params.update(profile=True, trace_memory=self.trace_memory_var.get())
+        profiler = StageProfiler(trace_memory=params['trace_memory'])
+        
+        with profiling(profiler):
+            # 复用已读取的数据（仅当文件在磁盘上发生变化时才重新读取）
+            data = self.load_current_data(params, retry=partial(self.run_analysis, compare))
+            if data is None:
+                return
+            
+            # 检测结果已缓存时（例如只修改了显示波段或断点指示波段）直接重绘，不再提交任务
+            try:
+                inputs = self.prepare_current_inputs(params, data)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+        if is_detection_cached(params, inputs):
+            self.on_job_done(None, params, detect_change(params, inputs=inputs), profiler)
+            self.update_job_status()
+            return
+        
+        if compare:
+            # 未缓存的COLD和S-CCD调用同时在comparison_pool的两个进程中执行
+            # （JobExecutor的工作进程是daemon进程，不能再创建进程池），完成后由poll_comparison绘图
+            if self.comparison is not None:
+                messagebox.showerror("Error", "A comparison is already running")
+                return
+            submitted = submit_uncached(comparison_pool(), plan_detection(params, inputs), inputs)
+            self.comparison = (params, inputs, submitted, profiler)
+            self.poll_comparison()
+            return
+        
+        # 提交到后台执行器，界面保持响应；结果由poll_jobs在主线程中绘制。
+        # 已准备好的输入随任务一起发送，工作进程不再重复检查日期和合并波段
+        job_id = self.executor.submit(partial(detect_change, inputs=inputs), params)
+        self.jobs[job_id] = (params, profiler)
+        self.update_job_status()
+        self.schedule_poll()
+    
+    def run_nrt_update(self):
+        """
+        近实时监测：用输入文件中新追加的观测增量更新保存的S-CCD状态。更新（没有状态时对整个序列
+        建立状态）和状态文件的读写作为后台任务执行，可以取消，完成后由on_nrt_done绘图
+        """
+        params = self.collect_params()
+        if params is None:
+            return
+        if params['method'] != 'S-CCD':
+            messagebox.showerror("Error", "Near-real-time updates are only available for S-CCD")
+            return
+        data = self.load_current_data(params, retry=self.run_nrt_update)
+        if data is None:
+            return
+        try:
+            inputs = self.prepare_current_inputs(params, data)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        job_id = self.executor.submit(partial(update_nrt_state, inputs=inputs), params)
+        self.jobs[job_id] = (params, None)
+        self.update_job_status()
+        self.schedule_poll()
+    
+    def on_nrt_done(self, params, result):
+        """
+        近实时更新完成后在主线程中绘图：当前显示的就是该状态上一次的结果时，
+        只重绘近实时投影、新观测和新断点，否则绘制完整视图
+        """
+        for warning in result['warnings']:
+            messagebox.showerror("Error", warning)
+        
+        view = (result['state_path'], params['display_band'], params['break_indicator'], params['render_mode'])
+        if result['previous'] is not None and self.nrt_view == (view, result['since']):
+            plot_nrt_tail(self.figure.axes[0], params, result)
+            self.canvas.draw_idle()
         else:
-            states["General"] = states[trend_col] + states[annual_col] + states[semiannual_col]
+            plot_nrt_result(self.figure, params, result)
+            self.toolbar.update()
+            self.canvas.draw()
+        self.nrt_view = (view, result['last_date'])
+        self.last_params = params
+        # 任务结束后状态栏显示"Ready | last_timing"，其中包含状态文件的位置
+        self.last_timing = f"NRT: {len(result['new_rows'])} new observation(s) | {format_timings(result['timings'])} | state: {result['state_path']}"
+    
+    def poll_comparison(self):
+        """等待对比模式的并行检测全部完成，结果加入DETECTION_CACHE后按缓存绘图"""
+        params, inputs, submitted, profiler = self.comparison
+        running = [step.label for step, future in submitted if not future.done()]
+        if running:
+            self.status_var.set("Comparing: running " + ", ".join(running))
+            self.root.after(100, self.poll_comparison)
+            return
+        self.comparison = None
+        try:
+            durations = collect_detections(submitted, DETECTION_CACHE)
+        except Exception as e:
+            messagebox.showerror("Error", f"Comparison failed: {type(e).__name__}: {e}")
+            self.update_job_status()
+            return
+        self.on_job_done(None, params, detect_change(params, inputs=inputs, durations=durations), profiler)
+        self.update_job_status()
+        self.report_store_errors()
+    
+    def run_batch_analysis(self):
+        """批处理：按ID列对长表中的每条像元时间序列检测，断点记录写入Parquet分片"""
+        if self.batch_job is not None and self.batch_job.is_alive():
+            messagebox.showerror("Error", "A batch run is already in progress")
+            return
+        if not self.input_var.get() or not self.selected_columns['date'] or not self.selected_columns['bands']:
+            messagebox.showerror("Error", "Please select an input file, a date column and at least one band")
+            return
+        if self.raster_stack is not None and self.input_var.get() == self.raster_stack.directory:
+            messagebox.showerror("Error", "Batch runs need a long table input with an ID column")
+            return
+        
+        params = {
+            'input_file': self.input_var.get(),
+            'method': self.method_var.get(),
+            'date_column': self.selected_columns['date'],
+            'qa_column': self.selected_columns['qa'],
+            'selected_bands': list(self.selected_columns['bands']),
+            'P_CG': self.p_cg_var.get(),
+            'CONSE': self.conse_var.get(),
+            'Lam': self.lam_var.get(),
+            'trimodal': self.trimodal_var.get(),
+            'fitting_curve': self.fitting_curve_var.get(),
+        }
+        default_id = 'pixel_id' if 'pixel_id' in self.available_columns else ''
+        id_column = simpledialog.askstring("Batch", "ID column:", initialvalue=default_id, parent=self.root)
+        if not id_column:
+            return
+        if id_column not in self.available_columns:
+            messagebox.showerror("Error", f"Column '{id_column}' not found in the data file")
+            return
+        data = self.load_current_data(params, id_column)
+        if data is None:
+            return
+        # 选择已有的批处理输出目录时从中断处继续
+        output_dir = filedialog.askdirectory(title="Select the output directory for break records")
+        if not output_dir:
+            return
+        
+        print("批处理参数:", params, "ID列:", id_column, "输出:", output_dir)
+        self.batch_job = BatchJob(params, output_dir, data=data, id_column=id_column)
+        self.batch_job.start()
+        self.cancel_button.config(state="normal")
+        self.poll_batch()
+    
+    def poll_batch(self):
+        """轮询批处理任务的进度和结果"""
+        for event in self.batch_job.poll():
+            if event[0] == 'progress':
+                self.progress_var.set(event[1])
+                self.status_var.set(event[2])
+            elif event[0] == 'done':
+                summary = event[1]
+                state = "stopped (run again with the same settings to resume)" if summary['stopped'] else "finished"
+                messagebox.showinfo(
+                    "Batch",
+                    f"Batch {state}: {summary['completed_chunks']}/{summary['n_chunks']} chunks, "
+                    f"{summary['n_pixels']} pixels, {summary['failed_pixels']} failed, "
+                    f"{summary['seconds']:.1f} s\nResults: {summary['output_dir']}"
+                )
+            elif event[0] == 'error':
+                print(event[2])
+                messagebox.showerror("Error", f"Batch run failed: {event[1]}")
+        if self.batch_job.is_alive():
+            self.root.after(200, self.poll_batch)
+        else:
+            self.update_job_status()
+    
+    def open_sweep_dialog(self):
+        """参数扫描对话框：按P_CG/CONSE/Lam的取值网格并行检测，结果表可排序，点击行按该组合绘图"""
+        if self.sweep_window is not None:
+            self.sweep_window.lift()
+            return
+        window = tk.Toplevel(self.root)
+        window.title("Parameter Sweep")
+        window.geometry("900x500")
+        window.protocol("WM_DELETE_WINDOW", self.close_sweep_dialog)
+        self.sweep_window = window
+        
+        # 取值输入框，默认为主窗口中的当前取值
+        form = ttk.Frame(window, padding=10)
+        form.pack(fill=tk.X)
+        self.sweep_vars = {}
+        for row, (name, var) in enumerate((('P_CG', self.p_cg_var), ('CONSE', self.conse_var), ('Lam', self.lam_var))):
+            ttk.Label(form, text=f"{name} values:").grid(row=row, column=0, sticky='w', pady=2)
+            self.sweep_vars[name] = tk.StringVar(value=var.get())
+            ttk.Entry(form, textvariable=self.sweep_vars[name], width=40).grid(row=row, column=1, sticky='we', padx=5, pady=2)
+        ttk.Label(form, text="Lists like '0.95, 0.99' or ranges like '4:8:2'", foreground='gray').grid(row=3, column=1, sticky='w', padx=5)
+        form.columnconfigure(1, weight=1)
+        
+        button_frame = ttk.Frame(window, padding=(10, 0))
+        button_frame.pack(fill=tk.X)
+        self.sweep_run_button = ttk.Button(button_frame, text="Run sweep", command=self.start_sweep)
+        self.sweep_run_button.pack(side=tk.LEFT)
+        self.sweep_stop_button = ttk.Button(button_frame, text="Stop", command=self.stop_sweep, state="disabled")
+        self.sweep_stop_button.pack(side=tk.LEFT, padx=(10, 0))
+        self.sweep_status_var = tk.StringVar(value="Click a row to plot that configuration")
+        ttk.Label(button_frame, textvariable=self.sweep_status_var).pack(side=tk.LEFT, padx=(10, 0))
+        
+        # 结果表：点击列标题排序
+        table_frame = ttk.Frame(window, padding=10)
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        columns = ('P_CG', 'CONSE', 'Lam', 'breaks', 'break_dates', 'rmse', 'seconds')
+        titles = ("P_CG", "CONSE", "Lam", "Breaks", "Break dates", "RMSE", "Time (s)")
+        self.sweep_tree = ttk.Treeview(table_frame, columns=columns, show='headings', selectmode='browse')
+        for column, title in zip(columns, titles):
+            self.sweep_tree.heading(column, text=title, command=lambda c=column: self.sort_sweep_table(c))
+            if column == 'break_dates':
+                self.sweep_tree.column(column, width=320, anchor='w')
+            else:
+                self.sweep_tree.column(column, width=80, anchor='e')
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.sweep_tree.yview)
+        self.sweep_tree.configure(yscrollcommand=scrollbar.set)
+        self.sweep_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.sweep_tree.bind('<<TreeviewSelect>>', self.on_sweep_row_selected)
+        # 表格行编号 -> 结果行；当前排序(列, 是否降序)
+        self.sweep_rows = {}
+        self.sweep_sort = (None, False)
+    
+    def close_sweep_dialog(self):
+        """关闭参数扫描对话框，并停止正在运行的扫描"""
+        self.stop_sweep()
+        self.sweep_window.destroy()
+        self.sweep_window = None
+    
+    def start_sweep(self):
+        """按输入的取值网格开始参数扫描"""
+        if self.sweep_job is not None and self.sweep_job.is_alive():
+            return
+        params = self.collect_params()
+        if params is None:
+            return
+        try:
+            configs = sweep_configs(
+                parse_sweep_values(self.sweep_vars['P_CG'].get()),
+                parse_sweep_values(self.sweep_vars['CONSE'].get(), int),
+                parse_sweep_values(self.sweep_vars['Lam'].get()),
+            )
+            for config in configs:
+                check_detection_params(config)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e), parent=self.sweep_window)
+            return
+        data = self.load_current_data(params, retry=self.start_sweep)
+        if data is None:
+            return
+        try:
+            inputs = self.prepare_current_inputs(params, data)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e), parent=self.sweep_window)
+            return
+        
+        print("参数扫描:", len(configs), "个组合", params)
+        self.sweep_params, self.sweep_inputs, self.sweep_total = params, inputs, len(configs)
+        self.sweep_tree.delete(*self.sweep_tree.get_children())
+        self.sweep_rows.clear()
+        # 已缓存的组合直接在主线程中汇总，其余组合交给进程池
+        todo = []
+        for config in configs:
+            config_params = dict(params, **config)
+            if is_detection_cached(config_params, inputs):
+                row = sweep_row(config_params, detect_change(config_params, inputs=inputs))
+                row['seconds'] = 0.0
+                self.add_sweep_row(row)
+            else:
+                todo.append(config)
+        if not todo:
+            self.sweep_status_var.set(f"{len(configs)} configuration(s), all from cache")
+            return
+        self.sweep_job = SweepJob(params, inputs, todo)
+        self.sweep_job.start()
+        self.sweep_run_button.config(state="disabled")
+        self.sweep_stop_button.config(state="normal")
+        self.poll_sweep()
+    
+    def stop_sweep(self):
+        """停止参数扫描：正在运行的组合完成后结束"""
+        if self.sweep_job is not None and self.sweep_job.is_alive():
+            self.sweep_job.cancel()
+    
+    def poll_sweep(self):
+        """轮询参数扫描的结果：检测结果加入DETECTION_CACHE，结果行加入表格"""
+        for event in self.sweep_job.poll():
+            if event[0] == 'result':
+                DETECTION_CACHE.update(event[2])
+                if self.sweep_window is not None:
+                    self.add_sweep_row(event[1])
+            elif event[0] == 'error':
+                print(event[2])
+                messagebox.showerror("Error", f"Parameter sweep failed: {event[1]}")
+        self.report_store_errors()
+        if self.sweep_job.is_alive():
+            self.root.after(200, self.poll_sweep)
+        if self.sweep_window is None:
+            return
+        if self.sweep_job.is_alive():
+            self.sweep_status_var.set(f"Running: {len(self.sweep_rows)}/{self.sweep_total} configurations")
+        else:
+            self.sweep_status_var.set(f"{len(self.sweep_rows)}/{self.sweep_total} configurations | click a row to plot it")
+            self.sweep_run_button.config(state="normal")
+            self.sweep_stop_button.config(state="disabled")
+    
+    def add_sweep_row(self, row):
+        """在参数扫描结果表中加入一行"""
+        iid = str(len(self.sweep_rows))
+        self.sweep_rows[iid] = row
+        if row['error']:
+            values = (row['P_CG'], row['CONSE'], row['Lam'], "", row['error'], "", "")
+        else:
+            values = (
+                row['P_CG'], row['CONSE'], row['Lam'], row['breaks'], ", ".join(row['break_dates']),
+                f"{row['rmse']:.2f}", f"{row['seconds']:.2f}"
+            )
+        self.sweep_tree.insert('', 'end', iid=iid, values=values)
+    
+    def sort_sweep_table(self, column):
+        """按列排序结果表，再次点击同一列时反向排序；失败的组合始终排在最后"""
+        previous, descending = self.sweep_sort
+        descending = not descending if column == previous else False
+        self.sweep_sort = (column, descending)
+        
+        def sort_key(iid):
+            row = self.sweep_rows[iid]
+            if column == 'break_dates':
+                return row['break_dates']
+            return float(row[column])
+        
+        succeeded = [iid for iid, row in self.sweep_rows.items() if not row['error']]
+        failed = [iid for iid, row in self.sweep_rows.items() if row['error']]
+        ordered = sorted(succeeded, key=sort_key, reverse=descending) + failed
+        for index, iid in enumerate(ordered):
+            self.sweep_tree.move(iid, '', index)
+    
+    def on_sweep_row_selected(self, event):
+        """按选中行的参数组合绘图：检测结果已缓存时直接绘制，否则与run_analysis一样提交到后台执行器"""
+        selection = self.sweep_tree.selection()
+        if not selection:
+            return
+        row = self.sweep_rows[selection[0]]
+        if row['error']:
+            return
+        params = dict(self.sweep_params, P_CG=row['P_CG'], CONSE=row['CONSE'], Lam=row['Lam'])
+        # 同步主窗口的参数输入框，之后Run和View Script使用同一组合
+        self.p_cg_var.set(row['P_CG'])
+        self.conse_var.set(row['CONSE'])
+        self.lam_var.set(row['Lam'])
+        self.last_params = params
+        if is_detection_cached(params, self.sweep_inputs):
+            self.on_job_done(None, params, detect_change(params, inputs=self.sweep_inputs))
+            return
+        # 缓存项已被淘汰（或该组合的检测结果不在缓存中）时不能在Tk线程中重新检测
+        job_id = self.executor.submit(partial(detect_change, inputs=self.sweep_inputs), params)
+        self.jobs[job_id] = (params, None)
+        self.update_job_status()
+        self.schedule_poll()
+    
+    def load_current_data(self, params, *extra_columns, retry=None):
+        """
+        检查所选列是否存在，并从数据缓存获取这些列（整数列为int16/int32）；栅格堆栈模式下
+        返回所选像元的时间序列。像元正在提取或目录中的场景有变化（此时在后台重新提取）时返回None，
+        提取完成后调用retry（重新执行本次操作）
+        """
+        self.ensure_modules()
+        if self.is_raster_input(params):
+            if self.pixel_read is not None:
+                # 新选择的像元仍在提取：完成后按该像元重新执行本次操作
+                stack, pixel, future, _, start = self.pixel_read
+                self.pixel_read = (stack, pixel, future, retry, start)
+                return None
+            if params.get('pixel') is None:
+                messagebox.showerror("Error", "Please click a pixel in the quicklook window first")
+                return None
+            try:
+                if self.raster_stack.refresh():
+                    self.read_pixel(*params['pixel'], retry)
+                    return None
+                check_columns(params, self.pixel_data)
+            except (ValueError, OSError) as e:
+                messagebox.showerror("Error", str(e))
+                return None
+            return self.pixel_data
+        try:
+            check_columns(params, scan_table(params['input_file'], 0))
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return None
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to read the data file: {str(e)}")
+            return None
+        
+        try:
+            with profile_stage("read"):
+                return DATASET_CACHE.load(params['input_file'], input_columns(params, *extra_columns), compact=True)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to read the data file: {str(e)}")
+            return None
+    
+    def prepare_current_inputs(self, params, data):
+        """
+        整理检测输入（日期转换、波段合并、有效观测掩膜和分位数）；文件未变化（栅格堆栈为同一像元
+        且场景未变化）且日期、QA和波段列与上次相同时直接复用上次的结果，例如只切换显示波段时
+        """
+        if self.is_raster_input(params):
+            source = (self.raster_stack.directory, params['pixel'], self.raster_stack.version)
+        else:
+            source = DatasetCache.file_key(params['input_file'])
+        key = (source, params['date_column'], params['qa_column'], tuple(params['selected_bands']))
+        if self.prepared_inputs is None or self.prepared_inputs[0] != key:
+            self.prepared_inputs = (key, prepare_inputs(params, data))
+        return self.prepared_inputs[1]
+    
+    def schedule_poll(self):
+        """启动结果轮询（若尚未启动）"""
+        if self.poll_after_id is None:
+            self.poll_after_id = self.root.after(100, self.poll_jobs)
+    
+    def poll_jobs(self):
+        """通过root.after定期轮询后台任务的进度和结果"""
+        self.poll_after_id = None
+        for event in self.executor.poll():
+            kind, job_id = event[0], event[1]
+            if kind == 'started':
+                self.progress_var.set(0)
+            elif kind == 'progress':
+                self.progress_var.set(event[2])
+                self.status_var.set(f"Job #{job_id}: {event[3]}")
+            elif kind == 'done':
+                params, profiler = self.jobs.pop(job_id, (None, None))
+                self.progress_var.set(100)
+                DETECTION_CACHE.update(event[2]['detections'])
+                if 'state_path' in event[2]:
+                    self.on_nrt_done(params, event[2])
+                else:
+                    self.on_job_done(job_id, params, event[2], profiler)
+            elif kind == 'error':
+                self.jobs.pop(job_id, None)
+                if event[3]:
+                    print(event[3])
+                messagebox.showerror("Error", f"Job #{job_id} failed: {event[2]}")
+            elif kind == 'cancelled':
+                self.jobs.pop(job_id, None)
+                print(f"Job #{job_id} cancelled")
+        self.update_job_status()
+        self.report_store_errors()
+        if self.executor.is_busy():
+            self.schedule_poll()
+    
+    def on_job_done(self, job_id, params, result, profiler=None):
+        """任务完成后在主线程中绘图，并合并显示各阶段的性能记录"""
+        for warning in result['warnings']:
+            messagebox.showerror("Error", warning)
+        self.last_timing = format_timings(result['timings'])
+        print("检测耗时:", self.last_timing)
+        if profiler is None:
+            profiler = StageProfiler(trace_memory=params.get('trace_memory', False))
+        profiler.records.extend(result.get('profile', []))
+        # 显示函数本身不做性能记录（View Script中嵌入的是同一份源代码），分阶段计时在这里进行
+        with profiling(profiler), profile_stage("draw"):
+            with profile_stage("plot"):
+                plot_change_detection(self.figure, params, result)
+            self.nrt_view = None
+            # 新结果的缩放/平移历史从头开始
+            self.toolbar.update()
+            # 同步绘制，使draw阶段包含栅格化的耗时
+            with profile_stage("render"):
+                self.canvas.draw()
+        self.show_profile(profiler.records, params)
+        if result.get('matches') is not None:
+            self.show_break_matches(params, result['matches'])
+    
+    def show_break_matches(self, params, matches):
+        """对比模式：列出COLD和S-CCD的断点以及在容差内配对的结果"""
+        if self.matches_window is None or not self.matches_window.winfo_exists():
+            window = tk.Toplevel(self.root)
+            window.title("Break Comparison")
+            window.geometry("520x320")
+            self.matches_summary_var = tk.StringVar()
+            ttk.Label(window, textvariable=self.matches_summary_var, padding=(10, 10, 10, 0)).pack(fill=tk.X)
+            columns = ('cold', 'sccd', 'difference', 'status')
+            self.matches_tree = ttk.Treeview(window, columns=columns, show='headings')
+            for column, title in zip(columns, ("COLD break", "S-CCD break", "Δ days", "Status")):
+                self.matches_tree.heading(column, text=title)
+                self.matches_tree.column(column, width=120, anchor='center')
+            self.matches_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+            self.matches_window = window
         
-        # Plot fitted curve
-        g = sns.lineplot(
-            x="dates_formal", y="General",
-            data=states,
-            label="Model fit",
-            ax=axe,
-            color=default_plot_kwargs['line_color']
+        format_day = lambda day: "" if day is None else pd.Timestamp.fromordinal(day).strftime('%Y-%m-%d')
+        self.matches_tree.delete(*self.matches_tree.get_children())
+        for cold_day, sccd_day, difference in matches:
+            status = "Matched" if difference is not None else ("COLD only" if sccd_day is None else "S-CCD only")
+            self.matches_tree.insert('', 'end', values=(
+                format_day(cold_day), format_day(sccd_day), "" if difference is None else f"{difference:+d}", status
+            ))
+        n_matched = sum(difference is not None for _, _, difference in matches)
+        self.matches_summary_var.set(
+            f"{n_matched} matched within ±{params['match_tolerance']} days, "
+            f"{sum(sccd is None for _, sccd, _ in matches)} COLD only, {sum(cold is None for cold, _, _ in matches)} S-CCD only"
         )
-        if g.legend_ is not None: 
-            g.legend_.remove()
+        self.matches_window.lift()
+    
+    def cancel_job(self):
+        """取消正在运行的任务"""
+        if self.batch_job is not None and self.batch_job.is_alive():
+            self.batch_job.cancel()
+            self.status_var.set("Stopping batch after the submitted chunks finish...")
+            return
+        if not self.executor.cancel():
+            return
+        self.progress_var.set(0)
+        self.update_job_status()
+        self.schedule_poll()
+    
+    def cancel_all_jobs(self):
+        """取消正在运行和排队中的所有任务"""
+        if not self.executor.cancel_all():
+            return
+        self.progress_var.set(0)
+        self.update_job_status()
+        self.schedule_poll()
+    
+    def report_store_errors(self):
+        """结果保存到磁盘失败时在状态栏中提示（结果仍在内存中可用）；后台写入未完成时稍后再检查"""
+        errors = DETECTION_CACHE.pop_store_errors()
+        if errors:
+            self.status_var.set(f"{self.status_var.get()} | {errors[-1]}")
+        if DETECTION_CACHE.pending_writes and self.store_check_id is None:
+            self.store_check_id = self.root.after(200, self.check_store_writes)
+    
+    def check_store_writes(self):
+        self.store_check_id = None
+        self.report_store_errors()
+    
+    def update_job_status(self):
+        """更新状态栏（运行中的任务和排队数量）"""
+        running = self.executor.running_job
+        pending = self.executor.pending_count
+        if self.batch_job is not None and self.batch_job.is_alive():
+            self.cancel_button.config(state="normal")
+        elif running is None:
+            self.status_var.set(f"Ready | {self.last_timing}" if self.last_timing else "Ready")
+            self.cancel_button.config(state="disabled")
+        else:
+            if not self.status_var.get().startswith(f"Job #{running}:"):
+                self.status_var.set(f"Job #{running}: starting")
+            self.cancel_button.config(state="normal")
+        self.cancel_all_button.config(state="normal" if self.executor.is_busy() else "disabled")
+        self.queue_var.set(f"Queued: {pending}")
+    
+    def on_close(self):
+        """关闭窗口时结束后台工作进程"""
+        if self.batch_job is not None:
+            self.batch_job.cancel()
+        self.stop_sweep()
+        reset_comparison_pool()
+        self.executor.shutdown()
+        self.close_raster_stack()
+        self.root.destroy()
+        # 窗口关闭后再等待尚未写完的检测结果
+        DETECTION_CACHE.flush()
+
+
+# 有效序数日期范围（约公元1917-2190年）以及1970-01-01对应的序数日期
+DATE_ORDINAL_MIN = 700000
+DATE_ORDINAL_MAX = 800000
+UNIX_EPOCH_ORDINAL = 719163
+
+
+def script_source(*functions, **constants):
+    """生成嵌入View Script脚本的共享函数源码，保证脚本与GUI使用同一份实现"""
+    lines = [f"{name} = {value!r}" for name, value in constants.items()]
+    sources = [inspect.getsource(func) for func in functions]
+    return "\n".join(lines) + "\n\n" + "\n\n".join(sources) + "\n"
+
+
+def describe_invalid_dates(message, values, invalid, limit=10):
+    """汇总所有无效日期所在的行（最多列出limit个示例）"""
+    rows = np.flatnonzero(invalid)
+    examples = ", ".join(f"row {i}: {v!r}" for i, v in zip(rows[:limit], values[rows[:limit]].tolist()))
+    more = f", ... ({len(rows) - limit} more)" if len(rows) > limit else ""
+    return f"{message} in {len(rows)} row(s): {examples}{more}"
+
+
+def check_and_convert_dates(dates):
+    """
+    检查并转换日期列表/数组（整列向量化处理）：
+    1. 支持格式：数字（如733062）、字符串（如"8/1/1979"）或datetime类型
+    2. 字符串先按'%m/%d/%Y'解析，失败时再统一用一次自动格式推断解析
+    3. 通过datetime64运算转换为序数日期，并严格验证日期范围（700000-800000）
+    4. 返回转换后的整数格式日期数组（numpy.ndarray）
+    校验失败时抛出ValueError，并一次性列出所有无效的行。
+    """
+    values = np.asarray(dates)
+    if len(values) == 0:
+        raise ValueError("Date data is empty")
+    
+    # 数字类型日期：直接做范围检查（NaN同样视为无效）
+    if values.dtype.kind in 'iuf':
+        ordinals = values.astype(np.float64)
+    elif values.dtype.kind == 'O' and pd.api.types.infer_dtype(values, skipna=False) in ('integer', 'floating', 'mixed-integer-float'):
+        ordinals = pd.to_numeric(values, errors='coerce').astype(np.float64)
     else:
-        # Original segment-by-segment plotting
-        for segment in sccd_result.rec_cg:
-            j = np.arange(segment['t_start'], segment['t_break'] + 1, 1)
-            
-            if trimodal:  
-                plot_df = pd.DataFrame(
-                    {
-                    'dates': j,
-                    'trend': j * segment['coefs'][band_index][1] / slope_scale + segment['coefs'][band_index][0],
-                    'annual': np.cos(w * j) * segment['coefs'][band_index][2] + np.sin(w * j) * segment['coefs'][band_index][3],
-                    'semiannual': np.cos(2 * w * j) * segment['coefs'][band_index][4] + np.sin(2 * w * j) * segment['coefs'][band_index][5],
-                    'trimodal': np.cos(3 * w * j) * segment['coefs'][band_index][6] + np.sin(3 * w * j) * segment['coefs'][band_index][7]
-                })
-            else:  
-                plot_df = pd.DataFrame(
-                    {
-                    'dates': j,
-                    'trend': j * segment['coefs'][band_index][1] / slope_scale + segment['coefs'][band_index][0],
-                    'annual': np.cos(w * j) * segment['coefs'][band_index][2] + np.sin(w * j) * segment['coefs'][band_index][3],
-                    'semiannual': np.cos(2 * w * j) * segment['coefs'][band_index][4] + np.sin(2 * w * j) * segment['coefs'][band_index][5],
-                    'trimodal': j * 0
-                })
-                
-            plot_df['predicted'] = (
-                plot_df['trend'] + 
-                plot_df['annual'] + 
-                plot_df['semiannual'] +
-                plot_df['trimodal']
-            )
+        ordinals = None
+    if ordinals is not None:
+        out_of_range = ~((ordinals >= DATE_ORDINAL_MIN) & (ordinals <= DATE_ORDINAL_MAX))
+        if out_of_range.any():
+            raise ValueError(describe_invalid_dates(
+                f"Date value is not within the valid range ({DATE_ORDINAL_MIN}-{DATE_ORDINAL_MAX})", values, out_of_range))
+        return ordinals.astype(np.int64)
+    
+    # 字符串/datetime类型日期：整列解析
+    if values.dtype.kind == 'M':
+        parsed = pd.to_datetime(values)
+    else:
+        if not all(isinstance(v, str) for v in values[:1]):
+            raise ValueError(f"Unsupported date format: {values[0]!r}")
+        parsed = pd.to_datetime(values, format='%m/%d/%Y', errors='coerce')
+        if parsed.isna().any():
+            # 不是'%m/%d/%Y'格式时，由pandas根据首个元素推断格式后一次性解析
+            parsed = pd.to_datetime(values, errors='coerce')
+    
+    unparsed = np.asarray(parsed.isna())
+    if unparsed.any():
+        raise ValueError(describe_invalid_dates("Date format error", values, unparsed))
+    
+    # datetime64[D]为相对1970-01-01的天数，加上偏移即为序数日期
+    ordinals = np.asarray(parsed.values.astype('datetime64[D]').astype(np.int64)) + UNIX_EPOCH_ORDINAL
+    out_of_range = (ordinals < DATE_ORDINAL_MIN) | (ordinals > DATE_ORDINAL_MAX)
+    if out_of_range.any():
+        raise ValueError(describe_invalid_dates(
+            f"The converted date is out of range ({DATE_ORDINAL_MIN}-{DATE_ORDINAL_MAX})", values, out_of_range))
+    return ordinals
+
+
+def ordinal_to_datenum(days):
+    """
+    序数日期（标量或数组）转换为Matplotlib日期数值：只做一次向量化的平移，
+    结果与mdates.date2num(pd.Timestamp.fromordinal(day))相同
+    """
+    return np.asarray(days, dtype=np.float64) + (mdates.date2num(np.datetime64('1970-01-01', 'D')) - UNIX_EPOCH_ORDINAL)
+
+
+def ordinal_to_datetime64(days):
+    """序数日期（标量或数组）转换为datetime64[D]（用于需要日期类型的seaborn绘图）"""
+    return (np.asarray(days, dtype=np.int64) - UNIX_EPOCH_ORDINAL).astype('datetime64[D]')
+
+
+def smallest_int_dtype(values):
+    """能容纳整数数组全部取值的最小类型（int16或int32），不是整数或超出int32时返回原类型"""
+    if values.dtype.kind not in 'iu' or len(values) == 0:
+        return values.dtype
+    low, high = values.min(), values.max()
+    for dtype in (np.int16, np.int32):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return values.dtype
+
+
+class PreparedSeries:
+    """
+    一条时间序列的检测和显示输入，每个数据集只构建一次。
+
+    dates、merge（C连续的(观测数, 波段数)数组）和qa在取值范围允许时压缩为int16/int32；
+    valid标记所有值有限且波段值和qa在0-10000之间的观测，clean为其中qa为0（晴空）或1（水体）
+    的观测。检测函数和显示函数直接使用这些数组，不再拼接成浮点矩阵或转换为DataFrame。
+    构建时一次算出所有波段的1%/99%分位数，切换显示波段时y轴范围无需重新计算。
+    数组是共享的，不能原地修改。
+    """
+    
+    def __init__(self, dates, merge, qa, band_names=None):
+        dates, merge, qa = np.asarray(dates), np.asarray(merge), np.asarray(qa)
+        self.dates = np.ascontiguousarray(dates, dtype=smallest_int_dtype(dates))
+        self.merge = np.ascontiguousarray(merge, dtype=smallest_int_dtype(merge))
+        self.qa = np.ascontiguousarray(qa, dtype=smallest_int_dtype(qa))
+        self.band_names = list(band_names) if band_names is not None else [f"b{i}" for i in range(self.merge.shape[1])]
+        # 与显示函数原先的过滤条件一致：日期和qa有限，波段值在0-10000之间
+        in_range = (self.merge >= 0) & (self.merge <= 10000)
+        if self.merge.dtype.kind == 'f':
+            in_range &= np.isfinite(self.merge)
+        self.valid = in_range.all(axis=1) & (self.qa >= 0) & (self.qa <= 10000)
+        if self.qa.dtype.kind == 'f':
+            self.valid &= np.isfinite(self.qa)
+        self.clean = self.valid & ((self.qa == 0) | (self.qa == 1))
+        # 绘图用的Matplotlib日期数值，每个数据集只转换一次
+        self.datenums = ordinal_to_datenum(self.dates)
+        # 按日期排序的观测索引，locate用二分查找代替逐个比较
+        self.date_order = np.argsort(self.dates, kind='stable')
+        self.sorted_dates = self.dates[self.date_order]
+        # 各波段的[1%, 99%]分位数，形状为(2, 波段数)：clean观测，以及仅晴空观测（COLD视图使用）
+        self.quantiles = self._band_quantiles(self.clean)
+        self.clear_quantiles = self._band_quantiles(self.clean & (self.qa == 0))
+    
+    def _band_quantiles(self, mask):
+        """所有波段在mask观测上的1%/99%分位数（一次向量化计算；没有观测时为NaN）"""
+        if not mask.any():
+            return np.full((2, self.merge.shape[1]), np.nan)
+        return np.quantile(self.merge[mask], [0.01, 0.99], axis=0)
+    
+    def ylim(self, band_index, clear_only=False, margin=0.4):
+        """显示波段的y轴范围：1%/99%分位数向两侧各扩展margin倍的分位数间距"""
+        q01, q99 = (self.clear_quantiles if clear_only else self.quantiles)[:, band_index]
+        extra = (q99 - q01) * margin
+        return q01 - extra, q99 + extra
+    
+    @classmethod
+    def from_array(cls, data, band_names=None):
+        """由(观测数, 波段数 + 2)的[dates, 波段..., qa]数组构建（丢弃含非有限值的行）"""
+        data = np.asarray(data)
+        data = data[np.all(np.isfinite(data), axis=1)]
+        dates, merge, qa = data[:, 0], data[:, 1:-1], data[:, -1]
+        if data.dtype.kind == 'f':
+            dates = dates.astype(np.int64)
+            qa = qa.astype(np.int64)
+            if np.array_equal(merge, np.round(merge)):
+                merge = merge.astype(np.int64)
+        return cls(dates, merge, qa, band_names)
+    
+    def locate(self, days):
+        """各日期第一次观测在数组中的位置（np.searchsorted），没有该日期的观测时为-1"""
+        days = np.asarray(days)
+        if len(self.sorted_dates) == 0:
+            return np.full(days.shape, -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.sorted_dates, days), len(self.sorted_dates) - 1)
+        return np.where(self.sorted_dates[pos] == days, self.date_order[pos], -1)
+    
+    def band(self, name):
+        """按波段名返回merge中对应的列（视图）"""
+        return self.merge[:, self.band_names.index(name)]
+
+
+# 谐波模型常数：年周期角频率以及pyxccd中斜率系数的缩放因子
+HARMONIC_OMEGA = 2 * math.pi / 365.25
+SLOPE_SCALE = 10000
+
+
+@lru_cache(maxsize=8)
+def harmonic_basis(first_day, n_days):
+    """连续序数日区间的谐波设计矩阵（每行为[1, t/SLOPE_SCALE, cos(wt), sin(wt), ..., sin(3wt)]），结果只读并缓存"""
+    t = np.arange(first_day, first_day + n_days, dtype=np.float64)
+    wt = HARMONIC_OMEGA * t
+    basis = np.empty((n_days, 8), dtype=np.float64)
+    basis[:, 0] = 1.0
+    basis[:, 1] = t / SLOPE_SCALE
+    for k in range(1, 4):
+        basis[:, 2 * k] = np.cos(k * wt)
+        basis[:, 2 * k + 1] = np.sin(k * wt)
+    basis.flags.writeable = False
+    return basis
+
+
+def evaluate_harmonic_segments(t_start, t_end, coefs, band_index, n_coefs=8):
+    """一次向量化计算多个分段逐日的模型值（只用前n_coefs个系数），返回(序数日, 预测值, bounds)，第i段为days[bounds[i]:bounds[i + 1]]"""
+    t_start = np.asarray(t_start, dtype=np.int64).reshape(-1)
+    t_end = np.asarray(t_end, dtype=np.int64).reshape(-1)
+    lengths = np.maximum(t_end - t_start + 1, 0)
+    bounds = np.concatenate(([0], np.cumsum(lengths)))
+    if bounds[-1] == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), bounds
+    
+    # 每个输出样本的序数日及其所属分段
+    segment_ids = np.repeat(np.arange(len(lengths)), lengths)
+    days = np.arange(bounds[-1], dtype=np.int64) - bounds[segment_ids] + t_start[segment_ids]
+    
+    segment_coefs = np.zeros((len(lengths), 8), dtype=np.float64)
+    band_coefs = np.asarray(coefs)[:, band_index, :n_coefs]
+    segment_coefs[:, :band_coefs.shape[1]] = band_coefs
+    
+    first_day = int(days.min())
+    basis = harmonic_basis(first_day, int(days.max()) - first_day + 1)
+    predicted = np.einsum('ij,ij->i', basis[days - first_day], segment_coefs[segment_ids])
+    return days, predicted, bounds
 
-            # Convert dates and plot model fit
-            calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in plot_df["dates"]]
-            plot_df.loc[:, 'dates_formal'] = calendar_dates
-            g = sns.lineplot(
-                x="dates_formal", y="predicted",
-                data=plot_df,
-                label="Model fit",
-                ax=axe,
-                color=default_plot_kwargs['line_color']
-            )
-            if g.legend_ is not None: 
-                g.legend_.remove()
 
-        # Plot near-real-time projection for SCCD if available
-        if hasattr(sccd_result, 'nrt_mode') and (sccd_result.nrt_mode %10 == 1 or sccd_result.nrt_mode == 3 or sccd_result.nrt_mode %10 == 5):
-            recent_obs = sccd_result.nrt_model['obs_date_since1982'][sccd_result.nrt_model['obs_date_since1982']>0]
-            j = np.arange(
-                sccd_result.nrt_model['t_start_since1982'].item() + defaults['COMMON']['JULIAN_LANDSAT4_LAUNCH'], 
-                recent_obs[-1].item()+ defaults['COMMON']['JULIAN_LANDSAT4_LAUNCH']+1, 
-                1
-            )
+# 近实时投影曲线的gid：增量更新后只移除并重绘这一条曲线
+NRT_GID = 'nrt_projection'
 
-            if trimodal: 
-                plot_df = pd.DataFrame(
-                    {
-                    'dates': j,
-                    'trend': j * sccd_result.nrt_model['nrt_coefs'][band_index][1] / slope_scale + sccd_result.nrt_model['nrt_coefs'][band_index][0],
-                    'annual': np.cos(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][2] + np.sin(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][3],
-                    'semiannual': np.cos(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][4] + np.sin(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][5],
-                    'trimodal': np.cos(3 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][6] + np.sin(3 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][7]
-                })
-            else:
-                plot_df = pd.DataFrame(
-                    {
-                    'dates': j,
-                    'trend': j * sccd_result.nrt_model['nrt_coefs'][band_index][1] / slope_scale + sccd_result.nrt_model['nrt_coefs'][band_index][0],
-                    'annual': np.cos(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][2] + np.sin(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][3],
-                    'semiannual': np.cos(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][4] + np.sin(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][5],
-                    'trimodal': j * 0
-                })
-                
-            plot_df['predicted'] = plot_df['trend'] + plot_df['annual'] + plot_df['semiannual'] + plot_df['trimodal']
-            calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in plot_df["dates"]]
-            plot_df.loc[:, 'dates_formal'] = calendar_dates
+
+def nrt_projection_range(sccd_result):
+    """返回S-CCD近实时模型的投影区间(起始序数日, 结束序数日)；无可用的NRT模型时返回None"""
+    if not (hasattr(sccd_result, 'nrt_mode') and (sccd_result.nrt_mode %10 == 1 or sccd_result.nrt_mode == 3 or sccd_result.nrt_mode %10 == 5)):
+        return None
+    recent_obs = sccd_result.nrt_model['obs_date_since1982'][sccd_result.nrt_model['obs_date_since1982']>0]
+    return (
+        sccd_result.nrt_model['t_start_since1982'].item() + defaults['COMMON']['JULIAN_LANDSAT4_LAUNCH'], 
+        recent_obs[-1].item()+ defaults['COMMON']['JULIAN_LANDSAT4_LAUNCH']
+    )
+
+
+def sccd_fit_segments(sccd_result, include_rec_cg=True, include_nrt=True):
+    """收集S-CCD需要绘制的模型区间：历史分段(t_start~t_break)以及近实时投影"""
+    t_start, t_end, coefs = [], [], []
+    if include_rec_cg and len(sccd_result.rec_cg) > 0:
+        t_start.append(sccd_result.rec_cg['t_start'])
+        t_end.append(sccd_result.rec_cg['t_break'])
+        coefs.append(sccd_result.rec_cg['coefs'])
+    nrt_range = nrt_projection_range(sccd_result) if include_nrt else None
+    if nrt_range is not None:
+        t_start.append([nrt_range[0]])
+        t_end.append([nrt_range[1]])
+        coefs.append(sccd_result.nrt_model['nrt_coefs'][None])
+    if not coefs:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.zeros((0, 1, 8))
+    return np.concatenate(t_start), np.concatenate(t_end), np.concatenate(coefs)
+
+
+def plot_nrt_projection(axe, sccd_result, band_index, color, render_mode='fast', n_coefs=8):
+    """绘制S-CCD近实时模型的投影（图元的gid为NRT_GID）；没有可用的NRT模型时不绘制"""
+    t_start, t_end, coefs = sccd_fit_segments(sccd_result, include_rec_cg=False)
+    days, predicted, bounds = evaluate_harmonic_segments(t_start, t_end, coefs, band_index, n_coefs=n_coefs)
+    plot_model_fit(axe, days, predicted, bounds, color, render_mode, gid=NRT_GID)
+
+
+def plot_model_fit(axe, days, predicted, bounds, color, render_mode='fast', gid=None):
+    """
+    绘制evaluate_harmonic_segments得到的模型拟合曲线。
+    render_mode='fast'时所有分段合并为一个LineCollection一次绘制；
+    render_mode='seaborn'时保持原来的逐段sns.lineplot绘制方式。
+    gid用于标记绘制的图元（例如近实时投影），以便之后单独移除和重绘。
+    """
+    if render_mode == 'seaborn':
+        dates_formal = ordinal_to_datetime64(days)
+        for start, end in zip(bounds[:-1], bounds[1:]):
             g = sns.lineplot(
-                x="dates_formal", y="predicted",
-                data=plot_df,
+                x=dates_formal[start:end], y=predicted[start:end],
                 label="Model fit",
                 ax=axe,
-                color=default_plot_kwargs['line_color']
+                color=color
             )
             if g.legend_ is not None: 
                 g.legend_.remove()
+            if gid is not None:
+                g.lines[-1].set_gid(gid)
+        return
+    
+    if len(days) == 0:
+        return
+    points = np.column_stack((ordinal_to_datenum(days), predicted))
+    collection = LineCollection(
+        np.split(points, bounds[1:-1]),
+        colors=color,
+        linewidths=plt.rcParams['lines.linewidth'],
+        label="Model fit",
+        gid=gid
+    )
+    axe.xaxis_date()
+    axe.add_collection(collection)
+    axe.autoscale_view()
+
+
+def decimate_minmax(x, y, x_min, x_max, n_buckets):
+    """
+    抽稀x递增的折线：只保留[x_min, x_max]范围内（两侧各多一个点）的部分，按x等分为n_buckets个区间，
+    每个区间保留首、尾、最小值和最大值点，像素级形状不变；点数不超过4 * n_buckets时原样返回
+    """
+    start = max(int(np.searchsorted(x, x_min, side='left')) - 1, 0)
+    stop = min(int(np.searchsorted(x, x_max, side='right')) + 1, len(x))
+    x, y = x[start:stop], y[start:stop]
+    if len(x) <= 4 * n_buckets or x[-1] <= x[0]:
+        return x, y
+    bucket = np.minimum(((x - x[0]) * (n_buckets / (x[-1] - x[0]))).astype(np.int64), n_buckets - 1)
+    edges = np.flatnonzero(np.diff(bucket)) + 1
+    firsts = np.concatenate(([0], edges))
+    lasts = np.concatenate((edges, [len(x)])) - 1
+    # 按(区间, y)排序后，每个区间的第一个和最后一个即为最小值和最大值
+    order = np.lexsort((y, bucket))
+    keep = np.unique(np.concatenate((firsts, lasts, order[firsts], order[lasts])))
+    return x[keep], y[keep]
+
+
+class DecimatedLine:
+    """
+    按坐标轴像素宽度抽稀的折线，用于逐日状态等长序列。
+
+    保存完整的x（Matplotlib日期数值）和y，只绘制当前x范围内的点，每个像素列最多4个顶点；
+    缩放或平移（xlim_changed，共享x轴的子图同时触发）后按新的范围重新抽稀。
+    """
+    
+    def __init__(self, axe, x, y, **kwargs):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        # 先以完整数据创建，使自动缩放覆盖整条曲线
+        self.line, = axe.plot(self.x, self.y, **kwargs)
+        axe.xaxis_date()
+        self.update(axe, (self.x[0], self.x[-1]) if len(self.x) else (0, 1))
+        # cla()会重建callbacks，重绘时回调随坐标轴内容一起释放
+        axe.callbacks.connect('xlim_changed', lambda ax: self.update(ax, ax.viewLim.intervalx))
+    
+    def update(self, axe, xlim):
+        n_buckets = max(int(axe.bbox.width), 1)
+        self.line.set_data(*decimate_minmax(self.x, self.y, min(xlim), max(xlim), n_buckets))
+
+
+def plot_states_line(axe, days, values, color, label=None, render_mode='fast'):
+    """
+    绘制逐日的状态曲线（days为序数日期）。
+    render_mode='fast'时使用按像素宽度抽稀的DecimatedLine；
+    render_mode='seaborn'时保持原来的sns.lineplot逐点绘制方式。
+    """
+    if render_mode == 'seaborn':
+        sns.lineplot(x=ordinal_to_datetime64(days), y=np.asarray(values), label=label, ax=axe, color=color)
+        return
+    DecimatedLine(axe, ordinal_to_datenum(days), values, color=color, label=label)
+
+
+def anomaly_reference(rec_cg_anomaly, band_index, n_coefs=6):
+    """
+    所有异常前3次观测在band_index波段的模型参考值，形状为(异常数, 3)；
+    与逐个调用pyxccd的predict_ref结果相同，但一次向量化计算
+    """
+    days = rec_cg_anomaly['obs_date_since1982'][:, :3].astype(np.float64) + defaults['COMMON']['JULIAN_LANDSAT4_LAUNCH']
+    wt = HARMONIC_OMEGA * days
+    terms = [np.ones_like(days), days / SLOPE_SCALE]
+    for k in range(1, 4):
+        terms += [np.cos(k * wt), np.sin(k * wt)]
+    basis = np.stack(terms[:n_coefs], axis=-1)
+    coefs = rec_cg_anomaly['coefs'][:, band_index, :n_coefs].astype(np.float64)
+    return np.einsum('ikj,ij->ik', basis, coefs)
+
+
+def plot_anomalies(axe, series, rec_cg_anomaly, band_index, indicator_band_index, n_coefs=6):
+    """
+    在显示波段的观测值处标出所有异常：指示波段前3次观测相对模型参考值的残差中位数为正时为红圈，
+    否则为黑圈；两类异常各用一次绘图调用
+    """
+    if len(rec_cg_anomaly) == 0:
+        return
+    residuals = rec_cg_anomaly['obs'][:, indicator_band_index, :3] - anomaly_reference(rec_cg_anomaly, indicator_band_index, n_coefs)
+    increase = np.median(residuals, axis=1) > 0
+    positions = series.locate(rec_cg_anomaly['t_break'])
+    found = positions >= 0
+    dates_formal = ordinal_to_datenum(rec_cg_anomaly['t_break'])
+    values = series.merge[positions, band_index]
+    for selected, color in ((increase & found, 'r'), (~increase & found, 'k')):
+        if selected.any():
+            axe.plot(dates_formal[selected], values[selected], color + 'o', fillstyle='none', markersize=8, linestyle='none')
+
+
+def plot_breaks(axe, rec_cg, indicator_band_index):
+    """用一次axe.vlines绘制所有断点：指示波段变化幅度为负时为黑色，否则为红色"""
+    if len(rec_cg) == 0:
+        return
+    colors = np.where(rec_cg['magnitude'][:, indicator_band_index] < 0, 'k', 'r')
+    axe.vlines(
+        ordinal_to_datenum(rec_cg['t_break']), 0, 1,
+        transform=axe.get_xaxis_transform(),
+        colors=colors
+    )
+
+
+def display_sccd_result_sif(
+    data: Union[np.ndarray, PreparedSeries],
+    band_names: List[str],
+    band_index: int,
+    indicator_band_index: int,
+    sccd_result: SccdOutput,
+    axe: Axes,
+    title: str = 'S-CCD',
+    states: Optional[pd.DataFrame] = None,
+    anomaly: Optional[anomaly] = None,
+    trimodal: Optional[bool] = False,  
+    plot_kwargs: Optional[Dict] = None
+) -> Tuple[plt.Figure, List[plt.Axes]]:
+    """
+    Compare COLD and SCCD change detection algorithms by plotting their results side by side.
+    
+    This function takes time series remote sensing data, applies both COLD and SCCD algorithms,
+    and visualizes the curve fitting and break detection results for comparison. 
+    
+    Parameters:
+    -----------
+    data : PreparedSeries or np.ndarray
+        The prepared series (used without copying), or an input data array with
+        shape (n_observations, n_bands + 2) where:
+        - First column: ordinal dates (days since January 1, AD 1)
+        - Next n_bands columns: spectral band values
+        - Last column: QA flags (0-clear, 1-water, 2-shadow, 3-snow, 4-cloud)
+        
+    band_names : List[str]
+        List of band names corresponding to the spectral bands in the data (e.g., ['red', 'nir'])
+        
+    band_index : int
+        1-based index of the band to plot (e.g., 0 for first band, 1 for second band)
+        
+    indicator_band_index : int
+        The band index used to determine break point colors (based on magnitude)
+        
+    sccd_result: SccdOutput
+        Output of sccd_detect
+    
+    axe: Axes
+        An Axes object represents a single plot within that Figure
+    
+    title: Str
+        The figure title. The default is "S-CCD"
+        
+    states: pd.DataFrame, optional
+        DataFrame containing model states for each time point (if provided, will use for fitting)
+        
+    anomaly: anomaly, optional
+        The anomaly detection outputs
+        
+    trimodal: bool, optional
+        If True, use 8 coefficients (including trimodal terms); if False, use 6 coefficients
+        
+    plot_kwargs : Dict, optional
+        Additional keyword arguments to pass to the display function. Possible keys:
+        - 'marker_size': size of observation markers (default: 5)
+        - 'marker_alpha': transparency of markers (default: 0.7)
+        - 'line_color': color of model fit lines (default: 'orange')
+        - 'font_size': base font size (default: 14)
+        - 'render_mode': 'fast' draws all segment fits as one LineCollection and
+          decimates daily states to the axes width, 'seaborn' draws every segment
+          and every state point with sns.lineplot (default: 'fast')
+        
+    Returns:
+    --------
+    Tuple[plt.Figure, List[plt.Axes]]
+        A tuple containing the matplotlib Figure object and a list of Axes objects
+    """
+    # Set default plot parameters
+    default_plot_kwargs: Dict[str, Union[int, float, str]] = {
+        'marker_size': 5,
+        'marker_alpha': 0.7,
+        'line_color': 'orange',
+        'font_size': 14,
+        'render_mode': 'fast'
+    }
+    if plot_kwargs is not None:
+        default_plot_kwargs.update(plot_kwargs)
+
+    # Extract values with proper type casting
+    font_size = default_plot_kwargs.get('font_size', 14)
+    try:
+        title_font_size = int(font_size) + 2
+    except (TypeError, ValueError):
+        title_font_size = 16 
+
+    # Clean and prepare data: clear/water observations within the valid range (mask precomputed
+    # once per dataset), read from the prepared arrays without building a table
+    series = data if isinstance(data, PreparedSeries) else PreparedSeries.from_array(data, band_names)
+    clean_values = series.merge[series.clean, band_index]
+    dates_formal = series.datenums[series.clean]
+    
+    # Y-axis limits from the cached per-band quantiles
+    band_name = band_names[band_index]
+    ylim_low, ylim_high = series.ylim(band_index)
+
+    # Plot SCCD observations
+    axe.plot(
+        dates_formal, clean_values, 'go',
+        markersize=default_plot_kwargs['marker_size'],
+        alpha=default_plot_kwargs['marker_alpha']
+    )
+    axe.xaxis_date()
+
+    # Plot SCCD segments - NEW: use states if provided
+    if states is not None:
+        # Build column names based on band_index
+        col_prefix = f"b{band_index}"
+        trend_col = f"{col_prefix}_trend"
+        annual_col = f"{col_prefix}_annual"
+        semiannual_col = f"{col_prefix}_semiannual"
+        trimodal_col = f"{col_prefix}_trimodal"
+        
+        # Check required columns exist
+        required_cols = [trend_col, annual_col, semiannual_col]
+        missing_cols = [col for col in required_cols if col not in states.columns]
+        if missing_cols:
+            raise ValueError(f"Missing required columns in states: {missing_cols}")
+        
+        # Calculate combined prediction (General)
+        has_trimodal = trimodal_col in states.columns
+        if has_trimodal:
+            states["General"] = states[trend_col] + states[annual_col] + states[semiannual_col] + states[trimodal_col]
+        else:
+            states["General"] = states[trend_col] + states[annual_col] + states[semiannual_col]
+        
+        # Plot fitted curve (daily states, decimated to the axes width in 'fast' mode);
+        # the manual legend below replaces the automatic one
+        plot_states_line(axe, states["dates"], states["General"], default_plot_kwargs['line_color'], "Model fit", default_plot_kwargs['render_mode'])
+    else:
+        # Evaluate all segments in one batched call; the near-real-time projection is drawn
+        # separately (NRT_GID) so that plot_nrt_tail can replace it after an incremental update
+        t_start, t_end, coefs = sccd_fit_segments(sccd_result, include_nrt=False)
+        days, predicted, bounds = evaluate_harmonic_segments(t_start, t_end, coefs, band_index, n_coefs=8 if trimodal else 6)
+        plot_model_fit(axe, days, predicted, bounds, default_plot_kwargs['line_color'], default_plot_kwargs['render_mode'])
+        plot_nrt_projection(axe, sccd_result, band_index, default_plot_kwargs['line_color'], default_plot_kwargs['render_mode'], n_coefs=8 if trimodal else 6)
                         
     # add manual legends
     if anomaly is not None:
@@ -1126,35 +2732,12 @@ def display_sccd_result_sif(
     axe.legend(handles=legend_elements, loc='upper left', prop={'size': 9})
     
     # plot breaks
-    for i in range(len(sccd_result.rec_cg)):
-        if sccd_result.rec_cg[i]['magnitude'][indicator_band_index] < 0:    
-            axe.axvline(pd.Timestamp.fromordinal(sccd_result.rec_cg[i]['t_break']), color='k')
-        else:
-            axe.axvline(pd.Timestamp.fromordinal(sccd_result.rec_cg[i]['t_break']), color='r')
+    plot_breaks(axe, sccd_result.rec_cg, indicator_band_index)
     
     # plot anomalies if available
     if anomaly is not None:
-        n_coefs = 8 if trimodal else 6
-        
-        for i in range(len(anomaly.rec_cg_anomaly)):
-            pred_ref = np.asarray(
-                    [
-                        predict_ref(
-                            anomaly.rec_cg_anomaly[i]["coefs"][0],
-                            anomaly.rec_cg_anomaly[i]["obs_date_since1982"][i_conse].item()
-                            + defaults['COMMON']['JULIAN_LANDSAT4_LAUNCH'], num_coefficients=n_coefs
-                        ) for i_conse in range(3)
-                    ]
-            )
-
-            cm = anomaly.rec_cg_anomaly[i]["obs"][0, 0: 3] - pred_ref
-            
-            if np.median(cm) > 0:
-                yc = data[data[:,0] == anomaly.rec_cg_anomaly[i]['t_break']][0][1]
-                axe.plot(pd.Timestamp.fromordinal(anomaly.rec_cg_anomaly[i]['t_break']), yc,'ro',fillstyle='none',markersize=8)         
-            else:
-                yc = data[data[:,0] == anomaly.rec_cg_anomaly[i]['t_break']][0][1]
-                axe.plot(pd.Timestamp.fromordinal(anomaly.rec_cg_anomaly[i]['t_break']), yc,'ko',fillstyle='none',markersize=8) 
+        # 使用 trimodal 布尔值判断系数数量；所有异常的参考值一次算出，按日期索引取显示波段的观测值
+        plot_anomalies(axe, series, anomaly.rec_cg_anomaly, band_index, indicator_band_index, n_coefs=8 if trimodal else 6)
     
     axe.set_ylabel(f"{band_name} * 10000", fontsize=default_plot_kwargs['font_size'])
 
@@ -1176,7 +2759,7 @@ def display_sccd_result_sif(
     
 
 def display_cold_result(
-    data: np.ndarray,
+    data: Union[np.ndarray, PreparedSeries],
     band_names: List[str],
     band_index: int,
     indicator_band_index: int,
@@ -1185,15 +2768,56 @@ def display_cold_result(
     title: str = 'COLD',
     plot_kwargs: Optional[Dict] = None
 ) -> Tuple[plt.Figure, List[plt.Axes]]:
+    """
+    Compare COLD and SCCD change detection algorithms by plotting their results side by side.
     
-    w = np.pi * 2 / 365.25
-
+    This function takes time series remote sensing data, applies both COLD algorithms,
+    and visualizes the curve fitting and break detection results. 
+    
+    Parameters:
+    -----------
+    data : PreparedSeries or np.ndarray
+        The prepared series (used without copying), or an input data array with
+        shape (n_observations, n_bands + 2) where:
+        - First column: ordinal dates (days since January 1, AD 1)
+        - Next n_bands columns: spectral band values
+        - Last column: QA flags (0-clear, 1-water, 2-shadow, 3-snow, 4-cloud)
+        
+    band_names : List[str]
+        List of band names corresponding to the spectral bands in the data (e.g., ['red', 'nir'])
+        
+    band_index : int
+        1-based index of the band to plot (e.g., 0 for first band, 1 for second band)
+    
+    axe: Axes
+        An Axes object represents a single plot within that Figure
+    
+    title: Str
+        The figure title. The default is "COLD"
+        
+    plot_kwargs : Dict, optional
+        Additional keyword arguments to pass to the display function. Possible keys:
+        - 'marker_size': size of observation markers (default: 5)
+        - 'marker_alpha': transparency of markers (default: 0.7)
+        - 'line_color': color of model fit lines (default: 'orange')
+        - 'font_size': base font size (default: 14)
+        - 'render_mode': 'fast' draws all segment fits as one LineCollection,
+          'seaborn' draws every segment with sns.lineplot (default: 'fast')
+        
+    Returns:
+    --------
+    Tuple[plt.Figure, List[plt.Axes]]
+        A tuple containing the matplotlib Figure object and a list of Axes objects
+        (top axis is COLD results, bottom axis is SCCD results)
+    
+    """
     # Set default plot parameters
     default_plot_kwargs: Dict[str, Union[int, float, str]] = {
         'marker_size': 5,
         'marker_alpha': 0.7,
         'line_color': 'orange',
-        'font_size': 14
+        'font_size': 14,
+        'render_mode': 'fast'
     }
     if plot_kwargs is not None:
         default_plot_kwargs.update(plot_kwargs)
@@ -1206,78 +2830,35 @@ def display_cold_result(
         title_font_size = 16 
 
 
-    # Clean and prepare data
-    data = data[np.all(np.isfinite(data), axis=1)]
-    data_df = pd.DataFrame(data, columns=['dates'] + band_names + ['qa'])
-
-    # Plot COLD results
-    w = np.pi * 2 / 365.25
-    slope_scale = 10000
-
-    # Prepare clean data for COLD plot
-    data_clean = data_df[(data_df['qa'] == 0) | (data_df['qa'] == 1)].copy()
-    data_clean =  data_clean[(data_clean >= 0).all(axis=1) & (data_clean.drop(columns="dates") <= 10000).all(axis=1)]
-    calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in data_clean["dates"]]
-    data_clean.loc[:, 'dates_formal'] = calendar_dates
+    # Clean and prepare data: clear/water observations within the valid range (mask precomputed
+    # once per dataset), read from the prepared arrays without building a table
+    series = data if isinstance(data, PreparedSeries) else PreparedSeries.from_array(data, band_names)
+    clean_values = series.merge[series.clean, band_index]
+    dates_formal = series.datenums[series.clean]
     
-    # Calculate y-axis limits
+    # Y-axis limits from the cached per-band quantiles
     band_name = band_names[band_index]
-    band_values = data_clean[data_clean['qa'] == 0][band_name]
-    q01, q99 = np.quantile(band_values, [0.01, 0.99])
-    extra = (q99 - q01) * 0.4
-    ylim_low = q01 - extra
-    ylim_high = q99 + extra
+    ylim_low, ylim_high = series.ylim(band_index, clear_only=True)
 
     # Plot COLD observations
     axe.plot(
-        'dates_formal', band_name, 'go',
+        dates_formal, clean_values, 'go',
         markersize=default_plot_kwargs['marker_size'],
-        alpha=default_plot_kwargs['marker_alpha'],
-        data=data_clean
+        alpha=default_plot_kwargs['marker_alpha']
     )
+    axe.xaxis_date()
 
-    # Plot COLD segments
-    for segment in cold_result:
-        j = np.arange(segment['t_start'], segment['t_end'] + 1, 1)
-        plot_df = pd.DataFrame({
-            'dates': j,
-            'trend': j * segment['coefs'][band_index][1] / slope_scale + segment['coefs'][band_index][0],
-            'annual': np.cos(w * j) * segment['coefs'][band_index][2] + np.sin(w * j) * segment['coefs'][band_index][3],
-            'semiannual': np.cos(2 * w * j) * segment['coefs'][band_index][4] + np.sin(2 * w * j) * segment['coefs'][band_index][5],
-            'trimodel': np.cos(3 * w * j) * segment['coefs'][band_index][6] + np.sin(3 * w * j) * segment['coefs'][band_index ][7]
-        })
-        plot_df['predicted'] = (
-            plot_df['trend'] + 
-            plot_df['annual'] + 
-            plot_df['semiannual'] + 
-            plot_df['trimodel']
-        )
-
-        # Convert dates and plot model fit
-        calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in plot_df["dates"]]
-        plot_df.loc[:, 'dates_formal'] = calendar_dates
-        g = sns.lineplot(
-            x="dates_formal", y="predicted",
-            data=plot_df,
-            label="Model fit",
-            ax=axe,
-            color=default_plot_kwargs['line_color']
-        )
-        if g.legend_ is not None: 
-            g.legend_.remove()
+    # Plot COLD segments (all segments evaluated in one batched call)
+    days, predicted, bounds = evaluate_harmonic_segments(cold_result['t_start'], cold_result['t_end'], cold_result['coefs'], band_index)
+    plot_model_fit(axe, days, predicted, bounds, default_plot_kwargs['line_color'], default_plot_kwargs['render_mode'])
 
     # add manual legends
     legend_elements = [Line2D([0], [0], label=f'{band_names[indicator_band_index]} decrease break', color='k'),
                     Line2D([0], [0], label=f'{band_names[indicator_band_index]} increase break', color='r')]
     axe.legend(handles=legend_elements, loc='upper left', prop={'size': 9})
     
-    # plot breaks
-    for i in range(len(cold_result)):
-        if  cold_result[i]['change_prob'] == 100:
-            if cold_result[i]['magnitude'][indicator_band_index] < 0:
-                axe.axvline(pd.Timestamp.fromordinal(cold_result[i]['t_break']), color='k')
-            else:
-                axe.axvline(pd.Timestamp.fromordinal(cold_result[i]['t_break']), color='r')
+    # plot breaks (only confirmed breaks)
+    plot_breaks(axe, cold_result[cold_result['change_prob'] == 100], indicator_band_index)
     
     axe.set_ylabel(f"{band_name} * 10000", fontsize=default_plot_kwargs['font_size'])
 
@@ -1298,7 +2879,7 @@ def display_cold_result(
     axe.set_title(title, fontweight="bold", size=title_font_size, pad=2)
 
 def display_sccd_result(
-    data: np.ndarray,
+    data: Union[np.ndarray, PreparedSeries],
     band_names: List[str],
     band_index: int,
     indicator_band_index: int,
@@ -1308,15 +2889,65 @@ def display_sccd_result(
     states: Optional[pd.DataFrame] = None,
     plot_kwargs: Optional[Dict] = None
 ) -> Tuple[plt.Figure, List[plt.Axes]]:
+    """
+    Compare COLD and SCCD change detection algorithms by plotting their results side by side.
     
-    w = np.pi * 2 / 365.25
-
+    This function takes time series remote sensing data, applies both COLD and SCCD algorithms,
+    and visualizes the curve fitting and break detection results for comparison. 
+    
+    Parameters:
+    -----------
+    data : PreparedSeries or np.ndarray
+        The prepared series (used without copying), or an input data array with
+        shape (n_observations, n_bands + 2) where:
+        - First column: ordinal dates (days since January 1, AD 1)
+        - Next n_bands columns: spectral band values
+        - Last column: QA flags (0-clear, 1-water, 2-shadow, 3-snow, 4-cloud)
+        
+    band_names : List[str]
+        List of band names corresponding to the spectral bands in the data (e.g., ['red', 'nir'])
+        
+    band_index : int
+        1-based index of the band to plot (e.g., 0 for first band, 1 for second band)
+        
+    indicator_band_index : int
+        The band index used to determine break point colors (based on magnitude)
+        
+    sccd_result: SccdOutput
+        Output of sccd_detect
+    
+    axe: Axes
+        An Axes object represents a single plot within that Figure
+    
+    title: Str
+        The figure title. The default is "S-CCD"
+        
+    states: pd.DataFrame, optional
+        DataFrame containing model states for each time point (if provided, will use for fitting)
+        
+    plot_kwargs : Dict, optional
+        Additional keyword arguments to pass to the display function. Possible keys:
+        - 'marker_size': size of observation markers (default: 5)
+        - 'marker_alpha': transparency of markers (default: 0.7)
+        - 'line_color': color of model fit lines (default: 'orange')
+        - 'font_size': base font size (default: 14)
+        - 'render_mode': 'fast' draws all segment fits as one LineCollection and
+          decimates daily states to the axes width, 'seaborn' draws every segment
+          and every state point with sns.lineplot (default: 'fast')
+        
+    Returns:
+    --------
+    Tuple[plt.Figure, List[plt.Axes]]
+        A tuple containing the matplotlib Figure object and a list of Axes objects
+        (top axis is COLD results, bottom axis is SCCD results)
+    """
     # Set default plot parameters
     default_plot_kwargs: Dict[str, Union[int, float, str]] = {
         'marker_size': 5,
         'marker_alpha': 0.7,
         'line_color': 'orange',
-        'font_size': 14
+        'font_size': 14,
+        'render_mode': 'fast'
     }
     if plot_kwargs is not None:
         default_plot_kwargs.update(plot_kwargs)
@@ -1328,35 +2959,23 @@ def display_sccd_result(
     except (TypeError, ValueError):
         title_font_size = 16 
 
-    # Clean and prepare data
-    data = data[np.all(np.isfinite(data), axis=1)]
-    data_df = pd.DataFrame(data, columns=['dates'] + band_names + ['qa'])
-
-    # Plot COLD results
-    w = np.pi * 2 / 365.25
-    slope_scale = 10000
-
-    # Prepare clean data for COLD plot
-    data_clean = data_df[(data_df['qa'] == 0) | (data_df['qa'] == 1)].copy()
-    data_clean = data_clean[(data_clean >= 0).all(axis=1) & (data_clean.drop(columns="dates") <= 10000).all(axis=1)]
-    calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in data_clean["dates"]]
-    data_clean.loc[:, 'dates_formal'] = calendar_dates
+    # Clean and prepare data: clear/water observations within the valid range (mask precomputed
+    # once per dataset), read from the prepared arrays without building a table
+    series = data if isinstance(data, PreparedSeries) else PreparedSeries.from_array(data, band_names)
+    clean_values = series.merge[series.clean, band_index]
+    dates_formal = series.datenums[series.clean]
     
-    # Calculate y-axis limits
+    # Y-axis limits from the cached per-band quantiles
     band_name = band_names[band_index]
-    band_values = data_clean[data_clean['qa'] == 0 | (data_clean['qa'] == 1)][band_name]
-    q01, q99 = np.quantile(band_values, [0.01, 0.99])
-    extra = (q99 - q01) * 0.4
-    ylim_low = q01 - extra
-    ylim_high = q99 + extra
+    ylim_low, ylim_high = series.ylim(band_index)
 
     # Plot SCCD observations
     axe.plot(
-        'dates_formal', band_name, 'go',
+        dates_formal, clean_values, 'go',
         markersize=default_plot_kwargs['marker_size'],
-        alpha=default_plot_kwargs['marker_alpha'],
-        data=data_clean
+        alpha=default_plot_kwargs['marker_alpha']
     )
+    axe.xaxis_date()
 
     # Plot SCCD segments - NEW: use states if provided
     if states is not None:
@@ -1373,9 +2992,6 @@ def display_sccd_result(
         if missing_cols:
             raise ValueError(f"Missing required columns in states: {missing_cols}")
         
-        # Convert dates
-        states["dates_formal"] = [pd.Timestamp.fromordinal(int(row)) for row in states["dates"]]
-        
         # Calculate combined prediction (General)
         has_trimodal = trimodal_col in states.columns
         if has_trimodal:
@@ -1383,98 +2999,19 @@ def display_sccd_result(
         else:
             states["General"] = states[trend_col] + states[annual_col] + states[semiannual_col]
         
-        # Plot fitted curve
-        g = sns.lineplot(
-            x="dates_formal", y="General",
-            data=states,
-            label="Model fit",
-            ax=axe,
-            color=default_plot_kwargs['line_color']
-        )
-        if g.legend_ is not None: 
-            g.legend_.remove()
-    else:
-        # Original segment-by-segment plotting
-        for segment in sccd_result.rec_cg:
-            j = np.arange(segment['t_start'], segment['t_break'] + 1, 1)
-            if len(segment['coefs'][band_index]) == 8:
-                plot_df = pd.DataFrame(
-                    {
-                    'dates': j,
-                    'trend': j * segment['coefs'][band_index][1] / slope_scale + segment['coefs'][band_index][0],
-                    'annual': np.cos(w * j) * segment['coefs'][band_index][2] + np.sin(w * j) * segment['coefs'][band_index][3],
-                    'semiannual': np.cos(2 * w * j) * segment['coefs'][band_index][4] + np.sin(2 * w * j) * segment['coefs'][band_index][5],
-                    'trimodal': np.cos(3 * w * j) * segment['coefs'][band_index][6] + np.sin(3 * w * j) * segment['coefs'][band_index][7]
-                })
-            else:
-                plot_df = pd.DataFrame(
-                    {
-                    'dates': j,
-                    'trend': j * segment['coefs'][band_index][1] / slope_scale + segment['coefs'][band_index][0],
-                    'annual': np.cos(w * j) * segment['coefs'][band_index][2] + np.sin(w * j) * segment['coefs'][band_index][3],
-                    'semiannual': np.cos(2 * w * j) * segment['coefs'][band_index][4] + np.sin(2 * w * j) * segment['coefs'][band_index][5],
-                    'trimodal': j * 0
-                })
-            plot_df['predicted'] = (
-                plot_df['trend'] + 
-                plot_df['annual'] + 
-                plot_df['semiannual'] +
-                plot_df['trimodal']
-            )
-
-            # Convert dates and plot model fit
-            calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in plot_df["dates"]]
-            plot_df.loc[:, 'dates_formal'] = calendar_dates
-            g = sns.lineplot(
-                x="dates_formal", y="predicted",
-                data=plot_df,
-                label="Model fit",
-                ax=axe,
-                color=default_plot_kwargs['line_color']
-            )
-            if g.legend_ is not None: 
-                g.legend_.remove()
-
-    # Plot near-real-time projection for SCCD if available
-    if hasattr(sccd_result, 'nrt_mode') and (sccd_result.nrt_mode %10 == 1 or sccd_result.nrt_mode == 3 or sccd_result.nrt_mode %10 == 5):
-        recent_obs = sccd_result.nrt_model['obs_date_since1982'][sccd_result.nrt_model['obs_date_since1982']>0]
-        j = np.arange(
-            sccd_result.nrt_model['t_start_since1982'].item() + defaults['COMMON']['JULIAN_LANDSAT4_LAUNCH'], 
-            recent_obs[-1].item()+ defaults['COMMON']['JULIAN_LANDSAT4_LAUNCH']+1, 
-            1
-        )
-
-        if len(sccd_result.nrt_model['nrt_coefs'][band_index]) == 8:
-            plot_df = pd.DataFrame(
-                {
-                'dates': j,
-                'trend': j * sccd_result.nrt_model['nrt_coefs'][band_index][1] / slope_scale + sccd_result.nrt_model['nrt_coefs'][band_index][0],
-                'annual': np.cos(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][2] + np.sin(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][3],
-                'semiannual': np.cos(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][4] + np.sin(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][5],
-                'trimodal': np.cos(3 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][6] + np.sin(3 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][7]
-            })
-        else:
-            plot_df = pd.DataFrame(
-                {
-                'dates': j,
-                'trend': j * sccd_result.nrt_model['nrt_coefs'][band_index][1] / slope_scale + sccd_result.nrt_model['nrt_coefs'][band_index][0],
-                'annual': np.cos(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][2] + np.sin(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][3],
-                'semiannual': np.cos(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][4] + np.sin(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][5],
-                'trimodal': j * 0
-            })
-            
-        plot_df['predicted'] = plot_df['trend'] + plot_df['annual'] + plot_df['semiannual'] + plot_df['trimodal']
-        calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in plot_df["dates"]]
-        plot_df.loc[:, 'dates_formal'] = calendar_dates
-        g = sns.lineplot(
-            x="dates_formal", y="predicted",
-            data=plot_df,
-            label="Model fit",
-            ax=axe,
-            color=default_plot_kwargs['line_color']
-        )
-        if g.legend_ is not None: 
-            g.legend_.remove()
+        # Plot fitted curve (daily states, decimated to the axes width in 'fast' mode);
+        # the manual legend below replaces the automatic one
+        plot_states_line(axe, states["dates"], states["General"], default_plot_kwargs['line_color'], "Model fit", default_plot_kwargs['render_mode'])
+
+    # Evaluate the segment fits (unless states are plotted) in one batched call; the coefficient
+    # count follows the stored coefficient array
+    if states is None:
+        t_start, t_end, coefs = sccd_fit_segments(sccd_result, include_nrt=False)
+        days, predicted, bounds = evaluate_harmonic_segments(t_start, t_end, coefs, band_index, n_coefs=coefs.shape[-1])
+        plot_model_fit(axe, days, predicted, bounds, default_plot_kwargs['line_color'], default_plot_kwargs['render_mode'])
+    # The near-real-time projection is drawn separately (NRT_GID) so that plot_nrt_tail can
+    # replace it after an incremental update
+    plot_nrt_projection(axe, sccd_result, band_index, default_plot_kwargs['line_color'], default_plot_kwargs['render_mode'])
 
     # add manual legends
     legend_elements = [Line2D([0], [0], label=f'{band_names[indicator_band_index]} decrease break', color='k'),
@@ -1482,11 +3019,7 @@ def display_sccd_result(
     axe.legend(handles=legend_elements, loc='upper left', prop={'size': 9})
     
     # plot breaks
-    for i in range(len(sccd_result.rec_cg)):
-        if sccd_result.rec_cg[i]['magnitude'][indicator_band_index] < 0:
-            axe.axvline(pd.Timestamp.fromordinal(sccd_result.rec_cg[i]['t_break']), color='k')
-        else:
-            axe.axvline(pd.Timestamp.fromordinal(sccd_result.rec_cg[i]['t_break']), color='r')
+    plot_breaks(axe, sccd_result.rec_cg, indicator_band_index)
     
     axe.set_ylabel(f"{band_name} * 10000", fontsize=default_plot_kwargs['font_size'])
 
@@ -1507,7 +3040,7 @@ def display_sccd_result(
     axe.set_title(title, fontweight="bold", size=title_font_size, pad=2)
 
 def display_sccd_states_flex(
-    data_df: pd.DataFrame,
+    data_df: Union[pd.DataFrame, PreparedSeries],
     states: pd.DataFrame,
     axes: Axes,
     variable_name: str,
@@ -1516,1337 +3049,2338 @@ def display_sccd_states_flex(
     band_index: int,  
     plot_kwargs: Optional[Dict] = None
 ):
-    
+    """显示S-CCD状态结果的灵活函数（data_df可以是PreparedSeries，或含dates和qa列的DataFrame）"""
     default_plot_kwargs = {
         'marker_size': 5,
         'marker_alpha': 0.7,
         'line_color': 'orange',
-        'font_size': 14
+        'font_size': 14,
+        'render_mode': 'fast'
     }
     if plot_kwargs is not None:
         default_plot_kwargs.update(plot_kwargs)
+    render_mode = default_plot_kwargs['render_mode']
 
-    col_prefix = f"b{band_index}"  
+    # 构建列名前缀
+    col_prefix = f"b{band_index}"  # 使用b0, b1等格式
     
+    # 构建完整的列名
     trend_col = f"{col_prefix}_trend"
     annual_col = f"{col_prefix}_annual"
     semiannual_col = f"{col_prefix}_semiannual"
-    trimodal_col = f"{col_prefix}_trimodal"  
+    trimodal_col = f"{col_prefix}_trimodal"  # 可能不存在
     
-    # Verify if the column exists (trimodal optional)
+    # 验证列是否存在（trimodal可选）
     required_cols = [trend_col, annual_col, semiannual_col]
     missing_cols = [col for col in required_cols if col not in states.columns]
     if missing_cols:
-        raise ValueError(f"Missing required columns: {missing_cols}. Available columns: {states.columns.tolist()}")
+        raise ValueError(f"缺少必要的列: {missing_cols}。可用列: {states.columns.tolist()}")
 
-    has_trimodal = trimodal_col in states.columns  
+    has_trimodal = trimodal_col in states.columns  # 检查是否有trimodal列
 
-    states["dates_formal"] = [pd.Timestamp.fromordinal(int(row)) for row in states["dates"]]
+    # 组合拟合结果（第current_ax_index个子图中绘制）
+    if has_trimodal:
+        states["General"] = states[annual_col] + states[trend_col] + states[semiannual_col] + states[trimodal_col]
+    else:
+        states["General"] = states[annual_col] + states[trend_col] + states[semiannual_col]
 
-    # Plot the trend component (1st subplot)
+    # 绘制趋势分量（第1个子图）
     extra = (np.max(states[trend_col]) - np.min(states[trend_col])) / 4
     axes[0].set(ylim=(np.min(states[trend_col]) - extra, np.max(states[trend_col]) + extra))
-    sns.lineplot(x="dates_formal", y=trend_col, data=states, ax=axes[0], color="orange")
+    plot_states_line(axes[0], states["dates"], states[trend_col], "orange", render_mode=render_mode)
     axes[0].set(ylabel="Trend")
 
-    # Plot the annual cycle component (second subplot)
+    # 绘制年周期分量（第2个子图）
     extra = (np.max(states[annual_col]) - np.min(states[annual_col])) / 4
     axes[1].set(ylim=(np.min(states[annual_col]) - extra, np.max(states[annual_col]) + extra))
-    sns.lineplot(x="dates_formal", y=annual_col, data=states, ax=axes[1], color="orange")
+    plot_states_line(axes[1], states["dates"], states[annual_col], "orange", render_mode=render_mode)
     axes[1].set(ylabel="Annual cycle")
 
-    # Plot the semi-annual cycle component (the 3rd subplot)
+    # 绘制半年周期分量（第3个子图）
     extra = (np.max(states[semiannual_col]) - np.min(states[semiannual_col])) / 4
     axes[2].set(ylim=(np.min(states[semiannual_col]) - extra, np.max(states[semiannual_col]) + extra))
-    sns.lineplot(x="dates_formal", y=semiannual_col, data=states, ax=axes[2], color="orange")
+    plot_states_line(axes[2], states["dates"], states[semiannual_col], "orange", render_mode=render_mode)
     axes[2].set(ylabel="Semi-annual cycle")
 
-    current_ax_index = 3  # Current subgraph index
-
-    # If there is a trimodal column, plot the trimodal component (the 4th subplot)
-    if has_trimodal:
-        extra = (np.max(states[trimodal_col]) - np.min(states[trimodal_col])) / 4
-        axes[3].set(ylim=(np.min(states[trimodal_col]) - extra, np.max(states[trimodal_col]) + extra))
-        sns.lineplot(x="dates_formal", y=trimodal_col, data=states, ax=axes[3], color="orange")
-        axes[3].set(ylabel="Trimodal cycle")
-        current_ax_index += 1  # If a trimodal is plotted, the next subplot index is incremented by 1.
-
-    # Plot raw data (subplot current_ax_index)
-    data_clean = data_df[(data_df["qa"] == 0) | (data_df['qa'] == 1)].copy()
-    data_clean["dates"] = check_and_convert_dates(data_clean["dates"])
-    data_clean["dates_formal"] = [pd.Timestamp.fromordinal(int(row)) for row in data_clean["dates"]]
-    axes[current_ax_index].plot(
-        'dates_formal', variable_name, 'go',
-        markersize=default_plot_kwargs['marker_size'],
-        alpha=default_plot_kwargs['marker_alpha'],
-        data=data_clean
-    )
-
-    # Plotting the fitting results (subplot current_ax_index)
-    if has_trimodal:
-        states["General"] = states[annual_col] + states[trend_col] + states[semiannual_col] + states[trimodal_col]
-    else:
-        states["General"] = states[annual_col] + states[trend_col] + states[semiannual_col]
-    
-    sns.lineplot(x="dates_formal", y="General", data=states, label="fit", ax=axes[current_ax_index], color="orange")
-    
-    band_values = data_df[data_df['qa'] == 0][variable_name]
-    q01, q99 = np.quantile(band_values, [0.01, 0.99])
-    extra = (q99 - q01) * 0.4
-    axes[current_ax_index].set(ylim=(q01 - extra, q99 + extra))
-    
-    axes[current_ax_index].set_ylabel(variable_name, fontsize=default_plot_kwargs['font_size'])
-    axes[current_ax_index].set_title(title, fontweight="bold", size=16, pad=2)
-    axes[current_ax_index].set_xlabel("")
-    
-"""                   
-            mid_content = f"""
-in_path = '{params['input_file']}'
-# read example csv for HLS time series
-if in_path.endswith('.csv'):
-    data = pd.read_csv(in_path)
-elif in_path.endswith('.xlsx') or in_path.endswith('.xls'):
-    data = pd.read_excel(in_path)
-else:
-    raise ValueError("Unsupported file format")
-# split the array by the column
-date_column = '{params['date_column']}'  
-data.columns = ['dates' if col == date_column else col for col in data.columns]
-dates = data['dates'].values
-dates = check_and_convert_dates(dates)
-
-if not all(np.issubdtype(data[col].dtype, np.integer) for col in data.select_dtypes(include=[np.number]).columns):
-    messagebox.showerror("Error", f"The data contains non-integer type numeric columns")
-
-merge = np.stack([data[b].values for b in {params['selected_bands']}], axis=1)
-
-qa_column = '{params['qa_column']}'  
-if qa_column in data.columns:
-    data.columns = ['qa' if col == qa_column else col for col in data.columns]
-    qa = data['qa'].values
-else:
-    
-    qa = np.zeros_like(dates, dtype=int)
-    data['qa'] = qa
-fitting_coefficients = True if '{params['fitting_curve']}' == 'Lasso' else False
-"""
-            
-            if params['method'] == 'COLD':
-                script_content = f"""
-cold_result = cold_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}))        
+    current_ax_index = 3  # 当前子图索引
 
-sns.set_theme(style="darkgrid")
-sns.set_context("notebook")
+    # 如果有trimodal列，绘制trimodal分量（第4个子图）
+    if has_trimodal:
+        extra = (np.max(states[trimodal_col]) - np.min(states[trimodal_col])) / 4
+        axes[3].set(ylim=(np.min(states[trimodal_col]) - extra, np.max(states[trimodal_col]) + extra))
+        plot_states_line(axes[3], states["dates"], states[trimodal_col], "orange", render_mode=render_mode)
+        axes[3].set(ylabel="Trimodal cycle")
+        current_ax_index += 1  # 如果绘制了trimodal，则下一个子图索引+1
 
-fig, ax = plt.subplots(figsize=(12, 5))
+    # 绘制原始数据（第current_ax_index个子图），直接使用PreparedSeries中已转换的日期和波段数组
+    if isinstance(data_df, PreparedSeries):
+        series = data_df
+    else:
+        series = PreparedSeries(check_and_convert_dates(data_df['dates'].values), data_df[[variable_name]].to_numpy(), data_df['qa'].values, [variable_name])
+    variable_index = series.band_names.index(variable_name)
+    dates_formal = series.datenums[series.clean]
+    axes[current_ax_index].plot(
+        dates_formal, series.merge[series.clean, variable_index], 'go',
+        markersize=default_plot_kwargs['marker_size'],
+        alpha=default_plot_kwargs['marker_alpha'],
+        label=variable_name
+    )
+    axes[current_ax_index].xaxis_date()
 
-display_cold_result(data=np.column_stack((dates, merge, qa)), 
-                band_names={params['selected_bands']}, 
-                band_index={params['selected_bands']}.index('{params['display_band']}'), 
-                indicator_band_index={params['selected_bands']}.index('{params['break_indicator']}'), 
-                cold_result=cold_result, 
-                axe=ax, 
-                title="COLD")
-plt.show()
-"""
+    # 绘制拟合结果（第current_ax_index个子图）
+    plot_states_line(axes[current_ax_index], states["dates"], states["General"], "orange", "fit", render_mode)
+    axes[current_ax_index].legend()
+    
+    # 设置y轴范围
+    axes[current_ax_index].set(ylim=series.ylim(variable_index, clear_only=True))
+    
+    axes[current_ax_index].set_ylabel(variable_name, fontsize=default_plot_kwargs['font_size'])
+    axes[current_ax_index].set_title(title, fontweight="bold", size=16, pad=2)
+    axes[current_ax_index].set_xlabel("")
 
-            elif params['method'] == 'S-CCD':
-                if params['output'] == 'anomaly':
-                    if params['fitting_curve'] == 'States':
-                        script_content = f"""
-sccd_result, anomaly = sccd_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}),output_anomaly=True, fitting_coefs=fitting_coefficients, trimodal={params['trimodal']})
-sccd_result, states = sccd_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}), state_intervaldays=1, fitting_coefs=fitting_coefficients, trimodal={params['trimodal']})
-                        
-sns.set_theme(style="darkgrid")
-sns.set_context("notebook")
-fig, axes = plt.subplots(figsize=(12, 5))
-plt.subplots_adjust(hspace=0.4)
-                        
 
-display_sccd_result_sif(data=np.column_stack((dates, merge, qa)),  
-                    band_names={params['selected_bands']}, 
-                    band_index={params['selected_bands']}.index('{params['display_band']}'), 
-                    indicator_band_index={params['selected_bands']}.index('{params['break_indicator']}'), 
-                    sccd_result=sccd_result,  
-                    axe=axes, 
-                    title="S-CCD anomaly",
-                    states=states,
-                    anomaly=anomaly,
-                    trimodal={params['trimodal']})
-                        
-plt.show()    
-"""
+# Cython中创建的anomaly namedtuple无法pickle，这里定义一个字段相同的等价类型
+SccdAnomaly = namedtuple("SccdAnomaly", "position rec_cg_anomaly")
+# 持久化检测结果（ResultStore）的默认目录和总大小上限
+RESULT_STORE_DIR = os.path.join(os.path.expanduser('~'), '.pyxccd_gui', 'results')
+RESULT_STORE_MAX_BYTES = 1024 ** 3
+
+
+def make_picklable(output):
+    """将pyxccd返回的namedtuple转换为可在进程间传递的等价对象"""
+    fields = getattr(output, '_fields', None)
+    if fields == SccdOutput._fields:
+        return SccdOutput(*output)
+    if fields == SccdAnomaly._fields:
+        return SccdAnomaly(*output)
+    return output
+
+
+def pack_output(output):
+    """
+    将检测输出拆分为不需要pickle即可保存的部分，返回(布局, {名称: 数组}, [DataFrame])。
+    布局依次描述输出的每个部分：'array'、'frame'或namedtuple的类型名（SccdOutput/SccdAnomaly），
+    namedtuple的字段保存为名为"序号_字段名"的数组
+    """
+    parts = output if isinstance(output, tuple) and not hasattr(output, '_fields') else (output,)
+    layout, arrays, frames = [], {}, []
+    for i, part in enumerate(parts):
+        if isinstance(part, pd.DataFrame):
+            layout.append('frame')
+            frames.append(part)
+        elif hasattr(part, '_fields'):
+            layout.append(type(part).__name__)
+            arrays.update((f"{i}_{name}", np.asarray(value)) for name, value in zip(part._fields, part))
+        else:
+            layout.append('array')
+            arrays[str(i)] = np.asarray(part)
+    return layout, arrays, frames
+
+
+def unpack_output(layout, arrays, frames):
+    """pack_output的逆操作：由布局、数组和DataFrame还原检测输出"""
+    types = {'SccdOutput': SccdOutput, 'SccdAnomaly': SccdAnomaly}
+    frames = iter(frames)
+    parts = []
+    for i, kind in enumerate(layout):
+        if kind == 'frame':
+            parts.append(next(frames))
+        elif kind == 'array':
+            parts.append(arrays[str(i)])
+        else:
+            values = []
+            for name in types[kind]._fields:
+                array = arrays[f"{i}_{name}"]
+                # 0维数组还原为标量：结构化的nrt_model为np.void，position等为Python整数
+                values.append(array[()] if array.ndim or array.dtype.names else array.item())
+            parts.append(types[kind](*values))
+    return tuple(parts) if len(parts) > 1 else parts[0]
+
+
+# 支持的输入格式（扩展名 -> 说明），用于打开文件对话框。
+# Parquet/Feather为列式格式，只读取需要的列；NPZ中每列保存为一个同名的一维数组
+TABLE_FORMATS = {
+    '.csv': "CSV",
+    '.xlsx': "Excel",
+    '.xls': "Excel",
+    '.parquet': "Parquet",
+    '.feather': "Feather",
+    '.arrow': "Feather",
+    '.npz': "NumPy NPZ",
+}
+# 由CSV/Excel转换得到的Parquet缓存文件后缀（data.csv -> data.csv.parquet）
+PARQUET_CACHE_SUFFIX = '.parquet'
+# 打开文件时读取的样本行数（用于判断列的类型）
+SAMPLE_ROWS = 100
+
+
+def table_format(in_path):
+    """按扩展名返回输入文件格式（TABLE_FORMATS中的扩展名），不支持时抛出ValueError"""
+    ext = os.path.splitext(in_path)[1].lower()
+    if ext not in TABLE_FORMATS:
+        raise ValueError("Unsupported file format")
+    return ext
+
+
+def source_fingerprint(in_path):
+    """源文件的大小和修改时间，记录在Parquet缓存中用于判断缓存是否过期"""
+    stat = os.stat(in_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def parquet_cache_path(in_path):
+    """CSV/Excel文件旁边的Parquet缓存路径"""
+    return in_path + PARQUET_CACHE_SUFFIX
+
+
+def cached_parquet(in_path):
+    """返回与源文件一致的Parquet缓存路径；没有缓存、缓存过期或无法读取pyarrow时返回None"""
+    cache_path = parquet_cache_path(in_path)
+    if table_format(in_path) not in ('.csv', '.xlsx', '.xls') or not os.path.exists(cache_path):
+        return None
+    try:
+        import pyarrow.parquet as pq
+        metadata = pq.read_schema(cache_path).metadata or {}
+    except (ImportError, OSError, ValueError):
+        return None
+    source = metadata.get(b'pyxccd_source')
+    if source is None or json.loads(source) != source_fingerprint(in_path):
+        return None
+    return cache_path
+
+
+def convert_to_parquet(in_path):
+    """
+    将CSV/Excel文件转换为旁边的Parquet缓存（in_path + PARQUET_CACHE_SUFFIX），
+    之后read_table读取该文件时自动改为读取缓存。返回缓存路径。
+    """
+    if table_format(in_path) not in ('.csv', '.xlsx', '.xls'):
+        raise ValueError("Only CSV and Excel files can be converted to Parquet")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    fingerprint = source_fingerprint(in_path)
+    table = pa.Table.from_pandas(read_table(in_path, use_cache=False), preserve_index=False)
+    metadata = dict(table.schema.metadata or {}, pyxccd_source=json.dumps(fingerprint))
+    cache_path = parquet_cache_path(in_path)
+    pq.write_table(table.replace_schema_metadata(metadata), cache_path + ".tmp")
+    os.replace(cache_path + ".tmp", cache_path)
+    return cache_path
+
+
+def scan_table(in_path, sample_rows=SAMPLE_ROWS):
+    """
+    只读取表头和前sample_rows行（用于填充列列表和判断列类型），不读取整个文件。
+    Parquet/Feather只读取第一个数据块，NPZ只读取各数组的头部和前几个元素。
+    """
+    ext = table_format(in_path)
+    if ext in ('.csv', '.xlsx', '.xls'):
+        cache_path = cached_parquet(in_path)
+        if cache_path is not None:
+            in_path, ext = cache_path, '.parquet'
+    if ext == '.csv':
+        return pd.read_csv(in_path, nrows=sample_rows)
+    elif ext in ('.xlsx', '.xls'):
+        return pd.read_excel(in_path, nrows=sample_rows)
+    elif ext == '.parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(in_path)
+        batch = next(parquet_file.iter_batches(batch_size=max(sample_rows, 1)), None)
+        table = parquet_file.schema_arrow.empty_table() if batch is None else batch.slice(0, sample_rows)
+        return table.to_pandas()
+    elif ext in ('.feather', '.arrow'):
+        import pyarrow as pa
+        reader = pa.ipc.open_file(in_path)
+        if reader.num_record_batches == 0:
+            return reader.schema.empty_table().to_pandas()
+        return reader.get_batch(0).slice(0, sample_rows).to_pandas()
+    else:
+        # 逐个读取.npy头部，只解压前sample_rows个元素
+        columns = {}
+        with zipfile.ZipFile(in_path) as archive:
+            for member in archive.namelist():
+                with archive.open(member) as f:
+                    version = np.lib.format.read_magic(f)
+                    if version == (1, 0):
+                        shape, _, dtype = np.lib.format.read_array_header_1_0(f)
                     else:
-                        script_content = f"""
-sccd_result, anomaly = sccd_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}),output_anomaly=True, fitting_coefs=fitting_coefficients, trimodal={params['trimodal']})
-sns.set_theme(style="darkgrid")
-sns.set_context("notebook")
-fig, axes = plt.subplots(figsize=(12, 5))
-plt.subplots_adjust(hspace=0.4)
+                        shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+                    n = min(sample_rows, shape[0]) if shape else 0
+                    columns[member[:-4] if member.endswith('.npy') else member] = np.frombuffer(f.read(n * dtype.itemsize), dtype=dtype)
+        return pd.DataFrame(columns)
+
+
+def compact_integers(data):
+    """将整数列原地改为能容纳其取值的int16或int32（反射率、QA和序数日期都在此范围内）"""
+    for column in data.columns:
+        values = data[column].to_numpy()
+        dtype = smallest_int_dtype(values)
+        if dtype != values.dtype:
+            data[column] = values.astype(dtype)
+    return data
+
+
+def input_columns(params, *extra):
+    """检测需要读取的列：日期列、QA列（若有）、所选波段以及extra中的其他列（如批处理的ID列）"""
+    columns = [params['date_column']]
+    if params.get('qa_column') is not None:
+        columns.append(params['qa_column'])
+    columns += list(params['selected_bands']) + list(extra)
+    return list(dict.fromkeys(columns))
+
+
+def read_table(in_path, columns=None, use_cache=True, compact=False):
+    """
+    读取CSV、Excel、Parquet、Feather或NPZ表格。
+
+    columns为需要的列名列表时只读取这些列（Parquet/Feather/NPZ按列读取，不解析其他列）；
+    use_cache为True时，CSV/Excel文件存在未过期的Parquet缓存则改为读取缓存；
+    compact为True时整数列压缩为int16/int32。
+    """
+    ext = table_format(in_path)
+    if use_cache and ext in ('.csv', '.xlsx', '.xls'):
+        cache_path = cached_parquet(in_path)
+        if cache_path is not None:
+            in_path, ext = cache_path, '.parquet'
+    columns = None if columns is None else list(dict.fromkeys(columns))
+    data = _read_table(in_path, ext, columns)
+    # 解析后再压缩：pandas按指定的int32解析CSV时溢出不报错
+    return compact_integers(data) if compact else data
+
+
+def _read_table(in_path, ext, columns):
+    """按格式读取表格（read_table的实现）"""
+    # read example csv for HLS time series
+    if ext == '.csv':
+        return pd.read_csv(in_path, usecols=columns)
+    elif ext in ('.xlsx', '.xls'):
+        return pd.read_excel(in_path, usecols=columns)
+    elif ext == '.parquet':
+        return pd.read_parquet(in_path, columns=columns)
+    elif ext in ('.feather', '.arrow'):
+        return pd.read_feather(in_path, columns=columns)
+    else:
+        # NPZ中的数组按需解压；只有对象数组需要pickle，出于安全考虑不支持
+        with np.load(in_path, allow_pickle=False) as archive:
+            names = archive.files if columns is None else columns
+            missing = [name for name in names if name not in archive.files]
+            if missing:
+                raise ValueError(f"Columns not found in {os.path.basename(in_path)}: {missing}")
+            return pd.DataFrame({name: archive[name] for name in names}, copy=False)
+
+
+class DatasetCache:
+    """
+    已读取数据的内存缓存。
+
+    以(绝对路径, 修改时间, 文件大小, 读取的列, 是否压缩整数类型)为键，文件在磁盘上未变化时
+    直接返回已解析的DataFrame，避免每次Run都重新解析大型CSV/Excel文件；已缓存的DataFrame
+    包含所需的全部列时直接从中选取。返回的DataFrame是共享的，调用方不能原地修改。
+    """
+    
+    def __init__(self, max_items=4):
+        self.max_items = max_items
+        self._items = OrderedDict()
+    
+    @staticmethod
+    def file_key(path):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    
+    def load(self, path, columns=None, compact=False):
+        """返回文件对应的DataFrame（columns给出时只含这些列），仅在文件变化或未缓存时重新读取"""
+        file_key = self.file_key(path)
+        columns = None if columns is None else tuple(dict.fromkeys(columns))
+        key = file_key + (columns, compact)
+        if key in self._items:
+            self._items.move_to_end(key)
+            return self._items[key]
+        if columns is not None:
+            superset = [k for k in self._items if k[:3] == file_key and k[4] == compact and (k[3] is None or set(columns) <= set(k[3]))]
+            if superset:
+                self._items.move_to_end(superset[0])
+                return self._items[superset[0]][list(columns)]
+        
+        data = read_table(path, columns=columns, compact=compact)
+        # 同一路径的旧版本已失效
+        for old_key in [k for k in self._items if k[0] == file_key[0] and k[:3] != file_key]:
+            del self._items[old_key]
+        self._items[key] = data
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+        return data
+    
+    def clear(self):
+        self._items.clear()
 
 
-display_sccd_result_sif(data=np.column_stack((dates, merge, qa)),  
-                    band_names={params['selected_bands']}, 
-                    band_index={params['selected_bands']}.index('{params['display_band']}'), 
-                    indicator_band_index={params['selected_bands']}.index('{params['break_indicator']}'), 
-                    sccd_result=sccd_result, 
-                    anomaly=anomaly, 
-                    axe=axes, 
-                    title="S-CCD anomaly",
-                    trimodal={params['trimodal']})
-                        
-plt.show()     
-"""
-                
-                elif params['output'] == 'state_components':
-                    script_content = f"""
-sccd_result, states = sccd_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}),output_anomaly=False, state_intervaldays=1, fitting_coefs=fitting_coefficients, trimodal={params['trimodal']})
-                
-sns.set_theme(style="darkgrid")
-sns.set_context("notebook")
-                    
-n_subplots = 5 if {params['trimodal']} else 4
-fig, axes = plt.subplots(n_subplots, 1, figsize=[11, 9], sharex=True)
-plt.subplots_adjust(left=0.08, right=0.98, top=0.92, bottom=0.1)
-                    
-display_sccd_states_flex(data_df=data, 
-                    axes=axes, 
-                    states=states, 
-                    band_name='{params['display_band']}',
-                    band_index={params['selected_bands']}.index('{params['display_band']}'), 
-                    variable_name='{params['display_band']}', 
-                    title="S-CCD")
-                    
-plt.show()
-"""
-                
-                elif params['output'] == 'breaks':
-                    if params['fitting_curve'] == 'States': 
-                        script_content = f"""
-sccd_result, states = sccd_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}),output_anomaly=False, state_intervaldays=1, fitting_coefs=fitting_coefficients, trimodal={params['trimodal']})
-                
-sns.set_theme(style="darkgrid")
-sns.set_context("notebook")
+# 模块级共享缓存：GUI进程中由open_file/run_analysis共用，工作进程中在多次任务间复用
+DATASET_CACHE = DatasetCache()
 
-fig, ax = plt.subplots(figsize=(12, 5))
-display_sccd_result_sif(data=np.column_stack((dates, merge, qa)), 
-                    band_names={params['selected_bands']}, 
-                    band_index={params['selected_bands']}.index('{params['display_band']}'), 
-                    indicator_band_index={params['selected_bands']}.index('{params['break_indicator']}'), 
-                    sccd_result=sccd_result, 
-                    axe=ax, 
-                    title="S-CCD",
-                    states=states)
-plt.show()
-"""            
-                    else:
-                        script_content = f"""
-sccd_result = sccd_detect_flex(dates, merge, qa, float({params['Lam']}), p_cg=float({params['P_CG']}), conse=int({params['CONSE']}),output_anomaly=False, fitting_coefs=fitting_coefficients, trimodal={params['trimodal']})
 
-                
-sns.set_theme(style="darkgrid")
-sns.set_context("notebook")
+# 栅格堆栈模式：目录中每个采集日期一个多波段GeoTIFF，日期取自文件名
+RASTER_EXTENSIONS = ('.tif', '.tiff')
+# 文件名中的日期：YYYYMMDD或YYYY-MM-DD（Landsat、Sentinel-2等），以及YYYYDDD年积日（HLS，如2021123T154028）
+RASTER_DATE_PATTERNS = (
+    (r'(?<!\d)(\d{4})-?(\d{2})-?(\d{2})(?!\d)', '%Y%m%d'),
+    (r'(?<!\d)(\d{7})(?=T\d|(?!\d))', '%Y%j'),
+)
+# 为数据文件、结果存储等保留的文件描述符数，其余的可用于保持场景文件打开
+RASTER_RESERVED_FILES = 128
+# 快视图的最大边长（像素）
+QUICKLOOK_SIZE = 1024
 
-fig, ax = plt.subplots(figsize=(12, 5))
-display_sccd_result(data=np.column_stack((dates, merge, qa)), 
-                band_names={params['selected_bands']}, 
-                band_index={params['selected_bands']}.index('{params['display_band']}'), 
-                indicator_band_index={params['selected_bands']}.index('{params['break_indicator']}'), 
-                sccd_result=sccd_result, 
-                axe=ax, 
-                title="SCCD")
-plt.show()
-            """
 
-        
-            full_script = header_content + mid_content + script_content
-            text_area.insert(tk.INSERT, full_script)
-            
-        except Exception as e:
-            text_area.insert(tk.INSERT, f"Error getting source code: {str(e)}")
-            
-        text_area.config(state=tk.DISABLED)
-        
-        close_button = ttk.Button(
-            script_window, 
-            text="Close", 
-            command=script_window.destroy
-        )
-        close_button.pack(pady=5)
+def parse_scene_date(filename):
+    """从场景文件名中解析采集日期，返回序数日；无法解析时返回None"""
+    for pattern, fmt in RASTER_DATE_PATTERNS:
+        for match in re.finditer(pattern, filename):
+            try:
+                return datetime.strptime("".join(match.groups()), fmt).toordinal()
+            except ValueError:
+                continue
+    return None
+
+
+def raster_handle_limit(n_scenes):
+    """
+    可以同时保持打开的场景文件数：最多n_scenes个。POSIX上还受进程当前的文件描述符软上限约束
+    （只读取，不修改）；Windows上GDAL使用Win32句柄，没有这一限制
+    """
+    try:
+        import resource
+    except ImportError:
+        return max(1, n_scenes)
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return max(1, n_scenes)
+    return max(1, min(n_scenes, soft - RASTER_RESERVED_FILES))
+
+
+class RasterStack:
+    """
+    GeoTIFF场景目录：每个采集日期一个多波段文件，所有场景的尺寸和波段数相同。
+
+    extract(row, col)在线程池中从每个场景读取一个1×1窗口，返回该像元的时间序列表格
+    （'date'列为序数日，其余列为各波段，波段名取自波段描述，没有描述时为b1、b2...），
+    与表格输入的布局相同，之后的检测和绘图与表格输入完全一致。打开的数据集句柄保持缓存，
+    再次提取时不再重新打开文件；缓存大小为max_open（raster_handle_limit：场景数，受文件
+    描述符上限约束），场景数超过它时只有超出的场景在每次提取时临时打开，已缓存的句柄不会被换出。
+    """
     
+    def __init__(self, directory, workers=None):
+        self.directory = directory
+        self.workers = workers
+        # [(序数日, 路径)]，按日期排序；文件名中没有日期的GeoTIFF记录在skipped中
+        self.scenes = []
+        self.skipped = []
+        # 场景列表每次变化时加1
+        self.version = 0
+        self.max_open = 1
+        self._handles = {}
+        self._lock = threading.Lock()
+        self._extract_lock = threading.Lock()
+        self._pool = None
+        self._closed = False
+        self.refresh()
+        with self._open(self.scenes[0][1]) as first:
+            self.width, self.height, self.count = first.width, first.height, first.count
+            names = [description or f"b{i + 1}" for i, description in enumerate(first.descriptions)]
+        self.band_names = names if len(set(names)) == len(names) else [f"b{i + 1}" for i in range(self.count)]
     
+    def refresh(self):
+        """重新扫描目录中的场景，返回场景列表是否发生了变化（不等待正在进行的提取，可在界面线程中调用）"""
+        scenes, skipped = [], []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.lower().endswith(RASTER_EXTENSIONS):
+                continue
+            day = parse_scene_date(name)
+            if day is None:
+                skipped.append(name)
+            else:
+                scenes.append((day, os.path.join(self.directory, name)))
+        if not scenes:
+            raise ValueError(f"No GeoTIFF scenes with a date in the file name found in {self.directory}")
+        scenes.sort()
+        changed = scenes != self.scenes
+        if changed:
+            # 已从目录中移除的场景的句柄在下一次提取时关闭
+            self.scenes, self.version = scenes, self.version + 1
+            self.max_open = raster_handle_limit(len(scenes))
+        self.skipped = skipped
+        return changed
     
-    def run_analysis(self):
-        """运行分析"""
-        # 验证输入
-        if self.df is None:
-            messagebox.showerror("Error", "Please select a data file first")
-            return
-        
-        if not self.selected_columns['date']:
-            messagebox.showerror("Error", "Please select the date column")
-            return
-        
-        if not self.selected_columns['display_band']:
-            messagebox.showerror("Error", "Please select the display band column")
-            return
-        
-        if not self.selected_columns['bands']:
-            messagebox.showerror("Error", "Please select at least one band")
-            return
-        
-        if not self.selected_columns['qa'] and self.qa_enable_var.get():
-            messagebox.showerror("Error", "Please select the QA column")
-            return
-        
-        
+    def header(self):
+        """与extract结果列相同的空表格（用于填充列列表）"""
+        return pd.DataFrame(columns=['date'] + self.band_names)
+    
+    @contextmanager
+    def _open(self, path):
+        """场景的数据集句柄：已缓存或缓存未满时使用缓存的句柄（必要时打开），否则临时打开、用完即关闭"""
+        with self._lock:
+            dataset = self._handles.get(path)
+        if dataset is None:
+            import rasterio
+            opened = rasterio.open(path)
+            with self._lock:
+                if path in self._handles:
+                    dataset = self._handles[path]
+                elif len(self._handles) < self.max_open:
+                    dataset = self._handles[path] = opened
+            if dataset is None:
+                try:
+                    yield opened
+                finally:
+                    opened.close()
+                return
+            if dataset is not opened:
+                opened.close()
+        yield dataset
+    
+    def _cache_handle(self, path):
+        with self._open(path):
+            pass
+    
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        return self._pool
+    
+    def prefetch(self):
+        """在后台线程中预先打开最近的（最多max_open个）场景，第一次提取时不必等待打开文件"""
+        paths = [path for _, path in self.scenes[-self.max_open:]]
+        threading.Thread(target=self._prefetch, args=(paths,), daemon=True).start()
+    
+    def _prefetch(self, paths):
+        # 与extract、refresh和close互斥：不会在读取或关闭句柄的同时打开句柄
+        with self._extract_lock:
+            if self._closed:
+                return
+            for future in [self._executor().submit(self._cache_handle, path) for path in paths]:
+                # 打不开的场景留给extract报告；close()取消的任务也在这里结束
+                try:
+                    future.result()
+                except Exception:
+                    pass
+    
+    def _read_pixel(self, path, window):
+        with self._open(path) as dataset:
+            if (dataset.width, dataset.height, dataset.count) != (self.width, self.height, self.count):
+                raise ValueError(
+                    f"{os.path.basename(path)} is {dataset.width} x {dataset.height} with {dataset.count} bands, "
+                    f"expected {self.width} x {self.height} with {self.count} bands"
+                )
+            return dataset.read(window=window)[:, 0, 0]
+    
+    def extract(self, row, col):
+        """读取(row, col)像元在所有场景中的波段值，返回按日期排序的时间序列表格"""
+        if not (0 <= row < self.height and 0 <= col < self.width):
+            raise ValueError(f"Pixel ({row}, {col}) is outside the {self.height} x {self.width} raster")
+        from rasterio.windows import Window
+        window = Window(col, row, 1, 1)
+        # 同一时间只进行一次提取，线程池中的读取不会用到正在被关闭的句柄
+        with self._extract_lock:
+            if self._closed:
+                raise ValueError(f"The raster stack {self.directory} has been closed")
+            scenes = self.scenes
+            current = {path for _, path in scenes}
+            with self._lock:
+                for path in [path for path in self._handles if path not in current]:
+                    self._handles.pop(path).close()
+            values = list(self._executor().map(partial(self._read_pixel, window=window), [path for _, path in scenes]))
+        data = pd.DataFrame(np.stack(values), columns=self.band_names)
+        data.insert(0, 'date', np.array([day for day, _ in scenes], dtype=np.int64))
+        return data
+    
+    def quicklook(self, band=1, max_size=QUICKLOOK_SIZE):
+        """
+        最新场景中一个波段（从1开始）的缩略图：按不超过max_size的尺寸降采样读取（有金字塔时
+        直接读取金字塔），返回float数组，nodata为NaN
+        """
+        scale = max(self.width, self.height) / max_size
+        shape = (max(1, round(self.height / max(scale, 1))), max(1, round(self.width / max(scale, 1))))
+        with self._open(self.scenes[-1][1]) as dataset:
+            return dataset.read(band, out_shape=shape, masked=True).astype(np.float64).filled(np.nan)
+    
+    def close(self):
+        """关闭线程池和所有打开的数据集（等待正在进行的提取或预先打开结束）"""
+        self._closed = True
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._extract_lock:
+            self._pool = None
+            with self._lock:
+                for dataset in self._handles.values():
+                    dataset.close()
+                self._handles.clear()
+
+
+def check_detection_params(params):
+    """检查P_CG和CONSE参数，不合法时抛出ValueError（GUI和命令行共用）"""
+    try:
+        p_cg = float(params['P_CG'])
+    except ValueError:
+        raise ValueError("P_CG must be a valid float number")
+    if not (0.0 < p_cg < 1.0):  # P_CG 应该是 (0.0, 1.0] 范围内的浮点数
+        raise ValueError("P_CG must be a float in the range (0.0, 1.0]")
+    
+    try:
+        conse = int(params['CONSE'])
+    except ValueError:
+        raise ValueError("CONSE must be a valid integer")
+    if not (0 < conse <= 8):  # CONSE 应该是 (0, 8] 范围内的整数
+        raise ValueError("CONSE must be an integer in the range (0, 8]")
+
+
+def check_columns(params, data):
+    """检查参数中引用的列是否存在于数据中，缺失时抛出ValueError"""
+    required = [params['date_column']] + params['selected_bands']
+    if params['qa_column'] is not None:
+        required.append(params['qa_column'])
+    missing = [col for col in required if col not in data.columns]
+    if missing:
+        raise ValueError(f"Columns not found in the data file: {missing}")
+
+
+def detection_key(method, dates, merge, qa, **options):
+    """由输入数组内容和检测参数计算检测结果的缓存键"""
+    digest = hashlib.sha1()
+    for array in (dates, merge, qa):
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(array.tobytes())
+    digest.update(repr((method, sorted(options.items()))).encode())
+    return digest.hexdigest()
+
+
+def estimate_nbytes(obj):
+    """估算检测结果占用的内存（字节）"""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, (tuple, list)):
+        return sum(estimate_nbytes(item) for item in obj)
+    if isinstance(obj, dict):
+        return sum(estimate_nbytes(item) for item in obj.values())
+    return 64
+
+
+class ResultStore:
+    """
+    检测结果的持久化存储：目录中的SQLite索引（results.sqlite）加上每个结果一个NPZ文件
+    （rec_cg、nrt_model、rec_cg_anomaly等数组），states等DataFrame另存为Parquet。
+    以detection_key（输入数组内容 + 方法和检测参数）为键，关闭程序后再次打开同一输入并
+    使用相同参数时直接读取结果。总大小超过max_bytes时按最近访问时间（LRU）删除。
+    读取失败时按未缓存处理；保存失败时put抛出异常，由调用方报告，不影响检测本身。
+    """
+    
+    def __init__(self, directory=None, max_bytes=RESULT_STORE_MAX_BYTES):
+        self.directory = RESULT_STORE_DIR if directory is None else directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.directory, 'results.sqlite')
+        self._created = False
+    
+    @contextmanager
+    def _index(self):
+        """打开索引数据库（首次使用时创建目录和表），退出时提交事务并关闭连接"""
+        if not self._created:
+            os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(self.index_path, timeout=10)
+        try:
+            with conn:
+                if not self._created:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS results "
+                        "(key TEXT PRIMARY KEY, files TEXT, nbytes INTEGER, created REAL, accessed REAL)"
+                    )
+                    self._created = True
+                yield conn
+        finally:
+            conn.close()
+    
+    def __contains__(self, key):
         try:
-            p_cg = float(self.p_cg_var.get())
-            if not (0.0 < p_cg < 1.0):  # P_CG 应该是 (0.0, 1.0] 范围内的浮点数
-                messagebox.showerror("Error", "P_CG must be a float in the range (0.0, 1.0]")
+            with self._index() as conn:
+                return conn.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone() is not None
+        except (OSError, sqlite3.Error):
+            return False
+    
+    def existing(self, keys):
+        """返回keys中已保存的键（一次查询）；索引无法读取时返回空集合"""
+        keys = list(keys)
+        if not keys:
+            return set()
+        try:
+            with self._index() as conn:
+                rows = conn.execute(f"SELECT key FROM results WHERE key IN ({', '.join('?' * len(keys))})", keys).fetchall()
+        except (OSError, sqlite3.Error):
+            return set()
+        return {key for key, in rows}
+    
+    @property
+    def nbytes(self):
+        with self._index() as conn:
+            return conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM results").fetchone()[0]
+    
+    def get(self, key):
+        """读取保存的结果并更新其访问时间；没有保存或文件已损坏时返回None（损坏的记录被删除）"""
+        try:
+            with self._index() as conn:
+                row = conn.execute("SELECT files FROM results WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+        except (OSError, sqlite3.Error):
+            return None
+        files = json.loads(row[0])
+        try:
+            with np.load(os.path.join(self.directory, files[0]), allow_pickle=False) as archive:
+                arrays = {name: archive[name] for name in archive.files}
+            frames = [pd.read_parquet(os.path.join(self.directory, name)) for name in files[1:]]
+            return unpack_output(json.loads(arrays.pop('layout').item()), arrays, frames)
+        except (OSError, ValueError, KeyError, ImportError):
+            self.remove(key)
+            return None
+    
+    def put(self, key, output):
+        """
+        保存一个结果（已保存时只更新访问时间），然后按LRU顺序删除旧结果直到总大小不超过max_bytes。
+        保存失败时删除已写出的文件并抛出异常（OSError、sqlite3.Error、ImportError等）
+        """
+        with self._index() as conn:
+            if conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key)).rowcount:
                 return
-        except ValueError:
-            messagebox.showerror("Error", "P_CG must be a valid float number")
-            return
-
-        # 验证 CONSE 参数
+        layout, arrays, frames = pack_output(output)
+        files = [f"{key}.npz"] + [f"{key}_{i}.parquet" for i in range(len(frames))]
+        paths = [os.path.join(self.directory, name) for name in files]
         try:
-            conse = int(self.conse_var.get())
-            if not (0 < conse <= 8):  # CONSE 应该是 (0, 8] 范围内的整数
-                messagebox.showerror("Error", "CONSE must be an integer in the range (0, 8]")
+            # 先写数据文件再写索引：中断时只会留下没有索引的文件，不会有指向不完整文件的记录
+            for frame, path in zip(frames, paths[1:]):
+                frame.to_parquet(path + ".tmp", index=False)
+                os.replace(path + ".tmp", path)
+            with open(paths[0] + ".tmp", 'wb') as f:
+                np.savez(f, layout=json.dumps(layout), **arrays)
+            os.replace(paths[0] + ".tmp", paths[0])
+            nbytes = sum(os.path.getsize(path) for path in paths)
+            if nbytes > self.max_bytes:
+                self._remove_files(files)
                 return
-        except ValueError:
-            messagebox.showerror("Error", "CONSE must be a valid integer")
+            now = time.time()
+            with self._index() as conn:
+                conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", (key, json.dumps(files), nbytes, now, now))
+        except BaseException:
+            self._remove_files(files + [name + ".tmp" for name in files])
+            raise
+        self.evict()
+    
+    def evict(self):
+        """保留最近访问的结果，删除其余较旧的结果，使总大小不超过max_bytes"""
+        with self._index() as conn:
+            rows = conn.execute("SELECT key, files, nbytes FROM results ORDER BY accessed DESC").fetchall()
+            expired = [(key, files) for (key, files, _), total in zip(rows, itertools.accumulate(row[2] for row in rows)) if total > self.max_bytes]
+            conn.executemany("DELETE FROM results WHERE key = ?", [(key,) for key, _ in expired])
+        for _, files in expired:
+            self._remove_files(json.loads(files))
+    
+    def remove(self, key):
+        """删除一个结果的索引记录和数据文件"""
+        try:
+            with self._index() as conn:
+                row = conn.execute("SELECT files FROM results WHERE key = ?", (key,)).fetchone()
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+        except (OSError, sqlite3.Error):
             return
-        
-        # 获取output选项
-        output_option = self.output_var.get()
-        
-        # 收集参数
-        params = {
-            'input_file': self.input_var.get(),
-            'method': self.method_var.get(),
-            'date_column': self.selected_columns['date'],
-            'qa_column': self.selected_columns['qa'],
-            'selected_bands': self.selected_columns['bands'],
-            'break_indicator': self.selected_columns['break_indicator'],
-            'display_band': self.selected_columns['display_band'],
-            'P_CG': self.p_cg_var.get(),
-            'CONSE': self.conse_var.get(),
-            'output': output_option,  # 使用新的output参数
-            'Lam': self.lam_var.get(),
-            'trimodal': self.trimodal_var.get(),
-            'fitting_curve': self.fitting_curve_var.get(),
-        }
-        # 保存参数以便在show_script中使用
-        self.last_params = params
-        # messagebox.showinfo("开始分析", f"开始执行变化检测分析\n方法: {params['method']}")
-        print("分析参数:", params)
-        def execute_change_detection(params):
-            import numpy as np
-            import os
-            import pandas as pd
-            from pyxccd import cold_detect_flex,sccd_detect_flex
-            from pyxccd.common import cold_rec_cg
-            from pyxccd.utils import read_data, getcategory_cold
-            from datetime import date
-            from typing import List, Tuple, Dict, Union, Optional
-            import seaborn as sns
-            import matplotlib.pyplot as plt
-            from matplotlib.axes import Axes
-            from pyxccd.common import SccdOutput, anomaly
-            from pyxccd.utils import getcategory_sccd, defaults, getcategory_cold, predict_ref
-            from matplotlib.lines import Line2D   
-            from tkinter import messagebox
-
-            def check_and_convert_dates(dates):
-                """
-                检查并转换日期列表/数组：
-                1. 支持格式：数字（如733062）或字符串（如"8/1/1979"）
-                2. 如果是字符串格式，转换为数字格式（序数日期）
-                3. 严格验证日期范围（700000-800000）
-                4. 返回转换后的整数格式日期数组（numpy.ndarray）
-                """
-                try:
-                    # 转换为numpy数组统一处理
-                    dates = np.array(dates) if not isinstance(dates, np.ndarray) else dates
-                    
-                    # 检查数组是否为空
-                    if len(dates) == 0:
-                        messagebox.showerror("Error", "Date data is empty")
-                        return None
-                    
-                    # 检查每个元素的类型和范围
-                    for i, date in enumerate(dates):
-                        # 处理数字类型日期
-                        if isinstance(date, (int, float, np.integer, np.floating)):
-                            if not (700000 <= date <= 800000):  # 保留你的范围检查
-                                messagebox.showerror("Error", f"Date value is not within the valid range (700000-800000): {date}")
-                                return None
-                        
-                        # 处理字符串类型日期
-                        elif isinstance(date, str):
-                            try:
-                                # 尝试解析日期字符串
-                                pd.to_datetime(date, format='%m/%d/%Y')
-                            except ValueError:
-                                try:
-                                    # 尝试其他可能的日期格式
-                                    pd.to_datetime(date)
-                                except ValueError:
-                                    messagebox.showerror("Error", f"Date format error: {date}")
-                                    return None
-                        else:
-                            messagebox.showerror("Error", f"Unsupported date format: {date}")
-                            return None
-                    
-                    # 如果所有日期都是字符串格式，进行转换
-                    if isinstance(dates[0], str):
-                        try:
-                            # 将字符串日期转换为datetime，然后转换为序数日期
-                            dates = pd.to_datetime(dates, format='%m/%d/%Y')
-                            dates = dates.to_series().apply(lambda x: x.toordinal()).values
-                            
-                            # 额外检查转换后的日期范围
-                            if not np.all((700000 <= dates) & (dates <= 800000)):
-                                invalid_dates = dates[(dates < 700000) | (dates > 800000)]
-                                messagebox.showerror("Error", 
-                                    f"The converted date is out of range (700000-800000): {invalid_dates[:5]}...")
-                                return None
-                        except Exception as e:
-                            messagebox.showerror("Error", f"Date conversion failed: {str(e)}")
-                            return None
-                    
-                    # 确保返回的是整数类型的numpy数组
-                    return np.array(dates, dtype=np.int64) if not isinstance(dates, np.ndarray) else dates.astype(np.int64)
-                
-                except Exception as e:
-                    messagebox.showerror("Error", f"An error occurred while processing the date: {str(e)}")
-                    return None
-            
-            
-            in_path = params['input_file']
-            # read example csv for HLS time series
-            if in_path.endswith('.csv'):
-                data = pd.read_csv(in_path)
-            elif in_path.endswith('.xlsx') or in_path.endswith('.xls'):
-                data = pd.read_excel(in_path)
-            else:
-                raise ValueError("Unsupported file format")
-            
-            # split the array by the column
-            data = data.rename(columns={params['date_column']: 'dates'})
-            dates = data['dates'].values
-            dates = check_and_convert_dates(dates)
-            
-            if not all(np.issubdtype(data[col].dtype, np.integer) for col in data.select_dtypes(include=[np.number]).columns):
-                messagebox.showerror("Error", f"The data contains non-integer type numeric columns")
-                
-            merge = np.stack([data[b].values for b in params['selected_bands']], axis=1)
-            if params['qa_column'] is not None:
-                
-                data = data.rename(columns={params['qa_column']: 'qa'})
-                qa = data['qa'].values
+        if row is not None:
+            self._remove_files(json.loads(row[0]))
+    
+    def _remove_files(self, files):
+        for name in files:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+class DetectionCache:
+    """
+    变化检测结果的内存缓存。
+
+    以detection_key(输入数组内容 + 方法和检测参数)为键，保存cold_detect_flex/
+    sccd_detect_flex的输出（rec_cg、states、anomaly）。只影响绘图的选项（显示波段、
+    断点指示波段等）不参与计算键，修改后可直接从缓存重绘。按LRU顺序淘汰，
+    总大小不超过max_bytes。缓存的结果是共享的，调用方不能原地修改。
+    设置了store（ResultStore）时，新结果同时写入磁盘，内存中没有的结果从磁盘读取；
+    保存失败不影响检测，错误信息由pop_store_errors()取出后报告。
+    调用write_in_background()后磁盘写入由后台线程完成，put只把结果放入内存。
+    """
+    
+    def __init__(self, max_bytes=256 * 1024 ** 2, store=None):
+        self.max_bytes = max_bytes
+        self.store = store
+        self._items = OrderedDict()
+        self._sizes = {}
+        self._store_errors = deque()
+        self._writes = None
+    
+    def __contains__(self, key):
+        return key in self._items or (self.store is not None and key in self.store)
+    
+    def cached_keys(self, keys):
+        """返回keys中已缓存的键；内存中没有的键合并为一次store查询"""
+        found = {key for key in keys if key in self._items}
+        missing = [key for key in keys if key not in found]
+        if missing and self.store is not None:
+            found |= self.store.existing(missing)
+        return found
+    
+    @property
+    def nbytes(self):
+        return sum(self._sizes.values())
+    
+    def get(self, key):
+        """返回缓存的结果，未缓存时返回None；内存中没有时从store读取并放入内存"""
+        if key not in self._items:
+            output = self.store.get(key) if self.store is not None else None
+            if output is not None:
+                self._remember(key, output)
+            return output
+        self._items.move_to_end(key)
+        return self._items[key]
+    
+    def put(self, key, output):
+        """加入一个结果（设置了store时同时写入磁盘）"""
+        self._remember(key, output)
+        if self.store is None:
+            return
+        if self._writes is not None:
+            self._writes.put((key, output))
+        else:
+            self._save(key, output)
+    
+    def write_in_background(self):
+        """之后的store写入交给后台线程（GUI进程使用：NPZ/Parquet写入和LRU删除不在界面线程中进行）"""
+        if self._writes is None:
+            self._writes = queue.Queue()
+            threading.Thread(target=self._write_loop, daemon=True).start()
+    
+    def _write_loop(self):
+        while True:
+            key, output = self._writes.get()
+            try:
+                self._save(key, output)
+            finally:
+                self._writes.task_done()
+    
+    @property
+    def pending_writes(self):
+        """后台线程中尚未完成的写入数量"""
+        return 0 if self._writes is None else self._writes.unfinished_tasks
+    
+    def flush(self):
+        """等待后台写入全部完成"""
+        if self._writes is not None:
+            self._writes.join()
+    
+    def _save(self, key, output):
+        """写入store，失败时记录错误信息"""
+        try:
+            self.store.put(key, output)
+        except (OSError, ValueError, ImportError, sqlite3.Error) as e:
+            self._store_errors.append(f"Could not save the result to {self.store.directory}: {type(e).__name__}: {e}")
+    
+    def pop_store_errors(self):
+        """取出并清空保存失败的错误信息"""
+        errors = []
+        while self._store_errors:
+            errors.append(self._store_errors.popleft())
+        return errors
+    
+    def _remember(self, key, output):
+        """将结果放入内存，并按LRU顺序淘汰直到总大小不超过max_bytes"""
+        size = estimate_nbytes(output)
+        if size > self.max_bytes:
+            return
+        self._items[key] = output
+        self._items.move_to_end(key)
+        self._sizes[key] = size
+        while self.nbytes > self.max_bytes:
+            old_key, _ = self._items.popitem(last=False)
+            del self._sizes[old_key]
+    
+    def update(self, entries):
+        for key, output in entries.items():
+            self.put(key, output)
+    
+    def detect(self, method, dates, merge, qa, **options):
+        """
+        带缓存的变化检测调用，返回(缓存键, 输出)。options为检测函数的关键字参数
+        （lam、p_cg、conse等），输出中的namedtuple已转换为可跨进程传递的对象。
+        """
+        key = detection_key(method, dates, merge, qa, **options)
+        output = self.get(key)
+        if output is None:
+            if method == 'COLD':
+                output = cold_detect_flex(dates, merge, qa, **options)
             else:
-                # 创建一个与 dates 长度相同的全零数组
-                qa = np.zeros_like(dates, dtype=int)
-                data['qa'] = qa
-            
-
-            
-            
-            def display_sccd_result_sif(
-                data: np.ndarray,
-                band_names: List[str],
-                band_index: int,
-                indicator_band_index: int,
-                sccd_result: SccdOutput,
-                axe: Axes,
-                title: str = 'S-CCD',
-                states: Optional[pd.DataFrame] = None,
-                anomaly: Optional[anomaly] = None,
-                trimodal: Optional[bool] = False,  
-                plot_kwargs: Optional[Dict] = None
-            ) -> Tuple[plt.Figure, List[plt.Axes]]:
-                """
-                Compare COLD and SCCD change detection algorithms by plotting their results side by side.
-                
-                This function takes time series remote sensing data, applies both COLD and SCCD algorithms,
-                and visualizes the curve fitting and break detection results for comparison. 
-                
-                Parameters:
-                -----------
-                data : np.ndarray
-                    Input data array with shape (n_observations, n_bands + 2) where:
-                    - First column: ordinal dates (days since January 1, AD 1)
-                    - Next n_bands columns: spectral band values
-                    - Last column: QA flags (0-clear, 1-water, 2-shadow, 3-snow, 4-cloud)
-                    
-                band_names : List[str]
-                    List of band names corresponding to the spectral bands in the data (e.g., ['red', 'nir'])
-                    
-                band_index : int
-                    1-based index of the band to plot (e.g., 0 for first band, 1 for second band)
-                    
-                indicator_band_index : int
-                    The band index used to determine break point colors (based on magnitude)
-                    
-                sccd_result: SccdOutput
-                    Output of sccd_detect
-                
-                axe: Axes
-                    An Axes object represents a single plot within that Figure
-                
-                title: Str
-                    The figure title. The default is "S-CCD"
-                    
-                states: pd.DataFrame, optional
-                    DataFrame containing model states for each time point (if provided, will use for fitting)
-                    
-                anomaly: anomaly, optional
-                    The anomaly detection outputs
-                    
-                trimodal: bool, optional
-                    If True, use 8 coefficients (including trimodal terms); if False, use 6 coefficients
-                    
-                plot_kwargs : Dict, optional
-                    Additional keyword arguments to pass to the display function. Possible keys:
-                    - 'marker_size': size of observation markers (default: 5)
-                    - 'marker_alpha': transparency of markers (default: 0.7)
-                    - 'line_color': color of model fit lines (default: 'orange')
-                    - 'font_size': base font size (default: 14)
-                    
-                Returns:
-                --------
-                Tuple[plt.Figure, List[plt.Axes]]
-                    A tuple containing the matplotlib Figure object and a list of Axes objects
-                """
-                w = np.pi * 2 / 365.25
-
-                # Set default plot parameters
-                default_plot_kwargs: Dict[str, Union[int, float, str]] = {
-                    'marker_size': 5,
-                    'marker_alpha': 0.7,
-                    'line_color': 'orange',
-                    'font_size': 14
-                }
-                if plot_kwargs is not None:
-                    default_plot_kwargs.update(plot_kwargs)
-
-                # Extract values with proper type casting
-                font_size = default_plot_kwargs.get('font_size', 14)
-                try:
-                    title_font_size = int(font_size) + 2
-                except (TypeError, ValueError):
-                    title_font_size = 16 
-
-                # Clean and prepare data
-                data = data[np.all(np.isfinite(data), axis=1)]
-                data_df = pd.DataFrame(data, columns=['dates'] + band_names + ['qa'])
-
-                # Plot COLD results
-                w = np.pi * 2 / 365.25
-                slope_scale = 10000
-
-                # Prepare clean data for COLD plot
-                data_clean = data_df[(data_df['qa'] == 0) | (data_df['qa'] == 1)].copy()
-                data_clean = data_clean[(data_clean >= 0).all(axis=1) & (data_clean.drop(columns="dates") <= 10000).all(axis=1)]
-                calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in data_clean["dates"]]
-                data_clean.loc[:, 'dates_formal'] = calendar_dates
-                
-                # Calculate y-axis limits
-                band_name = band_names[band_index]
-                band_values = data_clean[data_clean['qa'] == 0 | (data_clean['qa'] == 1)][band_name]
-                q01, q99 = np.quantile(band_values, [0.01, 0.99])
-                extra = (q99 - q01) * 0.4
-                ylim_low = q01 - extra
-                ylim_high = q99 + extra
-
-                # Plot SCCD observations
-                axe.plot(
-                    'dates_formal', band_name, 'go',
-                    markersize=default_plot_kwargs['marker_size'],
-                    alpha=default_plot_kwargs['marker_alpha'],
-                    data=data_clean
-                )
-
-                # Plot SCCD segments - NEW: use states if provided
-                if states is not None:
-                    # Build column names based on band_index
-                    col_prefix = f"b{band_index}"
-                    trend_col = f"{col_prefix}_trend"
-                    annual_col = f"{col_prefix}_annual"
-                    semiannual_col = f"{col_prefix}_semiannual"
-                    trimodal_col = f"{col_prefix}_trimodal"
-                    
-                    # Check required columns exist
-                    required_cols = [trend_col, annual_col, semiannual_col]
-                    missing_cols = [col for col in required_cols if col not in states.columns]
-                    if missing_cols:
-                        raise ValueError(f"Missing required columns in states: {missing_cols}")
-                    
-                    # Convert dates
-                    states["dates_formal"] = [pd.Timestamp.fromordinal(int(row)) for row in states["dates"]]
-                    
-                    # Calculate combined prediction (General)
-                    has_trimodal = trimodal_col in states.columns
-                    if has_trimodal:
-                        states["General"] = states[trend_col] + states[annual_col] + states[semiannual_col] + states[trimodal_col]
-                    else:
-                        states["General"] = states[trend_col] + states[annual_col] + states[semiannual_col]
-                    
-                    # Plot fitted curve
-                    g = sns.lineplot(
-                        x="dates_formal", y="General",
-                        data=states,
-                        label="Model fit",
-                        ax=axe,
-                        color=default_plot_kwargs['line_color']
-                    )
-                    if g.legend_ is not None: 
-                        g.legend_.remove()
+                output = sccd_detect_flex(dates, merge, qa, **options)
+                if isinstance(output, (tuple, list)) and not hasattr(output, '_fields'):
+                    output = tuple(make_picklable(item) for item in output)
                 else:
-                    # Original segment-by-segment plotting
-                    for segment in sccd_result.rec_cg:
-                        j = np.arange(segment['t_start'], segment['t_break'] + 1, 1)
-                        # 使用 trimodal 布尔值判断系数数量
-                        if trimodal:  # 8 coefficients
-                            plot_df = pd.DataFrame(
-                                {
-                                'dates': j,
-                                'trend': j * segment['coefs'][band_index][1] / slope_scale + segment['coefs'][band_index][0],
-                                'annual': np.cos(w * j) * segment['coefs'][band_index][2] + np.sin(w * j) * segment['coefs'][band_index][3],
-                                'semiannual': np.cos(2 * w * j) * segment['coefs'][band_index][4] + np.sin(2 * w * j) * segment['coefs'][band_index][5],
-                                'trimodal': np.cos(3 * w * j) * segment['coefs'][band_index][6] + np.sin(3 * w * j) * segment['coefs'][band_index][7]
-                            })
-                        else:  # 6 coefficients
-                            plot_df = pd.DataFrame(
-                                {
-                                'dates': j,
-                                'trend': j * segment['coefs'][band_index][1] / slope_scale + segment['coefs'][band_index][0],
-                                'annual': np.cos(w * j) * segment['coefs'][band_index][2] + np.sin(w * j) * segment['coefs'][band_index][3],
-                                'semiannual': np.cos(2 * w * j) * segment['coefs'][band_index][4] + np.sin(2 * w * j) * segment['coefs'][band_index][5],
-                                'trimodal': j * 0
-                            })
-                            
-                        plot_df['predicted'] = (
-                            plot_df['trend'] + 
-                            plot_df['annual'] + 
-                            plot_df['semiannual'] +
-                            plot_df['trimodal']
-                        )
-
-                        # Convert dates and plot model fit
-                        calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in plot_df["dates"]]
-                        plot_df.loc[:, 'dates_formal'] = calendar_dates
-                        g = sns.lineplot(
-                            x="dates_formal", y="predicted",
-                            data=plot_df,
-                            label="Model fit",
-                            ax=axe,
-                            color=default_plot_kwargs['line_color']
-                        )
-                        if g.legend_ is not None: 
-                            g.legend_.remove()
-
-                    # Plot near-real-time projection for SCCD if available
-                    if hasattr(sccd_result, 'nrt_mode') and (sccd_result.nrt_mode %10 == 1 or sccd_result.nrt_mode == 3 or sccd_result.nrt_mode %10 == 5):
-                        recent_obs = sccd_result.nrt_model['obs_date_since1982'][sccd_result.nrt_model['obs_date_since1982']>0]
-                        j = np.arange(
-                            sccd_result.nrt_model['t_start_since1982'].item() + defaults['COMMON']['JULIAN_LANDSAT4_LAUNCH'], 
-                            recent_obs[-1].item()+ defaults['COMMON']['JULIAN_LANDSAT4_LAUNCH']+1, 
-                            1
-                        )
-
-                        # 使用 trimodal 布尔值判断系数数量
-                        if trimodal:  # 8 coefficients
-                            plot_df = pd.DataFrame(
-                                {
-                                'dates': j,
-                                'trend': j * sccd_result.nrt_model['nrt_coefs'][band_index][1] / slope_scale + sccd_result.nrt_model['nrt_coefs'][band_index][0],
-                                'annual': np.cos(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][2] + np.sin(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][3],
-                                'semiannual': np.cos(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][4] + np.sin(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][5],
-                                'trimodal': np.cos(3 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][6] + np.sin(3 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][7]
-                            })
-                        else:  # 6 coefficients
-                            plot_df = pd.DataFrame(
-                                {
-                                'dates': j,
-                                'trend': j * sccd_result.nrt_model['nrt_coefs'][band_index][1] / slope_scale + sccd_result.nrt_model['nrt_coefs'][band_index][0],
-                                'annual': np.cos(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][2] + np.sin(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][3],
-                                'semiannual': np.cos(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][4] + np.sin(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][5],
-                                'trimodal': j * 0
-                            })
-                            
-                        plot_df['predicted'] = plot_df['trend'] + plot_df['annual'] + plot_df['semiannual'] + plot_df['trimodal']
-                        calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in plot_df["dates"]]
-                        plot_df.loc[:, 'dates_formal'] = calendar_dates
-                        g = sns.lineplot(
-                            x="dates_formal", y="predicted",
-                            data=plot_df,
-                            label="Model fit",
-                            ax=axe,
-                            color=default_plot_kwargs['line_color']
-                        )
-                        if g.legend_ is not None: 
-                            g.legend_.remove()
-                                    
-                # add manual legends
-                if anomaly is not None:
-                    legend_elements = [Line2D([0], [0], label=f'{band_names[indicator_band_index]} decrease break', color='k'),
-                                        Line2D([0], [0], label=f'{band_names[indicator_band_index]} increase break', color='r'),
-                                        Line2D([0], [0], marker='o', color="#EAEAF2",
-                                        markerfacecolor="#EAEAF2", markeredgecolor="black",
-                                        label=f'{band_names[indicator_band_index]} decrease anomalies', lw=0, markersize=8),
-                                        Line2D([0], [0], marker='o', color="#EAEAF2",
-                                        markerfacecolor="#EAEAF2", markeredgecolor="red",
-                                        label=f'{band_names[indicator_band_index]} increase anomalies', lw=0, markersize=8)]
-                else:
-                    legend_elements = [Line2D([0], [0], label=f'{band_names[indicator_band_index]} decrease break', color='k'),
-                                    Line2D([0], [0], label=f'{band_names[indicator_band_index]} increase break', color='r')]
-                axe.legend(handles=legend_elements, loc='upper left', prop={'size': 9})
-                
-                # plot breaks
-                for i in range(len(sccd_result.rec_cg)):
-                    if sccd_result.rec_cg[i]['magnitude'][indicator_band_index] < 0:    
-                        axe.axvline(pd.Timestamp.fromordinal(sccd_result.rec_cg[i]['t_break']), color='k')
-                    else:
-                        axe.axvline(pd.Timestamp.fromordinal(sccd_result.rec_cg[i]['t_break']), color='r')
-                
-                # plot anomalies if available
-                if anomaly is not None:
-                    # 使用 trimodal 布尔值判断系数数量
-                    n_coefs = 8 if trimodal else 6
-                    
-                    for i in range(len(anomaly.rec_cg_anomaly)):
-                        pred_ref = np.asarray(
-                                [
-                                    predict_ref(
-                                        anomaly.rec_cg_anomaly[i]["coefs"][0],
-                                        anomaly.rec_cg_anomaly[i]["obs_date_since1982"][i_conse].item()
-                                        + defaults['COMMON']['JULIAN_LANDSAT4_LAUNCH'], num_coefficients=n_coefs
-                                    ) for i_conse in range(3)
-                                ]
-                        )
-
-                        cm = anomaly.rec_cg_anomaly[i]["obs"][0, 0: 3] - pred_ref
-                        
-                        if np.median(cm) > 0:
-                            yc = data[data[:,0] == anomaly.rec_cg_anomaly[i]['t_break']][0][1]
-                            axe.plot(pd.Timestamp.fromordinal(anomaly.rec_cg_anomaly[i]['t_break']), yc,'ro',fillstyle='none',markersize=8)         
-                        else:
-                            yc = data[data[:,0] == anomaly.rec_cg_anomaly[i]['t_break']][0][1]
-                            axe.plot(pd.Timestamp.fromordinal(anomaly.rec_cg_anomaly[i]['t_break']), yc,'ko',fillstyle='none',markersize=8) 
-                
-                axe.set_ylabel(f"{band_name} * 10000", fontsize=default_plot_kwargs['font_size'])
+                    output = make_picklable(output)
+            self.put(key, output)
+        return key, output
+    
+    def clear(self):
+        """清空内存中的结果（store中保存的结果不受影响）"""
+        self._items.clear()
+        self._sizes.clear()
+
+
+# 模块级检测结果缓存：GUI进程中保存已完成任务的结果，工作进程中在多次任务间复用。
+# GUI和命令行进程在启动时连接ResultStore（GUI进程的磁盘写入在后台线程中进行），工作进程只使用内存
+DETECTION_CACHE = DetectionCache()
+
+
+# S-CCD的调用方式及其提供的输出。三种方式得到的rec_cg完全相同，
+# 但pyxccd不能在一次调用中同时输出anomaly和states
+SCCD_VARIANTS = {
+    'breaks': ({}, ('sccd_result',)),
+    'anomaly': ({'output_anomaly': True}, ('sccd_result', 'anomaly')),
+    'states': ({'state_intervaldays': 1}, ('sccd_result', 'states')),
+}
+
+DetectionStep = namedtuple("DetectionStep", "label method options outputs key cached")
+
+
+def required_outputs(params):
+    """返回当前视图需要的检测输出（结果字典中的键）"""
+    if params['method'] == 'COLD':
+        return {'cold_result'}
+    needed = {'sccd_result'}
+    if params['output'] == 'anomaly':
+        needed.add('anomaly')
+    if params['output'] == 'state_components' or params['fitting_curve'] == 'States':
+        needed.add('states')
+    return needed
+
+
+def detection_options(params):
+    """由GUI参数得到检测函数的关键字参数（不含anomaly/states等额外输出）"""
+    options = {'lam': float(params['Lam']), 'p_cg': float(params['P_CG']), 'conse': int(params['CONSE'])}
+    if params['method'] == 'S-CCD':
+        options.update(fitting_coefs=params['fitting_curve'] == 'Lasso', trimodal=params['trimodal'])
+    return options
+
+
+def plan_detection(params, inputs, cache=None):
+    """
+    执行计划：根据视图需要的输出，确定最少的检测调用（DetectionStep列表）。
+
+    anomaly和states各自只能由对应的调用方式得到；仅需要rec_cg时复用任意已缓存的调用，
+    没有缓存时使用不带额外输出的调用。只有同时需要anomaly和states时才会有两次
+    sccd_detect_flex调用，其中已缓存的一次直接取自缓存。
+    对比模式（params['compare']）依次包含COLD和S-CCD两部分的计划。
+    所有候选调用的缓存状态一次查询（cache.cached_keys），设置了ResultStore时每个计划只查询一次索引。
+    """
+    cache = DETECTION_CACHE if cache is None else cache
+    parts = comparison_params(params) if params.get('compare') else (params,)
+    candidates = [detection_candidates(part, inputs) for part in parts]
+    cached = cache.cached_keys([step.key for steps in candidates for step in steps])
+    plan = []
+    for part, steps in zip(parts, candidates):
+        steps = [step._replace(cached=step.key in cached) for step in steps]
+        if part['method'] == 'COLD':
+            plan += steps
+            continue
+        extras = required_outputs(part) - {'sccd_result'}
+        plan += [step for step in steps if extras.intersection(step.outputs)] or [step for step in steps if step.cached][:1] or steps[:1]
+    return plan
+
+
+def detection_candidates(params, inputs):
+    """当前方法所有可能的检测调用（DetectionStep，cached由plan_detection填写）"""
+    dates, merge, qa = inputs['dates'], inputs['merge'], inputs['qa']
+    core = detection_options(params)
+    if params['method'] == 'COLD':
+        return [DetectionStep('COLD', 'COLD', core, ('cold_result',), detection_key('COLD', dates, merge, qa, **core), False)]
+    candidates = []
+    for label, (extra, outputs) in SCCD_VARIANTS.items():
+        options = dict(core, **extra)
+        key = detection_key('S-CCD', dates, merge, qa, **options)
+        candidates.append(DetectionStep(f"S-CCD ({label})", 'S-CCD', options, outputs, key, False))
+    return candidates
+
+
+def comparison_params(params):
+    """对比模式中COLD和S-CCD各自的参数（S-CCD按断点视图检测，曲线方式沿用当前选项）"""
+    return dict(params, method='COLD', output='breaks', compare=False), dict(params, method='S-CCD', output='breaks', compare=False)
+
+
+def match_breaks(cold_breaks, sccd_breaks, tolerance=90):
+    """
+    按日期差从小到大配对COLD和S-CCD的断点，日期差不超过tolerance天的视为同一变化。
+    返回按日期排序的[(COLD断点, S-CCD断点, 日期差)]，未配对断点的另一侧和日期差为None。
+    """
+    cold_breaks = [int(day) for day in cold_breaks]
+    sccd_breaks = [int(day) for day in sccd_breaks]
+    pairs = sorted(
+        (abs(sccd_day - cold_day), i, j)
+        for i, cold_day in enumerate(cold_breaks) for j, sccd_day in enumerate(sccd_breaks)
+        if abs(sccd_day - cold_day) <= tolerance
+    )
+    used_cold, used_sccd, matches = set(), set(), []
+    for _, i, j in pairs:
+        if i not in used_cold and j not in used_sccd:
+            used_cold.add(i)
+            used_sccd.add(j)
+            matches.append((cold_breaks[i], sccd_breaks[j], sccd_breaks[j] - cold_breaks[i]))
+    matches += [(day, None, None) for i, day in enumerate(cold_breaks) if i not in used_cold]
+    matches += [(None, day, None) for j, day in enumerate(sccd_breaks) if j not in used_sccd]
+    return sorted(matches, key=lambda match: match[0] if match[0] is not None else match[1])
+
+
+# 对比模式中并行执行COLD和S-CCD的常驻进程池，在所在进程中首次需要时创建
+# （不能在daemon的JobExecutor工作进程中创建，GUI中由主进程持有）
+_COMPARISON_POOL = None
+
+
+def comparison_pool():
+    """返回（必要时创建）对比模式使用的两进程进程池"""
+    global _COMPARISON_POOL
+    if _COMPARISON_POOL is None:
+        _COMPARISON_POOL = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn'))
+    return _COMPARISON_POOL
+
+
+def reset_comparison_pool():
+    """丢弃对比模式的进程池（进程池失效后或退出前调用）"""
+    global _COMPARISON_POOL
+    if _COMPARISON_POOL is not None:
+        _COMPARISON_POOL.shutdown(wait=False, cancel_futures=True)
+    _COMPARISON_POOL = None
+
+
+def _detect_step(method, options, dates, merge, qa):
+    """进程池任务：执行一次检测调用，返回(缓存键, 输出, 秒)"""
+    start = time.perf_counter()
+    key, output = DetectionCache().detect(method, dates, merge, qa, **options)
+    return key, output, time.perf_counter() - start
+
+
+def submit_uncached(pool, plan, inputs):
+    """
+    把计划中未缓存的检测调用全部提交到进程池，返回[(步骤, Future)]。
+    pyxccd执行期间不释放GIL，COLD和S-CCD只有在不同进程中才能真正并行。
+    """
+    dates, merge, qa = inputs['dates'], inputs['merge'], inputs['qa']
+    return [
+        (step, pool.submit(_detect_step, step.method, step.options, dates, merge, qa))
+        for step in plan if not step.cached
+    ]
+
+
+def collect_detections(submitted, cache):
+    """等待submit_uncached提交的调用完成并放入cache，返回{缓存键: 秒}"""
+    durations = {}
+    for step, future in submitted:
+        try:
+            key, output, seconds = future.result()
+        except BrokenProcessPool:
+            # 例如观测过少时pyxccd直接崩溃；进程池随之失效，下次使用时重新创建
+            reset_comparison_pool()
+            raise RuntimeError(f"{step.label} detection crashed (the time series may be too short)")
+        cache.put(key, output)
+        durations[key] = seconds
+    return durations
+
+
+def format_timings(timings):
+    """将detect_change返回的各步耗时整理为一行摘要"""
+    parts = [f"{label} {'cached' if cached else f'{seconds:.3f} s'}" for label, seconds, cached in timings]
+    n_cached = sum(cached for _, _, cached in timings)
+    total = sum(seconds for _, seconds, _ in timings)
+    return f"{len(timings)} detection call(s), {n_cached} from cache, {total:.3f} s: " + ", ".join(parts)
+
+
+class StageProfiler:
+    """
+    分阶段性能记录器。
+
+    stage(name)记录每个阶段的墙钟时间（perf_counter）、CPU时间（process_time），
+    trace_memory为True时还记录tracemalloc测得的阶段内峰值内存（相对阶段开始时的增量）。
+    阶段可以嵌套（depth为嵌套层数），进入内层阶段重置tracemalloc峰值前先把外层的
+    峰值保存下来，因此外层阶段的峰值仍然包含内层阶段。tracemalloc会明显拖慢
+    内存分配密集的代码，只在需要时开启。
+    """
+    
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.records = []
+        self._depth = 0
+        # 正在进行的阶段的内存记录：[开始时的已分配内存, 目前为止的峰值]
+        self._stack = []
+        self._started_tracing = False
+    
+    @contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            self._stack.append([current, current])
+        record = {'stage': name, 'depth': self._depth}
+        self.records.append(record)
+        self._depth += 1
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            self._depth -= 1
+            record['wall'] = time.perf_counter() - wall
+            record['cpu'] = time.process_time() - cpu
+            record['peak_bytes'] = None
+            if self.trace_memory:
+                frame = self._stack.pop()
+                frame[1] = max(frame[1], tracemalloc.get_traced_memory()[1])
+                record['peak_bytes'] = frame[1] - frame[0]
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], frame[1])
+    
+    def stop(self):
+        """停止由本记录器启动的tracemalloc"""
+        if self._started_tracing and not self._stack:
+            tracemalloc.stop()
+            self._started_tracing = False
 
-                # Handle tick params with type safety
-                tick_font_size = default_plot_kwargs['font_size']
-                if isinstance(tick_font_size, (int, float)):
-                    axe.tick_params(axis='x', labelsize=int(tick_font_size)-1)
-                else:
-                    axe.tick_params(axis='x', labelsize=13)  # fallback
 
-                axe.set(ylim=(ylim_low, ylim_high))
-                axe.set_xlabel("", fontsize=6)
+# 当前线程正在使用的性能记录器；为None时profile_stage不做任何事。
+# 只在GUI主线程、命令行和工作进程的detect_change中设置
+ACTIVE_PROFILER = None
 
-                # Format spines
-                for spine in axe.spines.values():
-                    spine.set_edgecolor('black')
-                title_font_size = int(font_size) + 2 if isinstance(font_size, (int, float)) else 16
-                axe.set_title(title, fontweight="bold", size=title_font_size, pad=2)
-                
-            
-            def display_cold_result(
-                data: np.ndarray,
-                band_names: List[str],
-                band_index: int,
-                indicator_band_index: int,
-                cold_result: cold_rec_cg,
-                axe: Axes,
-                title: str = 'COLD',
-                plot_kwargs: Optional[Dict] = None
-            ) -> Tuple[plt.Figure, List[plt.Axes]]:
-                """
-                Compare COLD and SCCD change detection algorithms by plotting their results side by side.
-                
-                This function takes time series remote sensing data, applies both COLD algorithms,
-                and visualizes the curve fitting and break detection results. 
-                
-                Parameters:
-                -----------
-                data : np.ndarray
-                    Input data array with shape (n_observations, n_bands + 2) where:
-                    - First column: ordinal dates (days since January 1, AD 1)
-                    - Next n_bands columns: spectral band values
-                    - Last column: QA flags (0-clear, 1-water, 2-shadow, 3-snow, 4-cloud)
-                    
-                band_names : List[str]
-                    List of band names corresponding to the spectral bands in the data (e.g., ['red', 'nir'])
-                    
-                band_index : int
-                    1-based index of the band to plot (e.g., 0 for first band, 1 for second band)
-                
-                axe: Axes
-                    An Axes object represents a single plot within that Figure
-                
-                title: Str
-                    The figure title. The default is "COLD"
-                    
-                plot_kwargs : Dict, optional
-                    Additional keyword arguments to pass to the display function. Possible keys:
-                    - 'marker_size': size of observation markers (default: 5)
-                    - 'marker_alpha': transparency of markers (default: 0.7)
-                    - 'line_color': color of model fit lines (default: 'orange')
-                    - 'font_size': base font size (default: 14)
-                    
-                Returns:
-                --------
-                Tuple[plt.Figure, List[plt.Axes]]
-                    A tuple containing the matplotlib Figure object and a list of Axes objects
-                    (top axis is COLD results, bottom axis is SCCD results)
-                
-                """
-                w = np.pi * 2 / 365.25
-
-                # Set default plot parameters
-                default_plot_kwargs: Dict[str, Union[int, float, str]] = {
-                    'marker_size': 5,
-                    'marker_alpha': 0.7,
-                    'line_color': 'orange',
-                    'font_size': 14
-                }
-                if plot_kwargs is not None:
-                    default_plot_kwargs.update(plot_kwargs)
-
-                # Extract values with proper type casting
-                font_size = default_plot_kwargs.get('font_size', 14)
-                try:
-                    title_font_size = int(font_size) + 2
-                except (TypeError, ValueError):
-                    title_font_size = 16 
 
+def profile_stage(name):
+    """在当前性能记录器中记录一个阶段（未启用性能记录时为空操作）"""
+    return nullcontext() if ACTIVE_PROFILER is None else ACTIVE_PROFILER.stage(name)
 
-                # Clean and prepare data
-                data = data[np.all(np.isfinite(data), axis=1)]
-                data_df = pd.DataFrame(data, columns=['dates'] + band_names + ['qa'])
 
-                # Plot COLD results
-                w = np.pi * 2 / 365.25
-                slope_scale = 10000
+@contextmanager
+def profiling(profiler):
+    """在with块内把profiler设为当前性能记录器（profiler为None时不改变）"""
+    global ACTIVE_PROFILER
+    if profiler is None:
+        yield None
+        return
+    previous, ACTIVE_PROFILER = ACTIVE_PROFILER, profiler
+    try:
+        yield profiler
+    finally:
+        ACTIVE_PROFILER = previous
+        profiler.stop()
+
+
+def prepare_inputs(params, data):
+    """
+    从DataFrame中整理出检测输入及数据警告。
+
+    返回的'series'为PreparedSeries，'dates'、'merge'和'qa'就是其中的数组，
+    检测调用和显示函数共用同一份数据。
+    """
+    # split the array by the column
+    with profile_stage("date check"):
+        dates = check_and_convert_dates(data[params['date_column']].values)
+    
+    warnings = []
+    if not all(np.issubdtype(data[col].dtype, np.integer) for col in data.select_dtypes(include=[np.number]).columns):
+        warnings.append("The data contains non-integer type numeric columns")
+    
+    with profile_stage("band stacking"):
+        merge = np.stack([data[b].values for b in params['selected_bands']], axis=1)
+        if params['qa_column'] is not None:
+            qa = data[params['qa_column']].values
+        else:
+            # 创建一个与 dates 长度相同的全零数组
+            qa = np.zeros_like(dates, dtype=int)
+        series = PreparedSeries(dates, merge, qa, params['selected_bands'])
+    
+    return {'series': series, 'dates': series.dates, 'merge': series.merge, 'qa': series.qa, 'warnings': warnings}
+
+
+def is_detection_cached(params, inputs, cache=None):
+    """判断当前视图所需的检测结果是否已全部缓存"""
+    return all(step.cached for step in plan_detection(params, inputs, cache))
+
+
+def detect_change(params, data=None, report=None, inputs=None, cache=None, pool=None, durations=None):
+    """
+    读取输入数据并执行COLD/S-CCD变化检测。
+
+    该函数不调用任何Tk接口，可以在后台工作进程中运行；绘图由plot_change_detection
+    在GUI主线程中完成。data为已读取的DataFrame（为None时通过DATASET_CACHE读取），
+    inputs为prepare_inputs的结果（已准备好时可跳过日期检查），
+    report(percent, message)用于汇报进度，检测调用经过cache（默认DETECTION_CACHE）。
+    检测调用由plan_detection规划，同一输入只在必要时调用多次。
+    返回包含dates/merge/qa、检测结果、本次用到的缓存项（'detections'）以及
+    各步耗时（'timings'，[(步骤, 秒, 是否来自缓存)]）的字典。
+    params['profile']为真且调用方没有设置性能记录器时（例如在工作进程中），
+    各阶段的性能记录放在'profile'中（params['trace_memory']控制是否记录峰值内存）。
+    给出pool（例如comparison_pool()）时，未缓存的检测调用在其中并行执行；
+    durations（{缓存键: 秒}）为调用方已经并行执行并放入cache的调用的实际耗时。
+    对比模式（params['compare']）的结果同时包含'cold_result'和'sccd_result'，
+    以及按params['match_tolerance']天配对的断点（'matches'）。
+    """
+    if report is None:
+        report = lambda percent, message: None
+    cache = DETECTION_CACHE if cache is None else cache
+    profiler = None
+    if params.get('profile') and ACTIVE_PROFILER is None:
+        profiler = StageProfiler(trace_memory=params.get('trace_memory', False))
+    
+    with profiling(profiler):
+        if inputs is None:
+            report(5, "Reading input file")
+            if data is None:
+                with profile_stage("read"):
+                    data = DATASET_CACHE.load(params['input_file'], input_columns(params), compact=True)
+            report(20, "Checking dates")
+            inputs = prepare_inputs(params, data)
+        result = dict(inputs)
+        dates, merge, qa = result['dates'], result['merge'], result['qa']
+        
+        params['fitting_coefficients'] = True if params['fitting_curve'] == 'Lasso' else False
+        plan = plan_detection(params, inputs, cache)
+        detections = {}
+        timings = []
+        if pool is not None:
+            # 未缓存的调用同时提交到进程池并行执行，完成后放入cache，下面按计划从缓存取出
+            report(40, "Running " + ", ".join(step.label for step in plan if not step.cached))
+            with profile_stage("concurrent detection"):
+                durations = collect_detections(submit_uncached(pool, plan, inputs), cache)
+        durations = durations or {}
+        for i, step in enumerate(plan):
+            report(40 + 50 * i // len(plan), f"Running {step.label}")
+            # 阶段以实际调用的检测函数命名，例如"sccd_detect_flex (states)"
+            # 已在进程池中并行执行的调用记录其实际耗时，不算作缓存命中
+            stage = step.label.replace('S-CCD', 'sccd_detect_flex').replace('COLD', 'cold_detect_flex')
+            parallel = step.key in durations
+            with profile_stage(stage + (" [parallel]" if parallel else " [cached]" if step.cached else "")):
+                start = time.perf_counter()
+                key, output = cache.detect(step.method, dates, merge, qa, **step.options)
+                if parallel:
+                    timings.append((step.label, durations[key], False))
+                else:
+                    timings.append((step.label, time.perf_counter() - start, step.cached))
+            detections[key] = output
+            result.update(zip(step.outputs, output if len(step.outputs) > 1 else (output,)))
+    if params.get('compare'):
+        cold_params, sccd_params = comparison_params(params)
+        result['matches'] = match_breaks(
+            confirmed_breaks(cold_params, result), confirmed_breaks(sccd_params, result),
+            params.get('match_tolerance', 90)
+        )
+    result['detections'] = detections
+    result['timings'] = timings
+    if profiler is not None:
+        result['profile'] = profiler.records
+    
+    report(100, "Detection finished")
+    return result
+
+
+# 近实时监测状态文件的后缀（data.csv -> data.csv.sccd_state.npz）
+NRT_STATE_SUFFIX = '.sccd_state.npz'
+# 栅格堆栈像元的近实时状态默认保存在这里（与结果存储相邻），场景目录保持只读
+NRT_STATE_DIR = os.path.join(os.path.expanduser('~'), '.pyxccd_gui', 'nrt_states')
+
+
+def nrt_state_path(in_path, pixel=None, state_dir=None):
+    """
+    保存S-CCD近实时状态的文件路径。表格输入默认在输入文件旁边（state_dir给出时在该目录中）；
+    栅格堆栈的每个像元(行, 列)各有一个状态文件，放在state_dir（默认NRT_STATE_DIR）中，
+    文件名包含场景目录名及其绝对路径的散列，不同堆栈的同一像元互不覆盖
+    """
+    if pixel is None:
+        if state_dir is None:
+            return in_path + NRT_STATE_SUFFIX
+        return os.path.join(state_dir, os.path.basename(in_path) + NRT_STATE_SUFFIX)
+    directory = os.path.abspath(in_path)
+    digest = hashlib.sha1(directory.encode('utf-8')).hexdigest()[:12]
+    name = f"{os.path.basename(directory)}-{digest}_pixel_{pixel[0]}_{pixel[1]}{NRT_STATE_SUFFIX}"
+    return os.path.join(NRT_STATE_DIR if state_dir is None else state_dir, name)
+
+
+def nrt_settings(params):
+    """保存的状态所对应的列和检测参数；与当前参数不同时状态不能继续更新"""
+    return {
+        'date_column': params['date_column'],
+        'qa_column': params['qa_column'],
+        'selected_bands': list(params['selected_bands']),
+        'options': detection_options(dict(params, method='S-CCD')),
+    }
 
-                # Prepare clean data for COLD plot
-                data_clean = data_df[(data_df['qa'] == 0) | (data_df['qa'] == 1)].copy()
-                data_clean =  data_clean[(data_clean >= 0).all(axis=1) & (data_clean.drop(columns="dates") <= 10000).all(axis=1)]
-                calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in data_clean["dates"]]
-                data_clean.loc[:, 'dates_formal'] = calendar_dates
-                
-                # Calculate y-axis limits
-                band_name = band_names[band_index]
-                band_values = data_clean[data_clean['qa'] == 0][band_name]
-                q01, q99 = np.quantile(band_values, [0.01, 0.99])
-                extra = (q99 - q01) * 0.4
-                ylim_low = q01 - extra
-                ylim_high = q99 + extra
-
-                # Plot COLD observations
-                axe.plot(
-                    'dates_formal', band_name, 'go',
-                    markersize=default_plot_kwargs['marker_size'],
-                    alpha=default_plot_kwargs['marker_alpha'],
-                    data=data_clean
-                )
 
-                # Plot COLD segments
-                for segment in cold_result:
-                    j = np.arange(segment['t_start'], segment['t_end'] + 1, 1)
-                    plot_df = pd.DataFrame({
-                        'dates': j,
-                        'trend': j * segment['coefs'][band_index][1] / slope_scale + segment['coefs'][band_index][0],
-                        'annual': np.cos(w * j) * segment['coefs'][band_index][2] + np.sin(w * j) * segment['coefs'][band_index][3],
-                        'semiannual': np.cos(2 * w * j) * segment['coefs'][band_index][4] + np.sin(2 * w * j) * segment['coefs'][band_index][5],
-                        'trimodel': np.cos(3 * w * j) * segment['coefs'][band_index][6] + np.sin(3 * w * j) * segment['coefs'][band_index ][7]
-                    })
-                    plot_df['predicted'] = (
-                        plot_df['trend'] + 
-                        plot_df['annual'] + 
-                        plot_df['semiannual'] + 
-                        plot_df['trimodel']
-                    )
+def save_sccd_state(path, output, meta):
+    """将SccdOutput的各字段和元数据（JSON字符串）写入NPZ文件（必要时创建目录）；先写临时文件再替换，中断时不会损坏原有状态"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f, position=output.position, rec_cg=output.rec_cg, min_rmse=output.min_rmse,
+            nrt_mode=output.nrt_mode, nrt_model=output.nrt_model, nrt_queue=output.nrt_queue,
+            meta=json.dumps(meta)
+        )
+    os.replace(tmp_path, path)
 
-                    # Convert dates and plot model fit
-                    calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in plot_df["dates"]]
-                    plot_df.loc[:, 'dates_formal'] = calendar_dates
-                    g = sns.lineplot(
-                        x="dates_formal", y="predicted",
-                        data=plot_df,
-                        label="Model fit",
-                        ax=axe,
-                        color=default_plot_kwargs['line_color']
-                    )
-                    if g.legend_ is not None: 
-                        g.legend_.remove()
 
-                # add manual legends
-                legend_elements = [Line2D([0], [0], label=f'{band_names[indicator_band_index]} decrease break', color='k'),
-                                Line2D([0], [0], label=f'{band_names[indicator_band_index]} increase break', color='r')]
-                axe.legend(handles=legend_elements, loc='upper left', prop={'size': 9})
-                
-                # plot breaks
-                for i in range(len(cold_result)):
-                    if  cold_result[i]['change_prob'] == 100:
-                        if cold_result[i]['magnitude'][indicator_band_index] < 0:
-                            axe.axvline(pd.Timestamp.fromordinal(cold_result[i]['t_break']), color='k')
-                        else:
-                            axe.axvline(pd.Timestamp.fromordinal(cold_result[i]['t_break']), color='r')
-                
-                axe.set_ylabel(f"{band_name} * 10000", fontsize=default_plot_kwargs['font_size'])
+def load_sccd_state(path):
+    """读取save_sccd_state保存的状态，返回(SccdOutput, 元数据)；文件不存在或无法读取时返回None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as archive:
+            nrt_model = archive['nrt_model']
+            output = SccdOutput(
+                int(archive['position']), archive['rec_cg'], archive['min_rmse'][()], int(archive['nrt_mode']),
+                nrt_model[()] if nrt_model.ndim == 0 else nrt_model, archive['nrt_queue']
+            )
+            return output, json.loads(archive['meta'].item())
+    except (OSError, ValueError, KeyError):
+        return None
 
-                # Handle tick params with type safety
-                tick_font_size = default_plot_kwargs['font_size']
-                if isinstance(tick_font_size, (int, float)):
-                    axe.tick_params(axis='x', labelsize=int(tick_font_size)-1)
-                else:
-                    axe.tick_params(axis='x', labelsize=13)  # fallback
 
-                axe.set(ylim=(ylim_low, ylim_high))
-                axe.set_xlabel("", fontsize=6)
+def update_nrt_state(params, inputs, state_path=None, cache=None, report=None):
+    """
+    近实时监测的增量更新：读取保存的S-CCD状态，只把日期晚于上次处理日期的观测传给
+    sccd_update_flex，检测耗时只与新观测的数量有关。没有状态、状态无法读取或列/检测参数
+    与保存时不同，则用sccd_detect_flex对整个序列建立状态（经过cache，默认DETECTION_CACHE）。
+    早于上次处理日期的新行（补录的历史观测）不会进入状态，需要删除状态文件后重新建立。
+    更新后的状态写回state_path（默认nrt_state_path(输入文件, 像元)）。与detect_change一样不调用
+    Tk接口，GUI在后台工作进程中运行，report(percent, message)用于汇报进度。
+    返回与detect_change相同形式的结果字典（建立状态时的检测结果在'detections'中），
+    另含'previous'（更新前的状态，重新建立时为None）、'since'和'last_date'（更新前后的最后处理日期）、
+    'new_rows'（本次处理的观测在series中的行号）和'state_path'。
+    """
+    if report is None:
+        report = lambda percent, message: None
+    state_path = nrt_state_path(params['input_file'], params.get('pixel')) if state_path is None else state_path
+    cache = DETECTION_CACHE if cache is None else cache
+    series = inputs['series']
+    settings = nrt_settings(params)
+    options = settings['options']
+    report(5, "Reading the saved state")
+    saved = load_sccd_state(state_path)
+    previous, since = None, None
+    if saved is not None and saved[1].get('settings') == settings:
+        previous, since = saved[0], saved[1]['last_date']
+    
+    detections = {}
+    start = time.perf_counter()
+    if previous is None:
+        report(20, "Building the initial state with sccd_detect_flex")
+        new_rows = np.arange(len(series.dates))
+        cached = detection_key('S-CCD', series.dates, series.merge, series.qa, **options) in cache
+        key, output = cache.detect('S-CCD', series.dates, series.merge, series.qa, **options)
+        detections[key] = output
+        timing = ("sccd_detect_flex (initial state)", time.perf_counter() - start, cached)
+    else:
+        new_rows = np.flatnonzero(series.dates > since)
+        new_rows = new_rows[np.argsort(series.dates[new_rows], kind='stable')]
+        output = previous
+        report(20, f"Updating the state with {len(new_rows)} new observation(s)")
+        if len(new_rows):
+            # pyxccd的更新接口没有fitting_coefs选项，其余参数与建立状态时相同
+            update_options = {key: value for key, value in options.items() if key != 'fitting_coefs'}
+            output = make_picklable(sccd_update_flex(
+                previous, series.dates[new_rows], series.merge[new_rows], series.qa[new_rows], **update_options
+            ))
+        timing = (f"sccd_update_flex ({len(new_rows)} new)", time.perf_counter() - start, False)
+    
+    last_date = int(series.dates[new_rows].max()) if len(new_rows) else (since or 0)
+    if previous is None or len(new_rows):
+        report(90, "Saving the state")
+        save_sccd_state(state_path, output, {'settings': settings, 'last_date': last_date})
+    report(100, "Update finished")
+    return {
+        'series': series, 'dates': series.dates, 'merge': series.merge, 'qa': series.qa,
+        'sccd_result': output, 'previous': previous, 'since': since, 'last_date': last_date, 'new_rows': new_rows,
+        'state_path': state_path, 'detections': detections, 'timings': [timing], 'warnings': inputs['warnings'],
+    }
 
-                # Format spines
-                for spine in axe.spines.values():
-                    spine.set_edgecolor('black')
-                title_font_size = int(font_size) + 2 if isinstance(font_size, (int, float)) else 16
-                axe.set_title(title, fontweight="bold", size=title_font_size, pad=2)
-            
-            def display_sccd_result(
-                data: np.ndarray,
-                band_names: List[str],
-                band_index: int,
-                indicator_band_index: int,
-                sccd_result: SccdOutput,
-                axe: Axes,
-                title: str = 'S-CCD',
-                states: Optional[pd.DataFrame] = None,
-                plot_kwargs: Optional[Dict] = None
-            ) -> Tuple[plt.Figure, List[plt.Axes]]:
-                """
-                Compare COLD and SCCD change detection algorithms by plotting their results side by side.
-                
-                This function takes time series remote sensing data, applies both COLD and SCCD algorithms,
-                and visualizes the curve fitting and break detection results for comparison. 
-                
-                Parameters:
-                -----------
-                data : np.ndarray
-                    Input data array with shape (n_observations, n_bands + 2) where:
-                    - First column: ordinal dates (days since January 1, AD 1)
-                    - Next n_bands columns: spectral band values
-                    - Last column: QA flags (0-clear, 1-water, 2-shadow, 3-snow, 4-cloud)
-                    
-                band_names : List[str]
-                    List of band names corresponding to the spectral bands in the data (e.g., ['red', 'nir'])
-                    
-                band_index : int
-                    1-based index of the band to plot (e.g., 0 for first band, 1 for second band)
-                    
-                indicator_band_index : int
-                    The band index used to determine break point colors (based on magnitude)
-                    
-                sccd_result: SccdOutput
-                    Output of sccd_detect
-                
-                axe: Axes
-                    An Axes object represents a single plot within that Figure
-                
-                title: Str
-                    The figure title. The default is "S-CCD"
-                    
-                states: pd.DataFrame, optional
-                    DataFrame containing model states for each time point (if provided, will use for fitting)
-                    
-                plot_kwargs : Dict, optional
-                    Additional keyword arguments to pass to the display function. Possible keys:
-                    - 'marker_size': size of observation markers (default: 5)
-                    - 'marker_alpha': transparency of markers (default: 0.7)
-                    - 'line_color': color of model fit lines (default: 'orange')
-                    - 'font_size': base font size (default: 14)
-                    
-                Returns:
-                --------
-                Tuple[plt.Figure, List[plt.Axes]]
-                    A tuple containing the matplotlib Figure object and a list of Axes objects
-                    (top axis is COLD results, bottom axis is SCCD results)
-                """
-                w = np.pi * 2 / 365.25
-
-                # Set default plot parameters
-                default_plot_kwargs: Dict[str, Union[int, float, str]] = {
-                    'marker_size': 5,
-                    'marker_alpha': 0.7,
-                    'line_color': 'orange',
-                    'font_size': 14
-                }
-                if plot_kwargs is not None:
-                    default_plot_kwargs.update(plot_kwargs)
-
-                # Extract values with proper type casting
-                font_size = default_plot_kwargs.get('font_size', 14)
-                try:
-                    title_font_size = int(font_size) + 2
-                except (TypeError, ValueError):
-                    title_font_size = 16 
-
-                # Clean and prepare data
-                data = data[np.all(np.isfinite(data), axis=1)]
-                data_df = pd.DataFrame(data, columns=['dates'] + band_names + ['qa'])
-
-                # Plot COLD results
-                w = np.pi * 2 / 365.25
-                slope_scale = 10000
-
-                # Prepare clean data for COLD plot
-                data_clean = data_df[(data_df['qa'] == 0) | (data_df['qa'] == 1)].copy()
-                data_clean = data_clean[(data_clean >= 0).all(axis=1) & (data_clean.drop(columns="dates") <= 10000).all(axis=1)]
-                calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in data_clean["dates"]]
-                data_clean.loc[:, 'dates_formal'] = calendar_dates
-                
-                # Calculate y-axis limits
-                band_name = band_names[band_index]
-                band_values = data_clean[data_clean['qa'] == 0 | (data_clean['qa'] == 1)][band_name]
-                q01, q99 = np.quantile(band_values, [0.01, 0.99])
-                extra = (q99 - q01) * 0.4
-                ylim_low = q01 - extra
-                ylim_high = q99 + extra
-
-                # Plot SCCD observations
-                axe.plot(
-                    'dates_formal', band_name, 'go',
-                    markersize=default_plot_kwargs['marker_size'],
-                    alpha=default_plot_kwargs['marker_alpha'],
-                    data=data_clean
-                )
 
-                # Plot SCCD segments - NEW: use states if provided
-                if states is not None:
-                    # Build column names based on band_index
-                    col_prefix = f"b{band_index}"
-                    trend_col = f"{col_prefix}_trend"
-                    annual_col = f"{col_prefix}_annual"
-                    semiannual_col = f"{col_prefix}_semiannual"
-                    trimodal_col = f"{col_prefix}_trimodal"
-                    
-                    # Check required columns exist
-                    required_cols = [trend_col, annual_col, semiannual_col]
-                    missing_cols = [col for col in required_cols if col not in states.columns]
-                    if missing_cols:
-                        raise ValueError(f"Missing required columns in states: {missing_cols}")
-                    
-                    # Convert dates
-                    states["dates_formal"] = [pd.Timestamp.fromordinal(int(row)) for row in states["dates"]]
-                    
-                    # Calculate combined prediction (General)
-                    has_trimodal = trimodal_col in states.columns
-                    if has_trimodal:
-                        states["General"] = states[trend_col] + states[annual_col] + states[semiannual_col] + states[trimodal_col]
-                    else:
-                        states["General"] = states[trend_col] + states[annual_col] + states[semiannual_col]
-                    
-                    # Plot fitted curve
-                    g = sns.lineplot(
-                        x="dates_formal", y="General",
-                        data=states,
-                        label="Model fit",
-                        ax=axe,
-                        color=default_plot_kwargs['line_color']
-                    )
-                    if g.legend_ is not None: 
-                        g.legend_.remove()
+def break_table(rec_cg, band_names, pixel_ids=None):
+    """
+    将rec_cg结构化数组展开为每个片段一行的表格：标量字段直接成列，
+    rmse/magnitude按波段展开为"字段_波段"，coefs展开为"coefs_波段_序号"。
+    没有断点时pyxccd返回的空数组不是结构化数组，得到空表格。
+    """
+    columns = {}
+    if pixel_ids is not None:
+        columns['pixel_id'] = pixel_ids
+    for name in rec_cg.dtype.names or ():
+        values = rec_cg[name]
+        if values.ndim == 1:
+            columns[name] = values
+        elif values.ndim == 2:
+            for i, band in enumerate(band_names):
+                columns[f"{name}_{band}"] = values[:, i]
+        else:
+            for i, band in enumerate(band_names):
+                for k in range(values.shape[2]):
+                    columns[f"{name}_{band}_{k}"] = values[:, i, k]
+    return pd.DataFrame(columns)
+
+
+def split_series(ids, dates):
+    """
+    长表按ID分组：一次排序（ID优先、组内按日期）后切分。
+    返回(排序索引, 各组ID, 各组在排序后数组中的起止位置)。
+    """
+    codes, unique_ids = pd.factorize(ids, sort=True)
+    order = np.lexsort((dates, codes))
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(codes[order])) + 1, [len(order)]))
+    return order, np.asarray(unique_ids), bounds
+
+
+def _detect_batch_chunk(method, options, band_names, pixel_ids, bounds, dates, merge, qa):
+    """进程池任务：对一组连续存放的像元逐个执行检测，返回(断点表, 失败的像元)"""
+    tables, pixels, failed = [], [], {}
+    for pixel_id, start, stop in zip(pixel_ids, bounds[:-1], bounds[1:]):
+        try:
+            if method == 'COLD':
+                rec_cg = cold_detect_flex(dates[start:stop], merge[start:stop], qa[start:stop], **options)
+            else:
+                rec_cg = sccd_detect_flex(dates[start:stop], merge[start:stop], qa[start:stop], **options).rec_cg
+        except Exception as e:
+            failed[str(pixel_id)] = f"{type(e).__name__}: {e}"
+            continue
+        # 无断点的S-CCD像元返回空的非结构化数组，不能与结构化记录拼接
+        if len(rec_cg) == 0 or rec_cg.dtype.names is None:
+            continue
+        tables.append(rec_cg)
+        pixels.append(np.full(len(rec_cg), pixel_id))
+    if not tables:
+        return None, failed
+    return break_table(np.concatenate(tables), band_names, np.concatenate(pixels)), failed
+
+
+BATCH_MANIFEST = "_batch.json"
+
+
+def run_batch(params, output_dir, data=None, id_column='pixel_id', chunk_size=500, workers=None, report=None, should_stop=None):
+    """
+    批处理模式：对长表中按id_column区分的每条像元时间序列执行COLD/S-CCD。
+
+    数据只排序切分一次，按chunk_size个像元一组提交到进程池；每组完成后立即将断点
+    记录（break_table）写为output_dir下的一个Parquet分片（part-XXXXXX.parquet），
+    并在BATCH_MANIFEST中记录已完成的分组，因此中断（包括should_stop()返回True）后
+    以相同参数再次运行会跳过已完成的分组。S-CCD只输出已确认断点的rec_cg。
+    返回运行摘要字典。
+    """
+    if report is None:
+        report = lambda percent, message: None
+    if should_stop is None:
+        should_stop = lambda: False
+    start_time = time.perf_counter()
+    
+    report(0, "Reading input file")
+    if data is None:
+        if id_column not in scan_table(params['input_file'], 0).columns:
+            raise ValueError(f"ID column '{id_column}' not found in the data file")
+        data = DATASET_CACHE.load(params['input_file'], input_columns(params, id_column), compact=True)
+    if id_column not in data.columns:
+        raise ValueError(f"ID column '{id_column}' not found in the data file")
+    bands = params['selected_bands']
+    
+    report(2, "Checking dates")
+    dates = check_and_convert_dates(data[params['date_column']].values)
+    merge = np.stack([data[b].values for b in bands], axis=1)
+    if params['qa_column'] is not None:
+        qa = data[params['qa_column']].values
+    else:
+        qa = np.zeros_like(dates, dtype=int)
+    
+    report(4, "Sorting by ID")
+    order, pixel_ids, bounds = split_series(data[id_column].values, dates)
+    dates, merge, qa = dates[order], merge[order], qa[order]
+    n_chunks = (len(pixel_ids) + chunk_size - 1) // chunk_size
+    
+    # 参数或输入文件不同的旧结果不能续跑
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, BATCH_MANIFEST)
+    fingerprint = {
+        'input': list(DatasetCache.file_key(params['input_file'])),
+        'method': params['method'],
+        'options': detection_options(params),
+        'columns': [params['date_column'], params['qa_column'], id_column] + list(bands),
+        'chunk_size': chunk_size,
+        'n_pixels': len(pixel_ids),
+    }
+    manifest = {'fingerprint': fingerprint, 'completed': [], 'failed': {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            previous = json.load(f)
+        if previous['fingerprint'] != fingerprint:
+            raise ValueError(f"{output_dir} contains results of a different batch run; choose an empty output directory")
+        manifest = previous
+    completed = set(manifest['completed'])
+    resumed = len(completed)
+    
+    def save_manifest():
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+    
+    def chunk_args(index):
+        first, last = index * chunk_size, min((index + 1) * chunk_size, len(pixel_ids))
+        lo, hi = bounds[first], bounds[last]
+        return (params['method'], detection_options(params), bands, pixel_ids[first:last], bounds[first:last + 1] - lo, dates[lo:hi], merge[lo:hi], qa[lo:hi])
+    
+    def finish_chunk(index, table, failed):
+        if table is not None:
+            part_path = os.path.join(output_dir, f"part-{index:06d}.parquet")
+            table.to_parquet(part_path + ".tmp", index=False)
+            os.replace(part_path + ".tmp", part_path)
+        manifest['failed'].update(failed)
+        manifest['completed'].append(index)
+        save_manifest()
+    
+    todo = deque(i for i in range(n_chunks) if i not in completed)
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    new_pool = lambda n: ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context('spawn'))
+    isolation_pool = None
+    
+    def detect_isolated(index):
+        """
+        在单进程的隔离进程池中重跑一个分组；若仍然崩溃则对像元不断二分，
+        直到定位出使pyxccd崩溃的单个像元（例如观测过少的序列），其余像元照常输出。
+        """
+        nonlocal isolation_pool
+        method, options, band_names, ids, local_bounds, chunk_dates, chunk_merge, chunk_qa = chunk_args(index)
+        tables, failed = [], {}
+        stack = [(0, len(ids))]
+        while stack:
+            first, last = stack.pop()
+            lo, hi = local_bounds[first], local_bounds[last]
+            if isolation_pool is None:
+                isolation_pool = new_pool(1)
+            try:
+                table, sub_failed = isolation_pool.submit(
+                    _detect_batch_chunk, method, options, band_names, ids[first:last],
+                    local_bounds[first:last + 1] - lo, chunk_dates[lo:hi], chunk_merge[lo:hi], chunk_qa[lo:hi]
+                ).result()
+            except BrokenProcessPool:
+                isolation_pool.shutdown()
+                isolation_pool = None
+                if last - first == 1:
+                    failed[str(ids[first])] = "Detection process crashed"
                 else:
-                    # Original segment-by-segment plotting
-                    for segment in sccd_result.rec_cg:
-                        j = np.arange(segment['t_start'], segment['t_break'] + 1, 1)
-                        if len(segment['coefs'][band_index]) == 8:
-                            plot_df = pd.DataFrame(
-                                {
-                                'dates': j,
-                                'trend': j * segment['coefs'][band_index][1] / slope_scale + segment['coefs'][band_index][0],
-                                'annual': np.cos(w * j) * segment['coefs'][band_index][2] + np.sin(w * j) * segment['coefs'][band_index][3],
-                                'semiannual': np.cos(2 * w * j) * segment['coefs'][band_index][4] + np.sin(2 * w * j) * segment['coefs'][band_index][5],
-                                'trimodal': np.cos(3 * w * j) * segment['coefs'][band_index][6] + np.sin(3 * w * j) * segment['coefs'][band_index][7]
-                            })
-                        else:
-                            plot_df = pd.DataFrame(
-                                {
-                                'dates': j,
-                                'trend': j * segment['coefs'][band_index][1] / slope_scale + segment['coefs'][band_index][0],
-                                'annual': np.cos(w * j) * segment['coefs'][band_index][2] + np.sin(w * j) * segment['coefs'][band_index][3],
-                                'semiannual': np.cos(2 * w * j) * segment['coefs'][band_index][4] + np.sin(2 * w * j) * segment['coefs'][band_index][5],
-                                'trimodal': j * 0
-                            })
-                        plot_df['predicted'] = (
-                            plot_df['trend'] + 
-                            plot_df['annual'] + 
-                            plot_df['semiannual'] +
-                            plot_df['trimodal']
-                        )
-
-                        # Convert dates and plot model fit
-                        calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in plot_df["dates"]]
-                        plot_df.loc[:, 'dates_formal'] = calendar_dates
-                        g = sns.lineplot(
-                            x="dates_formal", y="predicted",
-                            data=plot_df,
-                            label="Model fit",
-                            ax=axe,
-                            color=default_plot_kwargs['line_color']
-                        )
-                        if g.legend_ is not None: 
-                            g.legend_.remove()
-
-                # Plot near-real-time projection for SCCD if available
-                if hasattr(sccd_result, 'nrt_mode') and (sccd_result.nrt_mode %10 == 1 or sccd_result.nrt_mode == 3 or sccd_result.nrt_mode %10 == 5):
-                    recent_obs = sccd_result.nrt_model['obs_date_since1982'][sccd_result.nrt_model['obs_date_since1982']>0]
-                    j = np.arange(
-                        sccd_result.nrt_model['t_start_since1982'].item() + defaults['COMMON']['JULIAN_LANDSAT4_LAUNCH'], 
-                        recent_obs[-1].item()+ defaults['COMMON']['JULIAN_LANDSAT4_LAUNCH']+1, 
-                        1
-                    )
-
-                    if len(sccd_result.nrt_model['nrt_coefs'][band_index]) == 8:
-                        plot_df = pd.DataFrame(
-                            {
-                            'dates': j,
-                            'trend': j * sccd_result.nrt_model['nrt_coefs'][band_index][1] / slope_scale + sccd_result.nrt_model['nrt_coefs'][band_index][0],
-                            'annual': np.cos(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][2] + np.sin(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][3],
-                            'semiannual': np.cos(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][4] + np.sin(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][5],
-                            'trimodal': np.cos(3 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][6] + np.sin(3 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][7]
-                        })
-                    else:
-                        plot_df = pd.DataFrame(
-                            {
-                            'dates': j,
-                            'trend': j * sccd_result.nrt_model['nrt_coefs'][band_index][1] / slope_scale + sccd_result.nrt_model['nrt_coefs'][band_index][0],
-                            'annual': np.cos(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][2] + np.sin(w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][3],
-                            'semiannual': np.cos(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][4] + np.sin(2 * w * j) * sccd_result.nrt_model['nrt_coefs'][band_index][5],
-                            'trimodal': j * 0
-                        })
-                        
-                    plot_df['predicted'] = plot_df['trend'] + plot_df['annual'] + plot_df['semiannual'] + plot_df['trimodal']
-                    calendar_dates = [pd.Timestamp.fromordinal(int(row)) for row in plot_df["dates"]]
-                    plot_df.loc[:, 'dates_formal'] = calendar_dates
-                    g = sns.lineplot(
-                        x="dates_formal", y="predicted",
-                        data=plot_df,
-                        label="Model fit",
-                        ax=axe,
-                        color=default_plot_kwargs['line_color']
-                    )
-                    if g.legend_ is not None: 
-                        g.legend_.remove()
+                    middle = (first + last) // 2
+                    stack.extend([(middle, last), (first, middle)])
+                continue
+            if table is not None:
+                tables.append(table)
+            failed.update(sub_failed)
+        return (pd.concat(tables, ignore_index=True) if tables else None), failed
+    
+    stopped = False
+    save_manifest()
+    pool = new_pool(workers)
+    running = {}
+    try:
+        while todo or running:
+            # 控制在途任务数量，避免一次性复制全部数据
+            while todo and len(running) < workers * 2 and not stopped:
+                index = todo.popleft()
+                running[pool.submit(_detect_batch_chunk, *chunk_args(index))] = index
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                if isinstance(future.exception(), BrokenProcessPool):
+                    broken = True
+                else:
+                    finish_chunk(running.pop(future), *future.result())
+            if broken:
+                # pyxccd在个别序列上可能直接崩溃，整个进程池随之失效：
+                # 重建进程池，在途的分组逐个隔离重跑
+                pool.shutdown()
+                suspects = sorted(running.values())
+                running.clear()
+                for index in suspects:
+                    report(5 + 95 * len(manifest['completed']) // max(n_chunks, 1), f"Batch: isolating a crashed pixel in chunk {index}")
+                    finish_chunk(index, *detect_isolated(index))
+                pool = new_pool(workers)
+            n_done = len(manifest['completed'])
+            n_pixels = min(n_done * chunk_size, len(pixel_ids))
+            report(5 + 95 * n_done // max(n_chunks, 1), f"Batch: {n_done}/{n_chunks} chunks (~{n_pixels}/{len(pixel_ids)} pixels)")
+            if not stopped and should_stop():
+                # 已提交的分组完成后停止，下次运行从剩余分组继续
+                stopped = True
+                todo.clear()
+    finally:
+        pool.shutdown(cancel_futures=True)
+        if isolation_pool is not None:
+            isolation_pool.shutdown()
+    
+    return {
+        'output_dir': output_dir,
+        'n_pixels': len(pixel_ids),
+        'n_chunks': n_chunks,
+        'completed_chunks': len(manifest['completed']),
+        'resumed_chunks': resumed,
+        'failed_pixels': len(manifest['failed']),
+        'stopped': stopped,
+        'seconds': time.perf_counter() - start_time,
+    }
 
-                # add manual legends
-                legend_elements = [Line2D([0], [0], label=f'{band_names[indicator_band_index]} decrease break', color='k'),
-                                Line2D([0], [0], label=f'{band_names[indicator_band_index]} increase break', color='r')]
-                axe.legend(handles=legend_elements, loc='upper left', prop={'size': 9})
-                
-                # plot breaks
-                for i in range(len(sccd_result.rec_cg)):
-                    if sccd_result.rec_cg[i]['magnitude'][indicator_band_index] < 0:
-                        axe.axvline(pd.Timestamp.fromordinal(sccd_result.rec_cg[i]['t_break']), color='k')
-                    else:
-                        axe.axvline(pd.Timestamp.fromordinal(sccd_result.rec_cg[i]['t_break']), color='r')
-                
-                axe.set_ylabel(f"{band_name} * 10000", fontsize=default_plot_kwargs['font_size'])
 
-                # Handle tick params with type safety
-                tick_font_size = default_plot_kwargs['font_size']
-                if isinstance(tick_font_size, (int, float)):
-                    axe.tick_params(axis='x', labelsize=int(tick_font_size)-1)
-                else:
-                    axe.tick_params(axis='x', labelsize=13)  # fallback
+def confirmed_breaks(params, result):
+    """检测结果中已确认断点的序数日期（COLD只取change_prob为100的断点）"""
+    if params['method'] == 'COLD':
+        rec_cg = result['cold_result']
+        if len(rec_cg) == 0:
+            return np.empty(0, dtype=np.int64)
+        return rec_cg['t_break'][(rec_cg['change_prob'] == 100) & (rec_cg['t_break'] > 0)]
+    rec_cg = result['sccd_result'].rec_cg
+    if len(rec_cg) == 0:
+        return np.empty(0, dtype=np.int64)
+    return rec_cg['t_break'][rec_cg['t_break'] > 0]
+
+
+def fit_rmse(params, result):
+    """显示波段上模型拟合值与clean观测（PreparedSeries.clean）之间的RMSE；没有可比较的观测时为NaN"""
+    band_index = params['selected_bands'].index(params['display_band'])
+    if params['method'] == 'COLD':
+        rec_cg = result['cold_result']
+        t_start, t_end, coefs = rec_cg['t_start'], rec_cg['t_end'], rec_cg['coefs']
+    else:
+        t_start, t_end, coefs = sccd_fit_segments(result['sccd_result'])
+    days, predicted, _ = evaluate_harmonic_segments(t_start, t_end, coefs, band_index, n_coefs=coefs.shape[-1])
+    if len(days) == 0:
+        return float('nan')
+    # 按日期展开为连续数组，重叠的分段以后一个为准
+    first, last = int(days.min()), int(days.max())
+    model = np.full(last - first + 1, np.nan)
+    model[days - first] = predicted
+    series = result['series']
+    dates = series.dates
+    clear = series.clean & (dates >= first) & (dates <= last)
+    residual = model[dates[clear] - first] - series.merge[clear, band_index]
+    residual = residual[~np.isnan(residual)]
+    return float(np.sqrt(np.mean(residual ** 2))) if len(residual) else float('nan')
+
+
+def parse_sweep_values(text, kind=float):
+    """
+    解析参数扫描的取值：逗号或空格分隔的列表（如"0.95, 0.99"），或包含终点的
+    start:stop:step区间（如"4:8:2"）。返回去重后的字符串列表（与GUI输入框的取值格式
+    一致），格式不正确时抛出ValueError。
+    """
+    values = []
+    for part in text.replace(',', ' ').split():
+        try:
+            if ':' in part:
+                start, stop, step = (kind(x) for x in part.split(':'))
+                if step <= 0:
+                    raise ValueError
+                n = int(math.floor((stop - start) / step + 1e-9)) + 1
+                values.extend(kind(round(start + i * step, 10)) for i in range(n))
+            else:
+                values.append(kind(part))
+        except ValueError:
+            raise ValueError(f"Invalid parameter value '{part}' (use a list like '0.95, 0.99' or a range like '4:8:2')")
+    if not values:
+        raise ValueError("No parameter values given")
+    return [format(value, 'g') for value in dict.fromkeys(values)]
+
+
+def sweep_configs(p_cg_values, conse_values, lam_values):
+    """参数网格：P_CG、CONSE和Lam取值的所有组合"""
+    return [
+        {'P_CG': p_cg, 'CONSE': conse, 'Lam': lam}
+        for p_cg, conse, lam in itertools.product(p_cg_values, conse_values, lam_values)
+    ]
+
+
+def sweep_row(params, result):
+    """参数扫描结果表中的一行：参数组合、断点数量、断点日期和拟合RMSE"""
+    breaks = confirmed_breaks(params, result)
+    return {
+        'P_CG': params['P_CG'],
+        'CONSE': params['CONSE'],
+        'Lam': params['Lam'],
+        'breaks': len(breaks),
+        'break_dates': [pd.Timestamp.fromordinal(int(day)).strftime('%Y-%m-%d') for day in breaks],
+        'rmse': fit_rmse(params, result),
+        'error': None,
+    }
 
-                axe.set(ylim=(ylim_low, ylim_high))
-                axe.set_xlabel("", fontsize=6)
 
-                # Format spines
-                for spine in axe.spines.values():
-                    spine.set_edgecolor('black')
-                title_font_size = int(font_size) + 2 if isinstance(font_size, (int, float)) else 16
-                axe.set_title(title, fontweight="bold", size=title_font_size, pad=2)
-            
-            def display_sccd_states_flex(
-                data_df: pd.DataFrame,
-                states: pd.DataFrame,
-                axes: Axes,
-                variable_name: str,
-                title: str,
-                band_name: str,
-                band_index: int,  
-                plot_kwargs: Optional[Dict] = None
-            ):
-                """显示S-CCD状态结果的灵活函数"""
-                default_plot_kwargs = {
-                    'marker_size': 5,
-                    'marker_alpha': 0.7,
-                    'line_color': 'orange',
-                    'font_size': 14
-                }
-                if plot_kwargs is not None:
-                    default_plot_kwargs.update(plot_kwargs)
-
-                # 构建列名前缀
-                col_prefix = f"b{band_index}"  # 使用b0, b1等格式
-                
-                # 构建完整的列名
-                trend_col = f"{col_prefix}_trend"
-                annual_col = f"{col_prefix}_annual"
-                semiannual_col = f"{col_prefix}_semiannual"
-                trimodal_col = f"{col_prefix}_trimodal"  # 可能不存在
-                
-                # 验证列是否存在（trimodal可选）
-                required_cols = [trend_col, annual_col, semiannual_col]
-                missing_cols = [col for col in required_cols if col not in states.columns]
-                if missing_cols:
-                    raise ValueError(f"缺少必要的列: {missing_cols}。可用列: {states.columns.tolist()}")
-
-                has_trimodal = trimodal_col in states.columns  # 检查是否有trimodal列
-
-                # 转换日期格式
-                states["dates_formal"] = [pd.Timestamp.fromordinal(int(row)) for row in states["dates"]]
-
-                # 绘制趋势分量（第1个子图）
-                extra = (np.max(states[trend_col]) - np.min(states[trend_col])) / 4
-                axes[0].set(ylim=(np.min(states[trend_col]) - extra, np.max(states[trend_col]) + extra))
-                sns.lineplot(x="dates_formal", y=trend_col, data=states, ax=axes[0], color="orange")
-                axes[0].set(ylabel="Trend")
-
-                # 绘制年周期分量（第2个子图）
-                extra = (np.max(states[annual_col]) - np.min(states[annual_col])) / 4
-                axes[1].set(ylim=(np.min(states[annual_col]) - extra, np.max(states[annual_col]) + extra))
-                sns.lineplot(x="dates_formal", y=annual_col, data=states, ax=axes[1], color="orange")
-                axes[1].set(ylabel="Annual cycle")
-
-                # 绘制半年周期分量（第3个子图）
-                extra = (np.max(states[semiannual_col]) - np.min(states[semiannual_col])) / 4
-                axes[2].set(ylim=(np.min(states[semiannual_col]) - extra, np.max(states[semiannual_col]) + extra))
-                sns.lineplot(x="dates_formal", y=semiannual_col, data=states, ax=axes[2], color="orange")
-                axes[2].set(ylabel="Semi-annual cycle")
-
-                current_ax_index = 3  # 当前子图索引
-
-                # 如果有trimodal列，绘制trimodal分量（第4个子图）
-                if has_trimodal:
-                    extra = (np.max(states[trimodal_col]) - np.min(states[trimodal_col])) / 4
-                    axes[3].set(ylim=(np.min(states[trimodal_col]) - extra, np.max(states[trimodal_col]) + extra))
-                    sns.lineplot(x="dates_formal", y=trimodal_col, data=states, ax=axes[3], color="orange")
-                    axes[3].set(ylabel="Trimodal cycle")
-                    current_ax_index += 1  # 如果绘制了trimodal，则下一个子图索引+1
-
-                # 绘制原始数据（第current_ax_index个子图）
-                data_clean = data_df[(data_df["qa"] == 0) | (data_df['qa'] == 1)].copy()
-                data_clean["dates"] = check_and_convert_dates(data_clean["dates"])
-                data_clean["dates_formal"] = [pd.Timestamp.fromordinal(int(row)) for row in data_clean["dates"]]
-                axes[current_ax_index].plot(
-                    'dates_formal', variable_name, 'go',
-                    markersize=default_plot_kwargs['marker_size'],
-                    alpha=default_plot_kwargs['marker_alpha'],
-                    data=data_clean
-                )
+class SharedArrays:
+    """
+    通过一块共享内存在进程间共享一组numpy数组。
 
-                # 绘制拟合结果（第current_ax_index个子图）
-                if has_trimodal:
-                    states["General"] = states[annual_col] + states[trend_col] + states[semiannual_col] + states[trimodal_col]
-                else:
-                    states["General"] = states[annual_col] + states[trend_col] + states[semiannual_col]
-                
-                sns.lineplot(x="dates_formal", y="General", data=states, label="fit", ax=axes[current_ax_index], color="orange")
-                
-                # 设置y轴范围
-                band_values = data_df[data_df['qa'] == 0][variable_name]
-                q01, q99 = np.quantile(band_values, [0.01, 0.99])
-                extra = (q99 - q01) * 0.4
-                axes[current_ax_index].set(ylim=(q01 - extra, q99 + extra))
-                
-                axes[current_ax_index].set_ylabel(variable_name, fontsize=default_plot_kwargs['font_size'])
-                axes[current_ax_index].set_title(title, fontweight="bold", size=16, pad=2)
-                axes[current_ax_index].set_xlabel("")
+    创建时把数组复制到共享内存中，spec（共享内存名称以及各数组的dtype、形状和偏移）
+    可以作为进程池initializer的参数传给工作进程，工作进程用attach直接映射，
+    每个任务不再复制输入。创建方负责调用close()释放共享内存。
+    """
+    
+    def __init__(self, arrays):
+        arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+        layout, offset = [], 0
+        for name, array in arrays.items():
+            layout.append((name, array.dtype.str, array.shape, offset))
+            # 各数组按8字节对齐
+            offset += (array.nbytes + 7) // 8 * 8
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 8))
+        for (name, dtype, shape, start), array in zip(layout, arrays.values()):
+            np.ndarray(shape, dtype, buffer=self._shm.buf, offset=start)[...] = array
+        self.spec = (self._shm.name, layout)
+    
+    @staticmethod
+    def attach(spec):
+        """按spec映射共享内存，返回(SharedMemory, {名称: 数组})；使用数组期间需保留SharedMemory对象"""
+        name, layout = spec
+        shm = shared_memory.SharedMemory(name=name)
+        arrays = {key: np.ndarray(shape, dtype, buffer=shm.buf, offset=start) for key, dtype, shape, start in layout}
+        return shm, arrays
+    
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+# 参数扫描工作进程中映射的共享内存及检测输入（由_init_sweep_worker设置）
+_SWEEP_SHM = None
+_SWEEP_INPUTS = None
+
+
+def _init_sweep_worker(spec):
+    """参数扫描进程池的initializer：每个工作进程只映射一次共享的dates/merge/qa"""
+    global _SWEEP_SHM, _SWEEP_INPUTS
+    _SWEEP_SHM, arrays = SharedArrays.attach(spec)
+    # 共享数组已是PreparedSeries压缩后的类型，重新包装时不会复制
+    series = PreparedSeries(arrays['dates'], arrays['merge'], arrays['qa'])
+    _SWEEP_INPUTS = dict(arrays, series=series, data=None, warnings=[])
+
+
+def _sweep_config(params):
+    """进程池任务：对共享输入执行一个参数组合，返回(结果行, 检测结果缓存项)"""
+    start = time.perf_counter()
+    result = detect_change(params, inputs=_SWEEP_INPUTS, cache=DetectionCache())
+    row = sweep_row(params, result)
+    row['seconds'] = time.perf_counter() - start
+    return row, result['detections']
+
+
+def run_sweep(params, inputs, configs, workers=None, on_result=None, should_stop=None):
+    """
+    参数扫描：对同一输入并行执行多个P_CG/CONSE/Lam组合。
+
+    inputs为prepare_inputs的结果，其中的dates/merge/qa只通过共享内存传给进程池一次。
+    每个组合按当前视图规划检测调用（plan_detection），完成后调用
+    on_result(row, detections)，detections可以直接加入DetectionCache，
+    之后按该组合绘图时不必重新检测。should_stop()返回True时取消尚未开始的组合。
+    返回按完成顺序排列的结果行列表。
+    """
+    if on_result is None:
+        on_result = lambda row, detections: None
+    if should_stop is None:
+        should_stop = lambda: False
+    rows = []
+    if not configs:
+        return rows
+    workers = min(workers or max(1, (os.cpu_count() or 2) - 1), len(configs))
+    shared = SharedArrays({'dates': inputs['dates'], 'merge': inputs['merge'], 'qa': inputs['qa']})
+    try:
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_sweep_worker,
+            initargs=(shared.spec,)
+        )
+        try:
+            running = {pool.submit(_sweep_config, dict(params, **config)): config for config in configs}
+            while running:
+                done, _ = wait(running, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    config = running.pop(future)
+                    try:
+                        row, detections = future.result()
+                    except Exception as e:
+                        # pyxccd崩溃时进程池失效，其余组合也会以BrokenProcessPool结束
+                        reason = "Detection process crashed" if isinstance(e, BrokenProcessPool) else f"{type(e).__name__}: {e}"
+                        row = dict(config, breaks=None, break_dates=[], rmse=float('nan'), error=reason, seconds=None)
+                        detections = {}
+                    rows.append(row)
+                    on_result(row, detections)
+                if should_stop():
+                    for future in running:
+                        future.cancel()
+                    break
+        finally:
+            pool.shutdown(cancel_futures=True)
+    finally:
+        shared.close()
+    return rows
+
+
+def reuse_axes(fig, n_rows=1, sharex=False, adjust=None):
+    """
+    在已有的Figure中获取绘图坐标轴：布局与上次相同时清空并复用原有坐标轴，
+    否则清空整个Figure后重新创建。返回坐标轴（n_rows为1时为单个Axes）。
+    """
+    layout = (n_rows, sharex)
+    axes = fig.axes
+    if getattr(fig, '_pyxccd_layout', None) == layout and len(axes) == n_rows:
+        for ax in axes:
+            ax.cla()
+        # cla不会移除Figure级别的图例和标题
+        for legend in list(fig.legends):
+            legend.remove()
+        fig.suptitle('')
+    else:
+        fig.clear()
+        axes = fig.subplots(n_rows, 1, sharex=sharex, squeeze=False)[:, 0]
+        fig._pyxccd_layout = layout
+    fig.subplots_adjust(**(adjust or {'left': 0.07, 'right': 0.98, 'top': 0.92, 'bottom': 0.1}))
+    return axes[0] if n_rows == 1 else np.asarray(axes)
+
+
+def plot_change_detection(fig, params, result):
+    """根据detect_change的结果在给定的Figure中绘图（GUI中必须在主线程调用）"""
+    series = result['series']
+    band_index = params['selected_bands'].index(params['display_band'])
+    indicator_band_index = params['selected_bands'].index(params['break_indicator'])
+    plot_kwargs = {'render_mode': params.get('render_mode', 'fast')}
+    # 检测结果可能来自DETECTION_CACHE，显示函数会向states添加列，因此使用浅拷贝
+    if result.get('states') is not None:
+        result = dict(result, states=result['states'].copy(deep=False))
+    
+    sns.set_theme(style="darkgrid")
+    sns.set_context("notebook")
+    
+    if params.get('compare'):
+        # 对比模式：COLD和S-CCD上下排列并共享x轴，配对的断点之间用绿色区域标出
+        axes = reuse_axes(fig, 2, sharex=True, adjust={'left': 0.07, 'right': 0.98, 'top': 0.95, 'bottom': 0.07, 'hspace': 0.25})
+        display_cold_result(data=series, band_names=params['selected_bands'], band_index=band_index, indicator_band_index=indicator_band_index, cold_result=result['cold_result'], axe=axes[0], title="COLD", plot_kwargs=plot_kwargs)
+        display_sccd_result(data=series, band_names=params['selected_bands'], band_index=band_index, indicator_band_index=indicator_band_index, sccd_result=result['sccd_result'], axe=axes[1], title="S-CCD", states=result.get('states'), plot_kwargs=plot_kwargs)
+        for cold_day, sccd_day, _ in result['matches']:
+            if cold_day is not None and sccd_day is not None:
+                start, end = ordinal_to_datenum(sorted((cold_day, sccd_day)))
+                for ax in axes:
+                    ax.axvspan(start, end + 1, color='green', alpha=0.2, linewidth=0)
+    elif params['method'] == 'COLD':
+        ax = reuse_axes(fig)
+        display_cold_result(data=series, band_names=params['selected_bands'], band_index=band_index, indicator_band_index=indicator_band_index, cold_result=result['cold_result'], axe=ax, title="COLD", plot_kwargs=plot_kwargs)
+    elif params['output'] == 'anomaly':
+        axes = reuse_axes(fig)
+        display_sccd_result_sif(data=series, band_names=params['selected_bands'], band_index=band_index, indicator_band_index=indicator_band_index, sccd_result=result['sccd_result'], axe=axes, title="S-CCD anomaly", states=result.get('states'), anomaly=result['anomaly'], trimodal=params['trimodal'], plot_kwargs=plot_kwargs)
+    elif params['output'] == 'state_components':
+        n_subplots = 5 if params['trimodal'] else 4
+        axes = reuse_axes(fig, n_subplots, sharex=True, adjust={'left': 0.08, 'right': 0.98, 'top': 0.92, 'bottom': 0.1})
+        display_sccd_states_flex(data_df=series, axes=axes, states=result['states'], band_name=params['display_band'], band_index=band_index, variable_name=params['display_band'], title="S-CCD", plot_kwargs=plot_kwargs)
+    else:
+        ax = reuse_axes(fig)
+        if params['fitting_curve'] == 'States':
+            display_sccd_result_sif(data=series, band_names=params['selected_bands'], band_index=band_index, indicator_band_index=indicator_band_index, sccd_result=result['sccd_result'], axe=ax, title="S-CCD", states=result['states'], plot_kwargs=plot_kwargs)
+        else:
+            display_sccd_result(data=series, band_names=params['selected_bands'], band_index=band_index, indicator_band_index=indicator_band_index, sccd_result=result['sccd_result'], axe=ax, title="SCCD", plot_kwargs=plot_kwargs)
+    return fig
+
+
+def plot_nrt_result(fig, params, result):
+    """绘制update_nrt_state的结果：完整的S-CCD断点视图（包括近实时投影）"""
+    band_index = params['selected_bands'].index(params['display_band'])
+    indicator_band_index = params['selected_bands'].index(params['break_indicator'])
+    sns.set_theme(style="darkgrid")
+    sns.set_context("notebook")
+    ax = reuse_axes(fig)
+    display_sccd_result(data=result['series'], band_names=params['selected_bands'], band_index=band_index, indicator_band_index=indicator_band_index, sccd_result=result['sccd_result'], axe=ax, title="S-CCD NRT", plot_kwargs={'render_mode': params.get('render_mode', 'fast')})
+    return fig
+
+
+def plot_nrt_tail(axe, params, result):
+    """
+    在plot_nrt_result已绘制的坐标轴上只重绘增量更新改变的部分：移除旧的近实时投影，
+    补画新观测、新确认的分段及其断点和新的投影，已绘制的历史部分保持不变
+    """
+    series, output = result['series'], result['sccd_result']
+    band_index = params['selected_bands'].index(params['display_band'])
+    indicator_band_index = params['selected_bands'].index(params['break_indicator'])
+    render_mode = params.get('render_mode', 'fast')
+    for artist in [artist for artist in axe.get_children() if artist.get_gid() == NRT_GID]:
+        artist.remove()
+    
+    rows = result['new_rows'][series.clean[result['new_rows']]]
+    axe.plot(series.datenums[rows], series.merge[rows, band_index], 'go', markersize=5, alpha=0.7)
+    
+    new_segments = output.rec_cg[len(result['previous'].rec_cg):]
+    if len(new_segments):
+        t_start, t_end, coefs = sccd_fit_segments(output._replace(rec_cg=new_segments), include_nrt=False)
+        days, predicted, bounds = evaluate_harmonic_segments(t_start, t_end, coefs, band_index, n_coefs=coefs.shape[-1])
+        plot_model_fit(axe, days, predicted, bounds, 'orange', render_mode)
+        plot_breaks(axe, new_segments, indicator_band_index)
+    plot_nrt_projection(axe, output, band_index, 'orange', render_mode)
+
+
+def _job_worker(task_queue, event_queue):
+    """后台工作进程主循环：逐个执行任务并通过event_queue回传进度和结果"""
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        job_id, func, args = task
+        report = lambda percent, message: event_queue.put(('progress', job_id, percent, message))
+        try:
+            event_queue.put(('done', job_id, func(*args, report=report)))
+        except Exception as e:
+            event_queue.put(('error', job_id, f"{type(e).__name__}: {e}", traceback.format_exc()))
+
+
+class JobExecutor:
+    """
+    变化检测任务执行器。
+
+    任务在独立的工作进程中按提交顺序逐个执行（pyxccd的Cython代码执行期间不释放GIL，
+    用线程无法保证界面响应）。排队中的任务直接从队列移除即可取消；正在运行的任务
+    通过终止工作进程取消，下一个任务会自动启动新的工作进程；cancel_all()同时取消两者。
+    GUI通过root.after定期调用poll()获取事件：
+        ('started', job_id)
+        ('progress', job_id, percent, message)
+        ('done', job_id, result)
+        ('error', job_id, message, traceback)
+        ('cancelled', job_id)
+    """
+    
+    def __init__(self):
+        self._ctx = multiprocessing.get_context('spawn')
+        self._process = None
+        self._task_queue = None
+        self._event_queue = None
+        self._pending = deque()
+        self._running = None
+        self._next_id = 1
+        self._local_events = []
+    
+    @property
+    def running_job(self):
+        return self._running
+    
+    @property
+    def pending_count(self):
+        return len(self._pending)
+    
+    def is_busy(self):
+        return self._running is not None or bool(self._pending)
+    
+    def submit(self, func, *args):
+        """提交任务，返回任务编号；func必须是模块级函数并接受report关键字参数"""
+        job_id = self._next_id
+        self._next_id += 1
+        self._pending.append((job_id, func, args))
+        self._dispatch()
+        return job_id
+    
+    def cancel(self, job_id=None):
+        """取消指定任务；job_id为None时取消正在运行的任务"""
+        if job_id is None or job_id == self._running:
+            if self._running is None:
+                return False
+            self._stop_worker(terminate=True)
+            self._local_events.append(('cancelled', self._running))
+            self._running = None
+            self._dispatch()
+            return True
+        for task in self._pending:
+            if task[0] == job_id:
+                self._pending.remove(task)
+                self._local_events.append(('cancelled', job_id))
+                return True
+        return False
+    
+    def cancel_all(self):
+        """取消正在运行和排队中的所有任务（终止工作进程并清空队列），返回取消的任务数"""
+        cancelled = [task[0] for task in self._pending]
+        self._pending.clear()
+        if self._running is not None:
+            self._stop_worker(terminate=True)
+            cancelled.insert(0, self._running)
+            self._running = None
+        self._local_events.extend(('cancelled', job_id) for job_id in cancelled)
+        return len(cancelled)
+    
+    def poll(self):
+        """非阻塞地取出所有待处理事件"""
+        events, self._local_events = self._local_events, []
+        while self._event_queue is not None:
+            try:
+                event = self._event_queue.get_nowait()
+            except queue.Empty:
+                break
+            # 忽略已取消任务残留的事件
+            if event[1] != self._running:
+                continue
+            events.append(event)
+            if event[0] in ('done', 'error'):
+                self._running = None
+                self._dispatch()
+        if self._running is not None and not self._process.is_alive():
+            events.append(('error', self._running, "Worker process exited unexpectedly", ""))
+            self._stop_worker(terminate=False)
+            self._running = None
+            self._dispatch()
+        events.extend(self._local_events)
+        self._local_events = []
+        return events
+    
+    def shutdown(self):
+        """关闭执行器并结束工作进程"""
+        self._pending.clear()
+        self._running = None
+        self._stop_worker(terminate=True)
+    
+    def _dispatch(self):
+        if self._running is not None or not self._pending:
+            return
+        if self._process is None or not self._process.is_alive():
+            self._start_worker()
+        job_id, func, args = self._pending.popleft()
+        self._running = job_id
+        self._task_queue.put((job_id, func, args))
+        self._local_events.append(('started', job_id))
+    
+    def _start_worker(self):
+        self._task_queue = self._ctx.Queue()
+        self._event_queue = self._ctx.Queue()
+        self._process = self._ctx.Process(
+            target=_job_worker,
+            args=(self._task_queue, self._event_queue),
+            daemon=True
+        )
+        self._process.start()
+    
+    def _stop_worker(self, terminate):
+        if self._process is not None:
+            if terminate and self._process.is_alive():
+                self._process.terminate()
+            self._process.join(timeout=1)
+        self._process = None
+        self._task_queue = None
+        self._event_queue = None
+
+
+class BatchJob:
+    """
+    在后台线程中运行run_batch。
+
+    检测由run_batch内部的进程池完成，该线程只负责切分数据、提交任务和写出结果，
+    因此不会阻塞界面。取消时等待已提交的分组完成后停止，结果可以续跑。
+    GUI通过poll()获取事件：
+        ('progress', percent, message)
+        ('done', summary)
+        ('error', message, traceback)
+    """
+    
+    def __init__(self, params, output_dir, data=None, id_column='pixel_id', workers=None):
+        self._events = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(params, output_dir, data, id_column, workers),
+            daemon=True
+        )
+    
+    def _run(self, params, output_dir, data, id_column, workers):
+        report = lambda percent, message: self._events.put(('progress', percent, message))
+        try:
+            summary = run_batch(params, output_dir, data=data, id_column=id_column, workers=workers, report=report, should_stop=self._stop.is_set)
+            self._events.put(('done', summary))
+        except Exception as e:
+            self._events.put(('error', f"{type(e).__name__}: {e}", traceback.format_exc()))
+    
+    def start(self):
+        self._thread.start()
+    
+    def cancel(self):
+        self._stop.set()
+    
+    def is_alive(self):
+        return self._thread.is_alive()
+    
+    def poll(self):
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
 
-            params['fitting_coefficients'] = True if params['fitting_curve'] == 'Lasso' else False
-            #选择COLD
-            if params['method'] == 'COLD':
-                cold_result = cold_detect_flex(dates, merge, qa,float(params['Lam']), p_cg=float(params['P_CG']), conse=int(params['CONSE']))        
-                sns.set_theme(style="darkgrid")
-                sns.set_context("notebook")
 
-                fig, ax = plt.subplots(figsize=(12, 5))
+class SweepJob:
+    """
+    在后台线程中运行run_sweep。
 
-                display_cold_result(data=np.column_stack((dates, merge, qa)), band_names=params['selected_bands'], band_index=params['selected_bands'].index(params['display_band']), indicator_band_index=params['selected_bands'].index(params['break_indicator']), cold_result=cold_result, axe=ax, title="COLD")
-                print("6. 绘图完成，准备显示")
-                plt.show(block=True)
-                print("plt.show()已调用")
-            #选择S-CCD    
-            elif params['method'] == 'S-CCD':
-                if params['output'] == 'anomaly':
-                    if params['fitting_curve'] == 'States':
-                        sccd_result, anomaly = sccd_detect_flex(dates, merge, qa, float(params['Lam']), p_cg=float(params['P_CG']), conse=int(params['CONSE']),output_anomaly=True, fitting_coefs=params['fitting_coefficients'], trimodal=params['trimodal'])
-                        sccd_result, states = sccd_detect_flex(dates, merge, qa, float(params['Lam']), p_cg=float(params['P_CG']), conse=int(params['CONSE']), state_intervaldays=1, fitting_coefs=params['fitting_coefficients'], trimodal=params['trimodal'])
-                        
-                        sns.set_theme(style="darkgrid")
-                        sns.set_context("notebook")
-                        fig, axes = plt.subplots(figsize=(12, 5))
-                        plt.subplots_adjust(hspace=0.4)
-                        
-                        display_sccd_result_sif(data=np.column_stack((dates, merge, qa)),  band_names=params['selected_bands'], band_index=params['selected_bands'].index(params['display_band']), indicator_band_index=params['selected_bands'].index(params['break_indicator']), sccd_result=sccd_result,  axe=axes, title="S-CCD anomaly",states=states,anomaly=anomaly,trimodal=params['trimodal'])
-                        
-                        plt.show()    
-                        
-                    else:
-                        sccd_result, anomaly = sccd_detect_flex(dates, merge, qa, float(params['Lam']), p_cg=float(params['P_CG']), conse=int(params['CONSE']),output_anomaly=True, fitting_coefs=params['fitting_coefficients'], trimodal=params['trimodal'])
-                        sns.set_theme(style="darkgrid")
-                        sns.set_context("notebook")
-                        fig, axes = plt.subplots(figsize=(12, 5))
-                        plt.subplots_adjust(hspace=0.4)
+    检测由run_sweep内部的进程池完成，取消时正在运行的组合完成后停止。
+    GUI通过poll()获取事件，并在主线程中把检测结果加入DETECTION_CACHE：
+        ('result', row, detections)
+        ('done', rows)
+        ('error', message, traceback)
+    """
+    
+    def __init__(self, params, inputs, configs, workers=None):
+        self._events = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(params, inputs, configs, workers),
+            daemon=True
+        )
+    
+    def _run(self, params, inputs, configs, workers):
+        on_result = lambda row, detections: self._events.put(('result', row, detections))
+        try:
+            rows = run_sweep(params, inputs, configs, workers=workers, on_result=on_result, should_stop=self._stop.is_set)
+            self._events.put(('done', rows))
+        except Exception as e:
+            self._events.put(('error', f"{type(e).__name__}: {e}", traceback.format_exc()))
+    
+    def start(self):
+        self._thread.start()
+    
+    def cancel(self):
+        self._stop.set()
+    
+    def is_alive(self):
+        return self._thread.is_alive()
+    
+    def poll(self):
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
 
-                        display_sccd_result_sif(data=np.column_stack((dates, merge, qa)),  band_names=params['selected_bands'], band_index=params['selected_bands'].index(params['display_band']), indicator_band_index=params['selected_bands'].index(params['break_indicator']), sccd_result=sccd_result, anomaly=anomaly, trimodal=params['trimodal'], axe=axes, title="S-CCD anomaly")
-                        
-                        plt.show()     
-            
-                elif params['output'] == 'state_components':
-                    sccd_result, states = sccd_detect_flex(dates, merge, qa, float(params['Lam']), p_cg=float(params['P_CG']), conse=int(params['CONSE']),output_anomaly=False, state_intervaldays=1, fitting_coefs=params['fitting_coefficients'], trimodal=params['trimodal'])
-                
-                    sns.set_theme(style="darkgrid")
-                    sns.set_context("notebook")
-                    
-                    n_subplots = 5 if params['trimodal'] else 4
-                    fig, axes = plt.subplots(n_subplots, 1, figsize=[11, 9], sharex=True)
-                    plt.subplots_adjust(left=0.08, right=0.98, top=0.92, bottom=0.1)
-                    
-                    display_sccd_states_flex(data_df=data, axes=axes, states=states, band_name=params['display_band'],band_index=params['selected_bands'].index(params['display_band']), variable_name=params['display_band'], title="S-CCD")
-                    
-                    plt.show()
-                
-                else:    
-                
-                    sccd_result, states = sccd_detect_flex(dates, merge, qa, float(params['Lam']), p_cg=float(params['P_CG']), conse=int(params['CONSE']),output_anomaly=False, state_intervaldays=1, fitting_coefs=params['fitting_coefficients'], trimodal=params['trimodal'])
-                
-                    sns.set_theme(style="darkgrid")
-                    sns.set_context("notebook")
 
-                    fig, ax = plt.subplots(figsize=(12, 5))
-                    if params['fitting_curve'] == 'States':
-                        display_sccd_result_sif(data=np.column_stack((dates, merge, qa)), band_names=params['selected_bands'], band_index=params['selected_bands'].index(params['display_band']), indicator_band_index=params['selected_bands'].index(params['break_indicator']), sccd_result=sccd_result, axe=ax, title="S-CCD",states=states)
-                        plt.show()
-                    else:
-                        display_sccd_result(data=np.column_stack((dates, merge, qa)), band_names=params['selected_bands'], band_index=params['selected_bands'].index(params['display_band']), indicator_band_index=params['selected_bands'].index(params['break_indicator']), sccd_result=sccd_result, axe=ax, title="SCCD")
-                        plt.show()
-        execute_change_detection(params)
-            
-def main():
+def build_arg_parser():
+    """命令行参数：参数名与GUI中的选项一一对应"""
+    parser = argparse.ArgumentParser(
+        prog="Pyxccd_GUI.py",
+        description="Pyxccd change detection. Run without arguments to open the GUI."
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--input', required=True, help="Table file, or a directory of GeoTIFF scenes with --pixel")
+    common.add_argument('--pixel', nargs=2, type=int, metavar=('ROW', 'COL'), default=None, help="Pixel to extract when --input is a GeoTIFF scene directory")
+    common.add_argument('--method', choices=['COLD', 'S-CCD'], default='S-CCD')
+    common.add_argument('--date-column', required=True)
+    common.add_argument('--qa-column', default=None, help="QA column (omit to treat all observations as clear)")
+    common.add_argument('--bands', nargs='+', required=True)
+    common.add_argument('--lam', default="20")
+    common.add_argument('--p-cg', default="0.99")
+    common.add_argument('--conse', default="6")
+    common.add_argument('--no-trimodal', dest='trimodal', action='store_false', help="S-CCD only")
+    common.add_argument('--fitting-curve', choices=['Lasso', 'Kalman', 'States'], default='Lasso', help="S-CCD only")
+    common.add_argument('--no-store', dest='store', action='store_false', help=f"Do not read or save stored detection results ({RESULT_STORE_DIR})")
+    
+    run = subparsers.add_parser('run', parents=[common], help="Detect changes in one time series and save the figure and break table")
+    run.add_argument('--output', choices=['breaks', 'anomaly', 'state_components'], default='breaks', help="S-CCD only")
+    run.add_argument('--display-band', default=None, help="Defaults to the first band")
+    run.add_argument('--break-indicator', default=None, help="Defaults to the first band")
+    run.add_argument('--render-mode', choices=['fast', 'seaborn'], default='fast')
+    run.add_argument('--compare', action='store_true', help="Run COLD and S-CCD concurrently and match their breaks (ignores --method and --output)")
+    run.add_argument('--match-tolerance', type=int, default=90, help="Days within which COLD and S-CCD breaks match (with --compare)")
+    run.add_argument('--out-dir', default=".")
+    run.add_argument('--format', default="png", help="Figure format supported by matplotlib (png, pdf, svg, ...)")
+    run.add_argument('--dpi', type=int, default=150)
+    
+    update = subparsers.add_parser('update', parents=[common], help="Update the saved S-CCD near-real-time state with observations appended to the input")
+    update.add_argument('--state', default=None, help=f"State file (defaults to the input file + {NRT_STATE_SUFFIX}, or one file per pixel in --out-dir for a GeoTIFF scene directory)")
+    update.add_argument('--out-dir', default=None, help=f"Directory for the state file (defaults to next to the input file, or {NRT_STATE_DIR} for a GeoTIFF scene directory)")
+    
+    batch = subparsers.add_parser('batch', parents=[common], help="Detect changes for every pixel of a long table")
+    batch.add_argument('--id-column', default='pixel_id')
+    batch.add_argument('--out-dir', required=True, help="Directory for the Parquet break records (an existing batch directory is resumed)")
+    batch.add_argument('--workers', type=int, default=None)
+    batch.add_argument('--chunk-size', type=int, default=500)
+    return parser
+
+
+def params_from_args(args):
+    """将命令行参数转换为与GUI相同的参数字典"""
+    params = {
+        'input_file': args.input,
+        'method': args.method,
+        'date_column': args.date_column,
+        'qa_column': args.qa_column,
+        'selected_bands': list(args.bands),
+        'P_CG': args.p_cg,
+        'CONSE': args.conse,
+        'Lam': args.lam,
+        'trimodal': args.trimodal,
+        'fitting_curve': args.fitting_curve,
+    }
+    if args.pixel is not None:
+        params['pixel'] = tuple(args.pixel)
+    if args.command == 'run':
+        params.update(
+            output=args.output,
+            display_band=args.display_band or args.bands[0],
+            break_indicator=args.break_indicator or args.bands[0],
+            render_mode=args.render_mode,
+        )
+        if args.compare:
+            params.update(compare=True, match_tolerance=args.match_tolerance)
+    return params
+
+
+def run_cli(argv):
+    """
+    命令行入口：与GUI使用相同的读取（DATASET_CACHE）、检测（detect_change/run_batch）
+    和绘图（plot_change_detection）代码，结果写入--out-dir。
+    """
+    parser = build_arg_parser()
+    if not argv:
+        # 没有子命令（例如设置了MPLBACKEND=Agg而不带参数启动）时显示帮助
+        parser.print_help()
+        return 0
+    args = parser.parse_args(argv)
+    params = params_from_args(args)
+    if args.store:
+        DETECTION_CACHE.store = ResultStore()
+    try:
+        check_detection_params(params)
+        for band in (params.get('display_band'), params.get('break_indicator')):
+            if band is not None and band not in params['selected_bands']:
+                raise ValueError(f"'{band}' is not one of the selected bands {params['selected_bands']}")
+        if os.path.isdir(params['input_file']):
+            # 栅格堆栈：提取一个像元的时间序列，之后与表格输入相同
+            if args.pixel is None or args.command == 'batch':
+                raise ValueError("A GeoTIFF scene directory needs --pixel ROW COL and cannot be used with batch")
+            stack = RasterStack(params['input_file'])
+            try:
+                data = stack.extract(*params['pixel'])
+            finally:
+                stack.close()
+            check_columns(params, data)
+        else:
+            header = scan_table(params['input_file'], 0)
+            check_columns(params, header)
+            extra_columns = [args.id_column] if args.command == 'batch' else []
+            for column in extra_columns:
+                if column not in header.columns:
+                    raise ValueError(f"ID column '{column}' not found in the data file")
+            data = DATASET_CACHE.load(params['input_file'], input_columns(params, *extra_columns), compact=True)
+    except (ValueError, OSError, ImportError) as e:
+        parser.error(str(e))
+    
+    report = lambda percent, message: print(f"[{percent:3.0f}%] {message}", file=sys.stderr)
+    if args.command == 'update':
+        if params['method'] != 'S-CCD':
+            parser.error("update is only available for S-CCD")
+        state_path = args.state or nrt_state_path(params['input_file'], params.get('pixel'), args.out_dir)
+        result = update_nrt_state(params, prepare_inputs(params, data), state_path, report=report)
+        for warning in result['warnings'] + DETECTION_CACHE.pop_store_errors():
+            print(f"Warning: {warning}", file=sys.stderr)
+        print(format_timings(result['timings']), file=sys.stderr)
+        rec_cg = result['sccd_result'].rec_cg
+        new_breaks = rec_cg[len(result['previous'].rec_cg):] if result['previous'] is not None else rec_cg
+        format_day = lambda day: pd.Timestamp.fromordinal(int(day)).strftime('%Y-%m-%d')
+        print(json.dumps({
+            'state': result['state_path'],
+            'initialized': result['previous'] is None,
+            'new_observations': len(result['new_rows']),
+            'last_date': format_day(result['last_date']) if result['last_date'] else None,
+            'new_breaks': [format_day(day) for day in (new_breaks['t_break'] if len(new_breaks) else [])],
+        }, indent=2))
+        return 0
+    
+    if args.command == 'batch':
+        try:
+            summary = run_batch(params, args.out_dir, data=data, id_column=args.id_column, chunk_size=args.chunk_size, workers=args.workers, report=report)
+        except KeyboardInterrupt:
+            print("Interrupted; run the same command again to resume", file=sys.stderr)
+            return 130
+        print(json.dumps(summary, indent=2))
+        return 0
+    
+    compare = params.get('compare', False)
+    try:
+        result = detect_change(params, data, report=report, pool=comparison_pool() if compare else None)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        reset_comparison_pool()
+    for warning in result['warnings'] + DETECTION_CACHE.pop_store_errors():
+        print(f"Warning: {warning}", file=sys.stderr)
+    print(format_timings(result['timings']), file=sys.stderr)
+    
+    os.makedirs(args.out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(os.path.normpath(params['input_file'])))[0]
+    if params.get('pixel') is not None:
+        stem += "_pixel_{}_{}".format(*params['pixel'])
+    # S-CCD的结果随曲线方式变化，文件名中包含曲线方式，不同方式的输出互不覆盖
+    sccd_label = f"S-CCD_{params['fitting_curve']}"
+    if compare:
+        name = f"{stem}_compare_{params['fitting_curve']}"
+    else:
+        name = f"{stem}_COLD" if params['method'] == 'COLD' else f"{stem}_{sccd_label}_{params['output']}"
+    
+    if compare:
+        figsize = (12, 8)
+    else:
+        figsize = (11, 9) if params['method'] == 'S-CCD' and params['output'] == 'state_components' else (12, 5)
+    fig = Figure(figsize=figsize)
+    plot_change_detection(fig, params, result)
+    figure_path = os.path.join(args.out_dir, f"{name}.{args.format}")
+    fig.savefig(figure_path, dpi=args.dpi)
+    print(figure_path)
+    
+    # rec_cg与输出类型无关，断点表按方法（S-CCD还有曲线方式）命名
+    if compare:
+        tables = {'COLD': result['cold_result'], sccd_label: result['sccd_result'].rec_cg}
+    elif params['method'] == 'COLD':
+        tables = {'COLD': result['cold_result']}
+    else:
+        tables = {sccd_label: result['sccd_result'].rec_cg}
+    for label, rec_cg in tables.items():
+        table_path = os.path.join(args.out_dir, f"{stem}_{label}_breaks.csv")
+        break_table(rec_cg, params['selected_bands']).to_csv(table_path, index=False)
+        print(table_path)
+    if compare:
+        format_day = lambda day: None if day is None else pd.Timestamp.fromordinal(day).strftime('%Y-%m-%d')
+        matches = pd.DataFrame(
+            [(format_day(cold_day), format_day(sccd_day), difference) for cold_day, sccd_day, difference in result['matches']],
+            columns=['cold_break', 'sccd_break', 'difference_days']
+        )
+        matches_path = os.path.join(args.out_dir, f"{name}_matches.csv")
+        matches.to_csv(matches_path, index=False)
+        print(matches_path)
+    return 0
+
+
+def main(argv=None):
+    """不带参数时启动GUI，带子命令时以命令行方式运行"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv or HEADLESS:
+        return run_cli(argv)
+    # 检测结果保存到磁盘，重新打开程序后同一输入和参数直接读取
+    DETECTION_CACHE.store = ResultStore()
+    DETECTION_CACHE.write_in_background()
     root = tk.Tk()
     app = ChangeDetectionApp(root)
     root.mainloop()
 
 if __name__ == "__main__":
-
-    main()
+    # 打包为可执行文件时，后台工作进程需要freeze_support
+    multiprocessing.freeze_support()
+    sys.exit(main())
 
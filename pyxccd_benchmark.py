@@ -0,0 +1,270 @@
+"""
+Pyxccd GUI 性能基准。
+
+生成带已知断点、季节谐波和QA噪声的合成HLS/Landsat时间序列（与GUI读取的
+dates/波段/qa表格布局一致），对COLD和S-CCD的各种输出模式分阶段计时：
+读取、日期转换、输入准备、变化检测、曲线计算和绘图，结果写为JSON，
+便于比较不同版本之间的性能变化。
+
+    python pyxccd_benchmark.py --years 10 20 --bands 2 6 --output bench.json
+    python pyxccd_benchmark.py --output new.json --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# 基准测试不需要显示器：GUI模块按无界面方式导入（Agg后端，不导入tkinter）
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import numpy as np
+import pandas as pd
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import Pyxccd_GUI as gui
+
+# 观测间隔（天）：Landsat单星16天重访；HLS（Landsat + Sentinel-2）约3天
+PROFILES = {'landsat': 16, 'hls': 3}
+
+# 各方法/输出模式的基准用例（与GUI中的选项对应）
+CASES = [
+    {'method': 'COLD', 'output': 'breaks', 'fitting_curve': 'Lasso'},
+    {'method': 'S-CCD', 'output': 'breaks', 'fitting_curve': 'Lasso'},
+    {'method': 'S-CCD', 'output': 'breaks', 'fitting_curve': 'States'},
+    {'method': 'S-CCD', 'output': 'anomaly', 'fitting_curve': 'Lasso'},
+    {'method': 'S-CCD', 'output': 'anomaly', 'fitting_curve': 'States'},
+    {'method': 'S-CCD', 'output': 'state_components', 'fitting_curve': 'States'},
+]
+
+STAGES = ['load', 'dates', 'prepare', 'detection', 'curves', 'render']
+
+
+def synthetic_series(n_years=10, n_bands=2, n_breaks=1, profile='landsat', cloud_fraction=0.3, seed=0):
+    """
+    生成一条合成时间序列，返回(DataFrame, 断点序数日期列表)。
+
+    每个波段为年/半年谐波加噪声，在断点处整体跳变；被云覆盖的观测qa为4且反射率偏高，
+    晴空观测qa为0。日期列为'%m/%d/%Y'字符串，与常见的导出表格一致。
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2000-01-01').toordinal()
+    ordinals = np.arange(start, start + int(n_years * 365.25), PROFILES[profile])
+    t = (ordinals - start) / 365.25
+
+    # 断点均匀分布在序列中部，两端各留出1.5年用于模型初始化
+    margin = 1.5 * 365.25
+    break_days = np.linspace(start + margin, ordinals[-1] - margin, n_breaks + 2)[1:-1].astype(int) if n_breaks else np.empty(0, dtype=int)
+    segment = np.searchsorted(break_days, ordinals, side='right')
+
+    columns = {'date': pd.to_datetime(ordinals - gui.UNIX_EPOCH_ORDINAL, unit='D').strftime('%m/%d/%Y')}
+    cloudy = rng.random(len(ordinals)) < cloud_fraction
+    for b in range(n_bands):
+        level = 500 + 300 * b + 600 * (segment % 2)
+        seasonal = 200 * np.sin(2 * np.pi * t + b) + 50 * np.cos(4 * np.pi * t)
+        values = level + seasonal + rng.normal(0, 30, len(ordinals)) + 2000 * cloudy
+        columns[f'b{b + 1}'] = np.clip(values, 0, 10000).astype(np.int64)
+    columns['qa'] = np.where(cloudy, 4, 0)
+    return pd.DataFrame(columns), break_days.tolist()
+
+
+def case_params(case, path, n_bands):
+    """构造与GUI相同的参数字典"""
+    bands = [f'b{b + 1}' for b in range(n_bands)]
+    return dict(
+        case,
+        input_file=path,
+        date_column='date',
+        qa_column='qa',
+        selected_bands=bands,
+        display_band=bands[0],
+        break_indicator=bands[0],
+        P_CG='0.99',
+        CONSE='6',
+        Lam='20',
+        trimodal=True,
+        render_mode='fast',
+    )
+
+
+def evaluate_curves(params, result):
+    """曲线计算阶段：只计算显示波段的模型曲线，不绘图"""
+    band_index = params['selected_bands'].index(params['display_band'])
+    if params['method'] == 'COLD':
+        cold_result = result['cold_result']
+        return gui.evaluate_harmonic_segments(cold_result['t_start'], cold_result['t_end'], cold_result['coefs'], band_index)
+    t_start, t_end, coefs = gui.sccd_fit_segments(result['sccd_result'])
+    return gui.evaluate_harmonic_segments(t_start, t_end, coefs, band_index, n_coefs=coefs.shape[-1])
+
+
+def run_case(params, repeat=3):
+    """对一个用例重复repeat次，返回各阶段耗时列表以及最后一次的检测结果"""
+    timings = {stage: [] for stage in STAGES}
+    fig = Figure(figsize=(11, 9) if params['output'] == 'state_components' else (12, 5))
+    FigureCanvasAgg(fig)
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = gui.read_table(params['input_file'])
+        timings['load'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        gui.check_and_convert_dates(data[params['date_column']].values)
+        timings['dates'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        inputs = gui.prepare_inputs(params, data)
+        timings['prepare'].append(time.perf_counter() - start)
+
+        # 每次使用新的缓存，计时的是实际的检测调用
+        start = time.perf_counter()
+        result = gui.detect_change(dict(params), inputs=inputs, cache=gui.DetectionCache())
+        timings['detection'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        evaluate_curves(params, result)
+        timings['curves'].append(time.perf_counter() - start)
+
+        # 绘图包含曲线计算、断点和观测点的绘制以及Agg栅格化
+        start = time.perf_counter()
+        gui.plot_change_detection(fig, params, result)
+        fig.canvas.draw()
+        timings['render'].append(time.perf_counter() - start)
+    return timings, result
+
+
+def detected_breaks(params, result):
+    """检测到的断点序数日期"""
+    if params['method'] == 'COLD':
+        rec_cg = result['cold_result']
+        rec_cg = rec_cg[rec_cg['change_prob'] == 100]
+    else:
+        rec_cg = result['sccd_result'].rec_cg
+    if len(rec_cg) == 0:
+        return []
+    return rec_cg['t_break'][rec_cg['t_break'] > 0].tolist()
+
+
+def matched_breaks(true_breaks, found, tolerance=64):
+    """在tolerance天内找到对应检测断点的真实断点数量"""
+    return sum(any(abs(day - other) <= tolerance for other in found) for day in true_breaks)
+
+
+def environment():
+    """记录运行环境和版本，便于比较不同版本的结果"""
+    import pyxccd
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'matplotlib': matplotlib.__version__,
+        'pyxccd': getattr(pyxccd, '__version__', None),
+    }
+
+
+def run_benchmark(years, bands, breaks, profiles, repeat=3, cases=CASES, report=print):
+    """运行全部配置组合，返回可写为JSON的结果字典"""
+    records = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for profile in profiles:
+            for n_years in years:
+                for n_bands in bands:
+                    for n_breaks in breaks:
+                        data, true_breaks = synthetic_series(n_years, n_bands, n_breaks, profile)
+                        path = os.path.join(tmp_dir, f"{profile}_{n_years}y_{n_bands}b_{n_breaks}k.csv")
+                        data.to_csv(path, index=False)
+                        for case in cases:
+                            params = case_params(case, path, n_bands)
+                            timings, result = run_case(params, repeat)
+                            found = detected_breaks(params, result)
+                            record = {
+                                'profile': profile,
+                                'years': n_years,
+                                'bands': n_bands,
+                                'true_breaks': n_breaks,
+                                'n_obs': len(data),
+                                **case,
+                                'detected_breaks': len(found),
+                                'matched_breaks': matched_breaks(true_breaks, found),
+                                'stages': {
+                                    stage: {'min': min(values), 'median': statistics.median(values)}
+                                    for stage, values in timings.items()
+                                },
+                            }
+                            records.append(record)
+                            total = sum(stage['median'] for stage in record['stages'].values())
+                            report(f"{case_label(record)}: {total * 1000:.1f} ms")
+    return {'environment': environment(), 'repeat': repeat, 'results': records}
+
+
+def case_label(record):
+    """用例的可读名称，也用作与基线结果比较时的键"""
+    curve = f"/{record['fitting_curve']}" if record['method'] == 'S-CCD' else ""
+    return (f"{record['profile']} {record['years']}y {record['bands']}b {record['true_breaks']}k "
+            f"{record['method']} {record['output']}{curve}")
+
+
+def compare(current, baseline, threshold=1.2):
+    """按用例和阶段比较中位耗时，返回超过threshold倍的变慢项"""
+    previous = {case_label(record): record['stages'] for record in baseline['results']}
+    regressions = []
+    for record in current['results']:
+        old = previous.get(case_label(record))
+        if old is None:
+            continue
+        for stage, values in record['stages'].items():
+            if stage in old and old[stage]['median'] > 0:
+                ratio = values['median'] / old[stage]['median']
+                if ratio > threshold:
+                    regressions.append((case_label(record), stage, old[stage]['median'], values['median'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Pyxccd GUI pipeline on synthetic time series.")
+    parser.add_argument('--years', type=int, nargs='+', default=[10, 20])
+    parser.add_argument('--bands', type=int, nargs='+', default=[2, 6])
+    parser.add_argument('--breaks', type=int, nargs='+', default=[1])
+    parser.add_argument('--profile', nargs='+', choices=sorted(PROFILES), default=['landsat', 'hls'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default="benchmark.json", help="JSON file for the results")
+    parser.add_argument('--baseline', default=None, help="Earlier results to compare against")
+    parser.add_argument('--threshold', type=float, default=1.2, help="Slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.years, args.bands, args.breaks, args.profile, args.repeat)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for label, stage, old, new, ratio in regressions:
+            print(f"SLOWER {label} [{stage}]: {old * 1000:.1f} ms -> {new * 1000:.1f} ms ({ratio:.2f}x)")
+        if regressions:
+            return 1
+        print("No regressions above the threshold")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import os
+import sys
+
+# 以模块方式导入Pyxccd_GUI：使用Agg后端、不导入tkinter
+os.environ.setdefault('MPLBACKEND', 'Agg')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import Pyxccd_GUI as gui
+from pyxccd_benchmark import synthetic_series
+
+gui.import_scientific_modules()
+
+
+@pytest.fixture
+def series_csv(tmp_path):
+    """写出一条合成时间序列，返回(路径, DataFrame, 断点序数日期列表)"""
+    data, breaks = synthetic_series(n_years=12, n_bands=2, n_breaks=1, seed=1)
+    path = tmp_path / 'series.csv'
+    data.to_csv(path, index=False)
+    return str(path), data, breaks
+
+
+@pytest.fixture
+def base_params():
+    """与GUI收集的参数字典相同，input_file由测试填写"""
+    return dict(
+        input_file=None,
+        date_column='date',
+        qa_column='qa',
+        selected_bands=['b1', 'b2'],
+        display_band='b1',
+        break_indicator='b1',
+        method='S-CCD',
+        output='breaks',
+        fitting_curve='Lasso',
+        P_CG='0.99',
+        CONSE='6',
+        Lam='20',
+        trimodal=True,
+        render_mode='fast',
+    )
+
+
+@pytest.fixture
+def prepared_inputs(series_csv, base_params):
+    """合成序列的检测输入（prepare_inputs的结果）"""
+    path, data, _ = series_csv
+    return gui.prepare_inputs(dict(base_params, input_file=path), data)
+
+
+@pytest.fixture
+def detections(prepared_inputs, base_params):
+    """各种检测调用的输出：{'COLD'或SCCD_VARIANTS的名称: 输出}"""
+    inputs = prepared_inputs
+    cache = gui.DetectionCache()
+    outputs = {'COLD': cache.detect('COLD', inputs['dates'], inputs['merge'], inputs['qa'], **gui.detection_options(dict(base_params, method='COLD')))[1]}
+    for label, (extra, _) in gui.SCCD_VARIANTS.items():
+        options = dict(gui.detection_options(base_params), **extra)
+        outputs[label] = cache.detect('S-CCD', inputs['dates'], inputs['merge'], inputs['qa'], **options)[1]
+    return outputs
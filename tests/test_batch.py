@@ -0,0 +1,85 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Pyxccd_GUI as gui
+from pyxccd_benchmark import synthetic_series
+
+
+def batch_table(n_breaks):
+    """按n_breaks中的断点数各生成一条像元序列，拼成带pixel_id列的长表"""
+    frames = []
+    for pixel_id, count in enumerate(n_breaks):
+        data, _ = synthetic_series(n_years=12, n_bands=2, n_breaks=count, seed=pixel_id)
+        frames.append(data.assign(pixel_id=pixel_id))
+    return pd.concat(frames, ignore_index=True)
+
+
+def chunk_inputs(data, bands=('b1', 'b2')):
+    """与run_batch相同的排序切分，返回_detect_batch_chunk的数据参数"""
+    dates = gui.check_and_convert_dates(data['date'].values)
+    merge = np.stack([data[b].values for b in bands], axis=1)
+    order, pixel_ids, bounds = gui.split_series(data['pixel_id'].values, dates)
+    return pixel_ids, bounds, dates[order], merge[order], data['qa'].values[order]
+
+
+@pytest.mark.parametrize('n_breaks, expected', [((1, 0, 1), {0, 2}), ((0, 0), set())])
+def test_sccd_chunk_skips_pixels_without_breaks(base_params, n_breaks, expected):
+    options = gui.detection_options(base_params)
+    table, failed = gui._detect_batch_chunk('S-CCD', options, ['b1', 'b2'], *chunk_inputs(batch_table(n_breaks)))
+    assert failed == {}
+    if expected:
+        assert set(table['pixel_id']) == expected
+        assert len(table) >= len(expected)
+    else:
+        assert table is None
+
+
+def test_run_batch_mixed_chunk(tmp_path, base_params):
+    path = tmp_path / 'batch.csv'
+    batch_table((1, 0, 0, 1, 0)).to_csv(path, index=False)
+    params = dict(base_params, input_file=str(path))
+    out = tmp_path / 'out'
+    summary = gui.run_batch(params, str(out), chunk_size=2, workers=1)
+    assert summary['completed_chunks'] == summary['n_chunks'] == 3
+    assert summary['failed_pixels'] == 0
+    # 第二组（像元2、3）含无断点像元，第三组（像元4）全部无断点
+    parts = sorted(name for name in os.listdir(out) if name.endswith('.parquet'))
+    assert parts == ['part-000000.parquet', 'part-000001.parquet']
+    table = pd.concat([pd.read_parquet(out / name) for name in parts])
+    assert set(table['pixel_id']) == {0, 3}
+    with open(out / gui.BATCH_MANIFEST, encoding='utf-8') as f:
+        assert sorted(json.load(f)['completed']) == [0, 1, 2]
+
+
+def read_parts(directory):
+    parts = sorted(name for name in os.listdir(directory) if name.endswith('.parquet'))
+    return pd.concat([pd.read_parquet(directory / name) for name in parts], ignore_index=True)
+
+
+def test_run_batch_resumes_from_manifest(tmp_path, base_params):
+    path = tmp_path / 'batch.csv'
+    batch_table((1, 1, 0, 1, 1, 1)).to_csv(path, index=False)
+    params = dict(base_params, input_file=str(path))
+    
+    out = tmp_path / 'out'
+    first = gui.run_batch(params, str(out), chunk_size=1, workers=1, should_stop=lambda: True)
+    assert first['stopped'] and 0 < first['completed_chunks'] < first['n_chunks'] == 6
+    second = gui.run_batch(params, str(out), chunk_size=1, workers=1)
+    assert not second['stopped']
+    assert second['resumed_chunks'] == first['completed_chunks']
+    assert second['completed_chunks'] == 6
+    with open(out / gui.BATCH_MANIFEST, encoding='utf-8') as f:
+        assert sorted(json.load(f)['completed']) == list(range(6))
+    
+    # 续跑的结果与一次完成的结果相同
+    full = tmp_path / 'full'
+    gui.run_batch(params, str(full), chunk_size=1, workers=1)
+    pd.testing.assert_frame_equal(read_parts(out), read_parts(full))
+    
+    # 参数不同时不能在同一目录续跑
+    with pytest.raises(ValueError, match="different batch run"):
+        gui.run_batch(dict(params, CONSE='4'), str(out), chunk_size=1, workers=1)
@@ -0,0 +1,22 @@
+import os
+
+import Pyxccd_GUI as gui
+
+
+def test_no_arguments_prints_help(capsys):
+    assert gui.run_cli([]) == 0
+    assert capsys.readouterr().out.startswith("usage:")
+
+
+def test_run_names_outputs_by_fitting_curve(tmp_path, series_csv):
+    path, _, _ = series_csv
+    out = tmp_path / 'out'
+    for curve in ('Lasso', 'States'):
+        gui.run_cli([
+            'run', '--input', path, '--date-column', 'date', '--qa-column', 'qa', '--bands', 'b1', 'b2',
+            '--method', 'S-CCD', '--fitting-curve', curve, '--out-dir', str(out), '--no-store',
+        ])
+    assert sorted(os.listdir(out)) == [
+        'series_S-CCD_Lasso_breaks.csv', 'series_S-CCD_Lasso_breaks.png',
+        'series_S-CCD_States_breaks.csv', 'series_S-CCD_States_breaks.png',
+    ]
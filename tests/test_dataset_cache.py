@@ -0,0 +1,38 @@
+import os
+
+import Pyxccd_GUI as gui
+
+
+def test_unchanged_file_is_not_read_again(series_csv):
+    path, data, _ = series_csv
+    cache = gui.DatasetCache()
+    first = cache.load(path)
+    assert cache.load(path) is first
+    assert list(first.columns) == list(data.columns)
+    # 已缓存的全部列包含所需的列时直接从中选取
+    subset = cache.load(path, ['date', 'b1'])
+    assert list(subset.columns) == ['date', 'b1'] and subset['b1'].equals(first['b1'])
+
+
+def test_changed_mtime_invalidates(series_csv):
+    path, _, _ = series_csv
+    cache = gui.DatasetCache()
+    first = cache.load(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    second = cache.load(path)
+    assert second is not first and second.equals(first)
+    # 旧版本的缓存项已删除
+    assert len(cache._items) == 1
+
+
+def test_changed_size_invalidates(series_csv):
+    path, data, _ = series_csv
+    cache = gui.DatasetCache()
+    first = cache.load(path)
+    stat = os.stat(path)
+    data.iloc[:10].to_csv(path, index=False)
+    # 保持修改时间不变，只有文件大小不同
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    second = cache.load(path)
+    assert second is not first and len(second) == 10
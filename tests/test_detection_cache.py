@@ -0,0 +1,70 @@
+import numpy as np
+
+import Pyxccd_GUI as gui
+
+
+def test_lru_eviction_by_size():
+    cache = gui.DetectionCache(max_bytes=3000)
+    for key in 'abc':
+        cache.put(key, np.zeros(100))
+    assert cache.nbytes == 2400
+    # 读取a使其成为最近使用的结果，加入d时b被淘汰
+    assert cache.get('a') is not None
+    cache.put('d', np.zeros(100))
+    assert [key for key in 'abcd' if key in cache] == ['a', 'c', 'd']
+    assert cache.get('b') is None
+    assert cache.nbytes <= cache.max_bytes
+
+
+def test_oversized_result_is_not_kept():
+    cache = gui.DetectionCache(max_bytes=1000)
+    cache.put('small', np.zeros(10))
+    cache.put('big', np.zeros(1000))
+    assert 'big' not in cache and 'small' in cache
+
+
+def test_store_backs_evicted_results(tmp_path):
+    cache = gui.DetectionCache(max_bytes=1000, store=gui.ResultStore(str(tmp_path)))
+    cache.put('a', np.arange(100.0))
+    cache.put('b', np.arange(100.0) + 1)
+    assert 'a' not in cache._items and 'a' in cache
+    assert cache.cached_keys(['a', 'b', 'c']) == {'a', 'b'}
+    # 内存中没有的结果从store读取并重新放入内存
+    assert np.array_equal(cache.get('a'), np.arange(100.0))
+    assert 'a' in cache._items
+    cache.clear()
+    assert cache.nbytes == 0 and np.array_equal(cache.get('b'), np.arange(100.0) + 1)
+
+
+def test_detect_reuses_cached_output(prepared_inputs, base_params):
+    cache = gui.DetectionCache()
+    options = gui.detection_options(base_params)
+    arrays = prepared_inputs['dates'], prepared_inputs['merge'], prepared_inputs['qa']
+    key, output = cache.detect('S-CCD', *arrays, **options)
+    assert key == gui.detection_key('S-CCD', *arrays, **options)
+    assert cache.detect('S-CCD', *arrays, **options)[1] is output
+    assert cache.detect('S-CCD', *arrays, **dict(options, conse=4))[0] != key
+
+
+def test_store_failure_is_reported_not_raised(tmp_path):
+    blocker = tmp_path / 'blocker'
+    blocker.write_text('')
+    # store目录是一个文件，无法保存；结果仍在内存中
+    cache = gui.DetectionCache(store=gui.ResultStore(str(blocker)))
+    cache.put('a', np.zeros(10))
+    assert np.array_equal(cache.get('a'), np.zeros(10))
+    errors = cache.pop_store_errors()
+    assert len(errors) == 1 and str(blocker) in errors[0]
+    assert cache.pop_store_errors() == []
+
+
+def test_background_writes(tmp_path):
+    store = gui.ResultStore(str(tmp_path / 'results'))
+    cache = gui.DetectionCache(store=store)
+    cache.write_in_background()
+    cache.put('a', np.arange(10.0))
+    # put只放入内存，写入由后台线程完成
+    assert np.array_equal(cache.get('a'), np.arange(10.0))
+    cache.flush()
+    assert cache.pending_writes == 0 and 'a' in store
+    assert np.array_equal(store.get('a'), np.arange(10.0))
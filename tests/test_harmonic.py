@@ -0,0 +1,44 @@
+import math
+
+import numpy as np
+import pytest
+
+import Pyxccd_GUI as gui
+
+
+def scalar_model(coefs, day, n_coefs):
+    """逐日计算的谐波模型（pyxccd的系数约定）"""
+    w = 2 * math.pi / 365.25
+    value = coefs[0] + coefs[1] * day / 10000
+    for k in range(1, n_coefs // 2):
+        value += coefs[2 * k] * math.cos(k * w * day) + coefs[2 * k + 1] * math.sin(k * w * day)
+    return value
+
+
+def test_harmonic_basis_rows():
+    basis = gui.harmonic_basis(730000, 5)
+    assert basis.shape == (5, 8) and not basis.flags.writeable
+    for i, row in enumerate(basis):
+        coefs = np.eye(8)
+        assert np.allclose(row, [scalar_model(c, 730000 + i, 8) for c in coefs])
+    assert gui.harmonic_basis(730000, 5) is basis
+
+
+@pytest.mark.parametrize('n_coefs', [6, 8])
+def test_evaluate_harmonic_segments_matches_scalar_formula(n_coefs):
+    rng = np.random.default_rng(0)
+    t_start = np.array([730000, 731000, 731500, 732000])
+    t_end = np.array([730400, 731200, 731499, 732000])  # 第3段为空，第4段只有一天
+    coefs = rng.normal(size=(4, 2, 8)) * [1000, 10, 100, 100, 50, 50, 20, 20]
+    days, predicted, bounds = gui.evaluate_harmonic_segments(t_start, t_end, coefs, 1, n_coefs=n_coefs)
+    assert list(np.diff(bounds)) == [401, 201, 0, 1]
+    for i in range(4):
+        segment = slice(bounds[i], bounds[i + 1])
+        assert np.array_equal(days[segment], np.arange(t_start[i], t_end[i] + 1))
+        expected = [scalar_model(coefs[i, 1], day, n_coefs) for day in days[segment]]
+        assert np.allclose(predicted[segment], expected, rtol=1e-10, atol=1e-6)
+
+
+def test_evaluate_harmonic_segments_without_days():
+    days, predicted, bounds = gui.evaluate_harmonic_segments([], [], np.zeros((0, 1, 8)), 0)
+    assert len(days) == len(predicted) == 0 and list(bounds) == [0]
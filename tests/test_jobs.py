@@ -0,0 +1,41 @@
+import time
+
+import Pyxccd_GUI as gui
+
+
+def slow_job(seconds, report=None):
+    time.sleep(seconds)
+
+
+def wait_for(executor, kinds, timeout=60):
+    """轮询执行器直到出现kinds中的事件，返回期间的全部事件"""
+    events = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        events += executor.poll()
+        if any(event[0] in kinds for event in events):
+            return events
+        time.sleep(0.05)
+    raise AssertionError(f"no {kinds} event within {timeout} s: {events}")
+
+
+def test_cancel_all_terminates_running_and_clears_queue(series_csv, base_params):
+    executor = gui.JobExecutor()
+    try:
+        job_ids = [executor.submit(slow_job, 60) for _ in range(3)]
+        assert executor.running_job == job_ids[0] and executor.pending_count == 2
+        process = executor._process
+        
+        assert executor.cancel_all() == 3
+        assert not executor.is_busy()
+        assert not process.is_alive()
+        cancelled = [event[1] for event in executor.poll() if event[0] == 'cancelled']
+        assert sorted(cancelled) == job_ids
+        assert executor.cancel_all() == 0
+        
+        # 之后提交的任务在新的工作进程中正常运行
+        job_id = executor.submit(gui.detect_change, dict(base_params, input_file=series_csv[0]))
+        events = wait_for(executor, ('done', 'error'))
+        assert [event[:2] for event in events if event[0] in ('done', 'error')] == [('done', job_id)]
+    finally:
+        executor.shutdown()
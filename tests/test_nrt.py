@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+
+import Pyxccd_GUI as gui
+
+
+def test_update_nrt_state_processes_only_new_rows(tmp_path, series_csv, base_params):
+    path, data, breaks = series_csv
+    params = dict(base_params, input_file=str(tmp_path / 'nrt.csv'))
+    state_path = gui.nrt_state_path(params['input_file'])
+    cache = gui.DetectionCache()
+    
+    # 第一次只有断点之前的观测：建立状态
+    n_initial = int(np.searchsorted(gui.check_and_convert_dates(data['date'].values), breaks[0])) - 50
+    progress = []
+    report = lambda percent, message: progress.append(percent)
+    result = gui.update_nrt_state(params, gui.prepare_inputs(params, data.iloc[:n_initial]), cache=cache, report=report)
+    assert result['previous'] is None and len(result['new_rows']) == n_initial
+    # 建立状态的检测结果随结果返回，GUI把它加入自己的缓存
+    assert list(result['detections'].values()) == [result['sccd_result']]
+    assert progress == sorted(progress) and progress[-1] == 100
+    assert result['state_path'] == state_path and os.path.exists(state_path)
+    assert len(result['sccd_result'].rec_cg) == 0
+    
+    # 追加的观测分两次增量处理
+    for stop in ((n_initial + len(data)) // 2, len(data)):
+        since = result['last_date']
+        inputs = gui.prepare_inputs(params, data.iloc[:stop])
+        result = gui.update_nrt_state(params, inputs, cache=cache)
+        assert result['previous'] is not None and result['since'] == since and result['detections'] == {}
+        assert len(result['new_rows']) == int(np.sum(inputs['dates'] > since)) > 0
+        assert result['timings'][0][0].startswith("sccd_update_flex")
+        assert result['last_date'] == int(inputs['dates'].max())
+    
+    # 断点与对整个序列一次检测的结果相同
+    full = gui.DetectionCache().detect('S-CCD', inputs['dates'], inputs['merge'], inputs['qa'], **gui.detection_options(params))[1]
+    assert len(full.rec_cg) == 1
+    assert np.array_equal(result['sccd_result'].rec_cg['t_break'], full.rec_cg['t_break'])
+    
+    # 没有新观测时状态不变
+    again = gui.update_nrt_state(params, inputs, cache=cache)
+    assert len(again['new_rows']) == 0 and again['last_date'] == result['last_date']
+
+
+def test_update_nrt_state_rebuilds_after_parameter_change(tmp_path, series_csv, base_params):
+    path, data, _ = series_csv
+    params = dict(base_params, input_file=path)
+    state_path = str(tmp_path / 'state.npz')
+    inputs = gui.prepare_inputs(params, data)
+    assert gui.update_nrt_state(params, inputs, state_path, cache=gui.DetectionCache())['previous'] is None
+    assert gui.update_nrt_state(params, inputs, state_path, cache=gui.DetectionCache())['previous'] is not None
+    changed = dict(params, CONSE='4')
+    assert gui.update_nrt_state(changed, inputs, state_path, cache=gui.DetectionCache())['previous'] is None
+
+
+def test_raster_state_stays_out_of_the_scene_directory(tmp_path):
+    stack = str(tmp_path / 'scenes')
+    path = gui.nrt_state_path(stack, (5, 7))
+    assert os.path.dirname(path) == gui.NRT_STATE_DIR
+    assert os.path.basename(path).endswith("_pixel_5_7" + gui.NRT_STATE_SUFFIX)
+    assert gui.nrt_state_path(stack, (5, 7), str(tmp_path / 'out')).startswith(str(tmp_path / 'out'))
+    # 不同堆栈的同一像元不会共用状态文件
+    assert gui.nrt_state_path(str(tmp_path / 'other' / 'scenes'), (5, 7)) != path
@@ -0,0 +1,41 @@
+import Pyxccd_GUI as gui
+
+
+def labels(plan):
+    return [(step.label, step.cached) for step in plan]
+
+
+def test_plan_uses_the_minimal_calls(prepared_inputs, base_params):
+    cache = gui.DetectionCache()
+    plan = lambda **changes: labels(gui.plan_detection(dict(base_params, **changes), prepared_inputs, cache))
+    assert plan(method='COLD') == [('COLD', False)]
+    assert plan() == [('S-CCD (breaks)', False)]
+    assert plan(output='anomaly') == [('S-CCD (anomaly)', False)]
+    assert plan(output='state_components') == [('S-CCD (states)', False)]
+    assert plan(output='anomaly', fitting_curve='States') == [('S-CCD (anomaly)', False), ('S-CCD (states)', False)]
+    assert plan(compare=True) == [('COLD', False), ('S-CCD (breaks)', False)]
+
+
+def test_plan_reuses_any_cached_call_for_breaks(prepared_inputs, base_params):
+    cache = gui.DetectionCache()
+    gui.detect_change(dict(base_params, output='anomaly'), inputs=prepared_inputs, cache=cache)
+    plan = gui.plan_detection(base_params, prepared_inputs, cache)
+    assert labels(plan) == [('S-CCD (anomaly)', True)]
+    assert gui.is_detection_cached(base_params, prepared_inputs, cache)
+    # 检测参数不同的调用不能复用
+    assert not gui.is_detection_cached(dict(base_params, CONSE='4'), prepared_inputs, cache)
+
+
+def test_plan_queries_the_store_once(tmp_path, monkeypatch, prepared_inputs, base_params):
+    store = gui.ResultStore(str(tmp_path))
+    calls = []
+    existing = store.existing
+    monkeypatch.setattr(store, 'existing', lambda keys: calls.append(list(keys)) or existing(keys))
+    cache = gui.DetectionCache(store=store)
+    gui.detect_change(dict(base_params, compare=True), inputs=prepared_inputs, cache=cache)
+    cache.clear()
+    calls.clear()
+    plan = gui.plan_detection(dict(base_params, compare=True), prepared_inputs, cache)
+    assert labels(plan) == [('COLD', True), ('S-CCD (breaks)', True)]
+    # COLD和S-CCD的全部4个候选调用合并为一次查询
+    assert len(calls) == 1 and len(calls[0]) == 4
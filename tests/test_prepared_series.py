@@ -0,0 +1,78 @@
+import datetime
+
+import matplotlib.dates as mdates
+import numpy as np
+
+import Pyxccd_GUI as gui
+
+
+def make_series():
+    dates = np.array([730010, 730000, 730020, 730030, 730040, 730050])
+    merge = np.array([[100, 200], [150, 250], [-5, 300], [400, 20000], [500, 600], [700, 800]])
+    qa = np.array([0, 1, 0, 0, 4, 0])
+    return gui.PreparedSeries(dates, merge, qa, ['red', 'nir'])
+
+
+def test_smallest_int_dtype():
+    assert gui.smallest_int_dtype(np.array([0, 10000])) == np.int16
+    assert gui.smallest_int_dtype(np.array([0, 800000])) == np.int32
+    assert gui.smallest_int_dtype(np.array([0, 2 ** 40])) == np.int64
+    assert gui.smallest_int_dtype(np.array([0.5, 1.0])) == np.float64
+    assert gui.smallest_int_dtype(np.array([], dtype=np.int64)) == np.int64
+
+
+def test_compact_dtypes_and_masks():
+    series = make_series()
+    assert series.dates.dtype == np.int32
+    assert series.merge.dtype == np.int16 and series.merge.flags.c_contiguous
+    assert series.qa.dtype == np.int16
+    # 负值和超过10000的观测无效，qa为4的观测有效但不是clean
+    assert series.valid.tolist() == [True, True, False, False, True, True]
+    assert series.clean.tolist() == [True, True, False, False, False, True]
+
+
+def test_float_masks_drop_nan():
+    merge = np.array([[100.0, 200.0], [np.nan, 250.0], [300.0, 400.0]])
+    series = gui.PreparedSeries([730000, 730001, 730002], merge, np.array([0.0, 0.0, np.nan]))
+    assert series.band_names == ['b0', 'b1']
+    assert series.valid.tolist() == [True, False, False]
+
+
+def test_quantiles_and_ylim():
+    series = make_series()
+    clean = series.merge[series.clean]
+    expected = np.quantile(clean, [0.01, 0.99], axis=0)
+    np.testing.assert_allclose(series.quantiles, expected)
+    q01, q99 = expected[:, 1]
+    low, high = series.ylim(1)
+    assert np.isclose(low, q01 - 0.4 * (q99 - q01)) and np.isclose(high, q99 + 0.4 * (q99 - q01))
+    clear = np.quantile(series.merge[series.clean & (series.qa == 0)], [0.01, 0.99], axis=0)
+    np.testing.assert_allclose(series.clear_quantiles, clear)
+
+
+def test_quantiles_without_clean_observations():
+    series = gui.PreparedSeries([730000], [[100, 200]], [4])
+    assert np.isnan(series.quantiles).all() and series.quantiles.shape == (2, 2)
+
+
+def test_locate_and_band():
+    series = make_series()
+    np.testing.assert_array_equal(series.locate([730000, 730030, 730005, 730100]), [1, 3, -1, -1])
+    assert series.locate(730010) == 0
+    np.testing.assert_array_equal(series.dates[series.date_order], np.sort(series.dates))
+    np.testing.assert_array_equal(series.band('nir'), [200, 250, 300, 20000, 600, 800])
+    empty = gui.PreparedSeries(np.array([], dtype=np.int64), np.empty((0, 2), dtype=np.int64), np.array([], dtype=np.int64))
+    np.testing.assert_array_equal(empty.locate([730000]), [-1])
+
+
+def test_datenums_match_date2num():
+    series = make_series()
+    expected = [mdates.date2num(datetime.date.fromordinal(int(day))) for day in series.dates]
+    np.testing.assert_allclose(series.datenums, expected)
+
+
+def test_from_array_drops_nonfinite_rows():
+    data = np.array([[730000, 100, 200, 0], [730001, np.nan, 200, 0], [730002, 300, 400, 1]], dtype=float)
+    series = gui.PreparedSeries.from_array(data, ['red', 'nir'])
+    assert series.dates.tolist() == [730000, 730002]
+    assert series.merge.dtype == np.int16 and series.qa.tolist() == [0, 1]
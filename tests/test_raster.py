@@ -0,0 +1,15 @@
+import pytest
+
+import Pyxccd_GUI as gui
+
+resource = pytest.importorskip('resource')
+
+
+def test_handle_limit_reads_but_does_not_raise_the_soft_limit():
+    before = resource.getrlimit(resource.RLIMIT_NOFILE)
+    soft = before[0]
+    if soft == resource.RLIM_INFINITY:
+        assert gui.raster_handle_limit(10 ** 6) == 10 ** 6
+    else:
+        assert gui.raster_handle_limit(soft) == max(1, soft - gui.RASTER_RESERVED_FILES)
+    assert resource.getrlimit(resource.RLIMIT_NOFILE) == before
@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Pyxccd_GUI as gui
+
+
+def assert_same_output(actual, expected):
+    """逐部分比较两个检测输出（数组按dtype和字节比较，namedtuple逐字段比较）"""
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(actual, expected)
+    elif hasattr(expected, '_fields'):
+        assert type(actual) is type(expected)
+        for name in expected._fields:
+            assert_same_output(getattr(actual, name), getattr(expected, name))
+    elif isinstance(expected, tuple):
+        assert isinstance(actual, tuple) and len(actual) == len(expected)
+        for a, e in zip(actual, expected):
+            assert_same_output(a, e)
+    elif isinstance(expected, (np.ndarray, np.void)):
+        assert actual.dtype == expected.dtype and actual.shape == expected.shape
+        # 结构化数组逐字段比较：对齐的dtype中填充字节的内容不确定
+        for name in expected.dtype.names or ():
+            assert_same_output(np.asarray(actual[name]), np.asarray(expected[name]))
+        if expected.dtype.names is None:
+            assert actual.tobytes() == expected.tobytes()
+    else:
+        assert type(actual) is type(expected) and actual == expected
+
+
+@pytest.mark.parametrize('variant', ['COLD', 'breaks', 'anomaly', 'states'])
+def test_pack_unpack_round_trip(detections, variant):
+    output = detections[variant]
+    layout, arrays, frames = gui.pack_output(output)
+    assert all(isinstance(array, np.ndarray) and array.dtype != object for array in arrays.values())
+    assert_same_output(gui.unpack_output(layout, arrays, frames), output)
+
+
+@pytest.mark.parametrize('variant', ['COLD', 'breaks', 'anomaly', 'states'])
+def test_result_store_round_trip(tmp_path, detections, variant):
+    store = gui.ResultStore(str(tmp_path / 'results'))
+    assert 'key' not in store and store.get('key') is None
+    store.put('key', detections[variant])
+    assert 'key' in store
+    assert store.existing(['key', 'other']) == {'key'}
+    # 新的ResultStore对象（相当于重新启动程序）读取同一目录
+    assert_same_output(gui.ResultStore(str(tmp_path / 'results')).get('key'), detections[variant])
+
+
+def test_result_store_size_cap(tmp_path, detections):
+    directory = str(tmp_path / 'results')
+    probe = gui.ResultStore(directory)
+    probe.put('probe', detections['breaks'])
+    size = probe.nbytes
+    probe.remove('probe')
+    assert probe.nbytes == 0 and os.listdir(directory) == ['results.sqlite']
+    
+    store = gui.ResultStore(directory, max_bytes=int(2.5 * size))
+    for key in ('a', 'b'):
+        store.put(key, detections['breaks'])
+    # 读取a使其成为最近访问的结果，加入c时b被删除
+    assert store.get('a') is not None
+    store.put('c', detections['breaks'])
+    assert store.existing(['a', 'b', 'c']) == {'a', 'c'}
+    assert store.nbytes <= store.max_bytes
+    assert sorted(os.listdir(directory)) == ['a.npz', 'c.npz', 'results.sqlite']
+    
+    # 超过上限的单个结果不保存
+    gui.ResultStore(directory, max_bytes=size - 1).put('big', detections['breaks'])
+    assert 'big' not in store and not os.path.exists(os.path.join(directory, 'big.npz'))
+
+
+def test_result_store_drops_damaged_entries(tmp_path, detections):
+    store = gui.ResultStore(str(tmp_path))
+    store.put('key', detections['COLD'])
+    with open(tmp_path / 'key.npz', 'wb') as f:
+        f.write(b'not an npz file')
+    assert store.get('key') is None
+    assert 'key' not in store and not (tmp_path / 'key.npz').exists()
+
+
+def test_result_store_put_failure_raises_and_cleans_up(tmp_path, detections, monkeypatch):
+    store = gui.ResultStore(str(tmp_path / 'results'))
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(gui.np, 'savez', fail)
+    with pytest.raises(OSError, match="disk full"):
+        store.put('key', detections['states'])
+    # 已写出的Parquet文件被删除，索引中没有记录
+    assert 'key' not in store and os.listdir(tmp_path / 'results') == ['results.sqlite']
@@ -0,0 +1,21 @@
+import numpy as np
+
+import Pyxccd_GUI as gui
+
+
+def test_fit_rmse_uses_clean_observations(series_csv, base_params):
+    path, data, _ = series_csv
+    params = dict(base_params, input_file=path, method='COLD')
+    # 超出0-10000范围的晴空观测不属于clean，不应影响RMSE
+    data = data.copy()
+    data.loc[data.index[data['qa'] == 0][5], 'b1'] = 20000
+    inputs = gui.prepare_inputs(params, data)
+    result = gui.detect_change(params, inputs=inputs, cache=gui.DetectionCache())
+    series = result['series']
+    assert not series.clean.all() and (series.qa[~series.clean] != 4).any()
+    
+    rec_cg = result['cold_result']
+    days, predicted, _ = gui.evaluate_harmonic_segments(rec_cg['t_start'], rec_cg['t_end'], rec_cg['coefs'], 0)
+    model = dict(zip(days.tolist(), predicted.tolist()))
+    residual = [model[d] - v for d, v, c in zip(series.dates.tolist(), series.merge[:, 0].tolist(), series.clean) if c and d in model]
+    assert np.isclose(gui.fit_rmse(params, result), np.sqrt(np.mean(np.square(residual))))